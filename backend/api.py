@@ -1,203 +1,480 @@
 import asyncio
 import ctypes
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List, Dict
-import threading
+from fastapi.responses import PlainTextResponse
 import json
-import time
 import os
+import time
 # from bindings import core_lib
-from backend.bindings import core_lib
-import ifaddr
+from backend.bindings import core_lib, IngressBatch, read_recv_stats, read_send_stats, send_batch, set_broadcast_addresses
 from backend import config
+from backend import crypto
+from backend.connections import ConnectionManager
+from backend import discovery
+from backend import fragment
+from backend import groups
+from backend import history
+from backend import interfaces
+from backend import io_pool
+from backend import log
+from backend import metrics
+from backend import peers
+from backend import reliable
+from backend import transfer
+from backend import wire
+
+logger = log.get_logger("api")
 
 BROADCAST_IP = '255.255.255.255'
 PEER_TIMEOUT = int(os.getenv("PEER_TIMEOUT", "15"))
 PEER_CHECK_INTERVAL = int(os.getenv("PEER_CHECK_INTERVAL", "5"))
 MY_LISTENING_PORT = 8888
+INGRESS_BATCH_SIZE = int(os.getenv("INGRESS_BATCH_SIZE", "256"))
+# Frame types counted under their own label; anything else a peer sends is "other"
+METRIC_FRAME_TYPES = frozenset((
+    "DISCOVERY_REQUEST", "DISCOVERY_REPLY", "HEARTBEAT", "MESSAGE", "ACK", "GROUP_MESSAGE",
+    "FILE_OFFER", "FILE_STATE", "FILE_ACK", "FILE_POLL", "FILE_CANCEL", "FILE_CHUNK", "FRAGMENT",
+))
 
-def get_all_own_ips():
-    ips = []
-    # 1. Use pure-Python ifaddr (no C compiler or dev headers required)
-    try:
-        adapters = ifaddr.get_adapters()
-        for adapter in adapters:
-            for ip in adapter.ips:
-                if isinstance(ip.ip, str):
-                    if ip.ip != '127.0.0.1':
-                        ips.append(ip.ip)
-    except Exception as e:
-        print("Warning: Failed to retrieve adapters via ifaddr:", e)
-
-    # 2. Add C++ primary routed IP via the new function
+def _probe_primary_ip():
+    """The core's routed primary address (no packet is sent), or None."""
     ip_buffer = ctypes.create_string_buffer(64)
     if core_lib.get_local_ip(ip_buffer, 64):
-        primary_ip = ip_buffer.value.decode('utf-8')
-        if primary_ip not in ips and primary_ip != '127.0.0.1':
-            ips.append(primary_ip)
-
-    return ips
+        return ip_buffer.value.decode('utf-8')
+    return None
 
-OWN_IPS = get_all_own_ips()
+# Filled in at startup on the I/O executor (see main.startup_event); the scan
+# can stall on route lookups and must not run on import or on the event loop.
+interface_table = interfaces.InterfaceTable(probe=_probe_primary_ip)
 loop = None
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-
 manager = ConnectionManager()
+reassembler = fragment.Reassembler()
+reliable_channel = reliable.ReliableChannel(
+    transmit=lambda payload, ip, port: _send_in_background(payload, ip, port),
+    local_port=lambda: MY_LISTENING_PORT,
+    encode=lambda peer_key, frame: wire.encode_for(_peer_version(peer_key), frame),
+)
+transfers = transfer.TransferManager(
+    send_json=lambda frame, ip, port: _send_in_background(json.dumps(frame).encode('utf-8'), ip, port),
+    send_raw=lambda datagrams: _send_batch_in_background(datagrams),
+    notify=lambda event: _notify_ui(event),
+    local_port=lambda: MY_LISTENING_PORT,
+)
+discovery_scheduler = discovery.DiscoveryScheduler()
+# Started with the listener (see main.startup_event); inactive until then
+session_keys = crypto.SessionKeys(core_lib)
+group_directory = groups.GroupDirectory()
+history_store = history.MessageStore()
 router = APIRouter()
 
-# Data structure to hold all peer info, combining both features
-discovered_peers: Dict[str, Dict] = {} # Maps IP -> {"nickname": str, "last_seen": float}
-_peers_lock = threading.Lock()
+frames_received = metrics.REGISTRY.counter(
+    "whispernet_frames_received_total", "Datagrams and reassembled frames handled, by type", ("type",)
+)
+decode_errors = metrics.REGISTRY.counter(
+    "whispernet_decode_errors_total", "Datagrams dropped as undecodable, by encoding", ("encoding",)
+)
+ingress_batch_seconds = metrics.REGISTRY.histogram(
+    "whispernet_ingress_batch_seconds", "Time spent handling one drained ingress batch"
+)
+ingress_batch_size = metrics.REGISTRY.histogram(
+    "whispernet_ingress_batch_size", "Datagrams per drained ingress batch", metrics.SIZE_BUCKETS
+)
+peers_lock_held_seconds = metrics.REGISTRY.histogram(
+    "whispernet_peers_lock_held_seconds", "Time the peer table lock was held per critical section",
+    metrics.LOCK_BUCKETS,
+)
+ws_fanout_seconds = metrics.REGISTRY.histogram(
+    "whispernet_ws_fanout_seconds", "Time to serialize a UI event and queue it for every WebSocket client"
+)
 
-def _broadcast_peer_update():
-    """Helper to safely build and broadcast the current peer list."""
-    with _peers_lock:
-        peers_payload = [{"ip": ip, "nickname": data["nickname"]} for ip, data in discovered_peers.items()]
-    
-    update_message = {"type": "PEER_LIST_UPDATE", "payload": peers_payload}
-    
-    if loop:
-        fut = asyncio.run_coroutine_threadsafe(manager.broadcast(json.dumps(update_message)), loop)
-        fut.add_done_callback(lambda f: (exc := f.exception()) and print(f"[broadcast error] {exc}"))
+# Every peer we currently know about, keyed by "ip:port"; changes reach the
+# UI as coalesced PEER_DELTA frames.
+peer_feed = peers.PeerFeed(publish=lambda frame: _notify_ui(frame))
+discovered_peers = peers.PeerRegistry(
+    timeout=PEER_TIMEOUT,
+    on_change=lambda kind, peer: _on_peer_change(kind, peer),
+    on_lock_held=peers_lock_held_seconds.observe,
+)
+
+metrics.REGISTRY.gauge_callback("whispernet_peers", "Peers in the discovery table", lambda: len(discovered_peers))
+metrics.REGISTRY.gauge_callback(
+    "whispernet_ws_clients", "Connected WebSocket clients", lambda: len(manager.active_connections)
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_log_dropped_total", "Log records dropped because the log queue was full", log.dropped
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_core_datagrams_sent_total", "Datagrams sent by the core, by sender socket",
+    lambda: {kind: stats["sent"] for kind, stats in read_send_stats().items()}, ("socket",),
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_core_send_errors_total", "Failed core sends, by sender socket",
+    lambda: {kind: stats["errors"] for kind, stats in read_send_stats().items()}, ("socket",),
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_core_datagrams_received_total", "Datagrams received by the core listener",
+    lambda: read_recv_stats().get("datagrams"),
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_core_received_bytes_total", "Payload bytes received by the core listener",
+    lambda: read_recv_stats().get("bytes"),
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_core_recv_syscalls_total", "Receive system calls made by the core listener",
+    lambda: read_recv_stats().get("syscalls"),
+)
+metrics.REGISTRY.gauge_callback(
+    "whispernet_crypto_sessions", "Peers with an encryption session in the core",
+    lambda: session_keys.stats().get("sessions"),
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_crypto_frames_total", "Unicast frames sealed, opened or rejected by the core",
+    lambda: {op: n for op, n in session_keys.stats().items() if op in ("sealed", "opened", "rejected")}, ("op",),
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_crypto_rekeys_total", "Session send keys moved to a new epoch",
+    lambda: session_keys.stats().get("rekeys"),
+)
+metrics.REGISTRY.counter_callback(
+    "whispernet_core_ingress_dropped_total", "Datagrams dropped because the core ingress queue was full",
+    lambda: read_recv_stats().get("dropped"),
+)
+
+def _notify_ui(event: dict):
+    """Queues an event for every WebSocket client; must run on the event loop."""
+    with ws_fanout_seconds.time():
+        manager.publish(json.dumps(event))
+
+def _on_peer_change(kind: str, peer: peers.Peer):
+    peer_feed.record(kind, peer)
+    if kind != "updated":
+        discovery_scheduler.peers_changed()
+    if kind == "removed":
+        discovery_scheduler.forget(peer.key)
+        session_keys.forget(peer.ip, peer.port)
+        group_directory.forget_peer(peer.key)
 
-def handle_incoming_message(message: bytes, sender_ip: bytes, sender_port: int):
+def handle_incoming_message(message, sender_ip: bytes, sender_port: int):
+    """Handles one datagram; ``message`` is any bytes-like object (often a
+    memoryview into the ingress arena, valid only for the duration of the call)."""
     sender_ip_str = sender_ip.decode('utf-8', errors='ignore')
 
+    if transfer.is_chunk(message):
+        frames_received.inc("FILE_CHUNK")
+        transfers.on_chunk(sender_ip_str, message)
+        return
+
+    if fragment.is_fragment(message):
+        frames_received.inc("FRAGMENT")
+        message = reassembler.add((sender_ip_str, sender_port), message)
+        if message is None:
+            return
+
+    sealed = crypto.is_sealed(message)
+    if sealed:
+        message = session_keys.open(sender_ip, message)
+        if message is None:
+            decode_errors.inc("sealed")
+            # Most likely sealed for our previous run; announce the current key
+            discovery_scheduler.announce_soon()
+            return
+
     try:
-        data = json.loads(message.decode('utf-8', errors='ignore'))
-        
+        if wire.is_binary(message):
+            data = wire.decode(message)
+            if data is None:
+                decode_errors.inc("binary")
+                return
+        else:
+            data = json.loads(str(message, 'utf-8', errors='ignore'))
+            if not isinstance(data, dict):
+                decode_errors.inc("json")
+                return
+
+        frame_type = data.get("type")
+        frames_received.inc(frame_type if isinstance(frame_type, str) and frame_type in METRIC_FRAME_TYPES else "other")
+        if not sealed and session_keys.required and frame_type not in crypto.CLEARTEXT_TYPES:
+            return
+
         listening_port = data.get("port") if isinstance(data, dict) else None
         if listening_port is None:
             listening_port = sender_port
+        if sealed:
+            listening_port = session_keys.sender_port  # the port the session is bound to
+        if not _is_int(listening_port) or not 0 < listening_port <= 0xFFFF:
+            return  # peers are stored and sent to by this port; never trust its type
 
-        is_self = (sender_ip_str in OWN_IPS or sender_ip_str == "127.0.0.1") and listening_port == MY_LISTENING_PORT
+        is_self = listening_port == MY_LISTENING_PORT and interface_table.is_own(sender_ip_str)
         if is_self: 
             return
 
         nickname = data.get("nickname") or data.get("sender_nick") or f"{sender_ip_str}:{listening_port}"
         peer_key = f"{sender_ip_str}:{listening_port}"
         
-        if data.get("type") == "DISCOVERY_REQUEST":
-            if data.get("version") != config.PROTOCOL_VERSION:
+        if data.get("type") in ("DISCOVERY_REQUEST", "DISCOVERY_REPLY", "HEARTBEAT"):
+            if not _version_supported(data):
                 return
+            peer_version = wire.negotiate(data.get("max_version") or data.get("version"))
 
-            peer_updated = False
-            
-            with _peers_lock:
-                if sender_ip_str != "127.0.0.1":
-                    loopback_key = f"127.0.0.1:{listening_port}"
-                    if loopback_key in discovered_peers:
-                        discovered_peers.pop(loopback_key, None)
-                        peer_updated = True
-                elif sender_ip_str == "127.0.0.1":
-                    has_lan_peer = any(
-                        p["port"] == listening_port and p["ip"] != "127.0.0.1"
-                        for p in discovered_peers.values()
-                    )
-                    if has_lan_peer:
-                        return
-
-                current_peer_data = discovered_peers.get(peer_key)
-                if not current_peer_data or current_peer_data.get("nickname") != nickname:
-                    peer_updated = True
-                
-                discovered_peers[peer_key] = {
-                    "ip": sender_ip_str,
-                    "port": listening_port,
-                    "nickname": nickname,
-                    "last_seen": time.monotonic()
-                }
+            peer_updated = discovered_peers.observe(sender_ip_str, listening_port, nickname, peer_version)
+            if peer_updated is None:
+                return  # loopback echo of a peer we already know by its LAN address
 
-            if peer_updated:
-                print(f"Discovered/updated peer: {peer_key} -> {nickname}")
-                _broadcast_peer_update()
-
-            # --- DISCOVERY HANDSHAKE REPLY ---
-            # Send a direct unicast reply back to the sender's dynamic listening port
-            reply_payload = {
-                "type": "DISCOVERY_REPLY",
-                "nickname": config.NICKNAME,
-                "version": config.PROTOCOL_VERSION,
-                "port": MY_LISTENING_PORT
-            }
-            core_lib.send_udp_message(
-                json.dumps(reply_payload).encode("utf-8"),
-                sender_ip_str.encode("utf-8"),
-                listening_port
+            group_directory.update_peer(
+                peer_key, sender_ip_str, listening_port, data.get("groups"), data.get("mcast", 1)
             )
+            key_status = session_keys.on_peer_key(sender_ip_str, listening_port, data.get("pub"))
+            if key_status == crypto.SESSION_INSTALLED:
+                logger.info("Encryption session set up with %s", peer_key)
+            elif key_status == crypto.SESSION_PENDING:
+                # Sent in the clear: the address may no longer hold our current session
+                logger.info("%s advertised a new key; asking it to confirm", peer_key)
+                confirm = encode_discovery("HEARTBEAT", peer_version, confirm=True)
+                _send_batch_in_background([(confirm, sender_ip_str.encode("utf-8"), listening_port)])
+            if data.get("confirm") and session_keys.enabled:
+                # A sealed frame is what lets the asker switch to our current key
+                _send_in_background(encode_discovery("HEARTBEAT", peer_version), sender_ip_str, listening_port)
 
-        elif data.get("type") == "DISCOVERY_REPLY":
-            if data.get("version") != config.PROTOCOL_VERSION:
-                return
+            if peer_updated:
+                via = {"DISCOVERY_REPLY": " (via reply)", "HEARTBEAT": " (via heartbeat)"}.get(data["type"], "")
+                logger.info("Discovered/updated peer%s: %s -> %s", via, peer_key, nickname)
+                transfers.on_peer_seen(peer_key)
 
-            peer_updated = False
-            
-            with _peers_lock:
-                if sender_ip_str != "127.0.0.1":
-                    loopback_key = f"127.0.0.1:{listening_port}"
-                    if loopback_key in discovered_peers:
-                        discovered_peers.pop(loopback_key, None)
-                        peer_updated = True
-                elif sender_ip_str == "127.0.0.1":
-                    has_lan_peer = any(
-                        p["port"] == listening_port and p["ip"] != "127.0.0.1"
-                        for p in discovered_peers.values()
-                    )
-                    if has_lan_peer:
-                        return
-
-                current_peer_data = discovered_peers.get(peer_key)
-                if not current_peer_data or current_peer_data.get("nickname") != nickname:
-                    peer_updated = True
-                
-                discovered_peers[peer_key] = {
-                    "ip": sender_ip_str,
-                    "port": listening_port,
-                    "nickname": nickname,
-                    "last_seen": time.monotonic()
-                }
+            if data["type"] == "DISCOVERY_REQUEST" and discovery_scheduler.should_reply(peer_key, data.get("sid")):
+                # --- DISCOVERY HANDSHAKE REPLY ---
+                # Send a direct unicast reply back to the sender's dynamic listening port
+                # in whichever encoding the peer understands; a requester we already
+                # answered this session knows us and gets nothing
+                reply_bytes = encode_discovery("DISCOVERY_REPLY", peer_version)
+                _send_batch_in_background([(reply_bytes, sender_ip_str.encode("utf-8"), listening_port)])
 
-            if peer_updated:
-                print(f"Discovered/updated peer (via reply): {peer_key} -> {nickname}")
-                _broadcast_peer_update()
+        elif str(data.get("type", "")).startswith("FILE_"):
+            transfers.on_control(peer_key, sender_ip_str, listening_port, data)
+
+        elif data.get("type") == "ACK":
+            reliable_channel.on_ack(peer_key, data)
+
+        elif data.get("type") == "GROUP_MESSAGE":
+            group = data.get("group")
+            if not isinstance(group, str) or not group_directory.is_member(group):
+                return  # the host delivers every joined address to every socket
+            payload = {"group": group, "sender": peer_key, "content": data.get("content"), "sender_nick": nickname}
+            _attach_history(payload, history_store.append(
+                history.group_key(group), "in", data.get("content"), sender=peer_key, nickname=nickname
+            ))
+            _notify_ui({"type": "NEW_GROUP_MESSAGE", "payload": payload})
 
         elif data.get("type") == "MESSAGE":
+            if "seq" in data:
+                if not _is_int(data["seq"]) or not _is_int(data.get("sid")):
+                    return
+                base = data.get("base")
+                is_new = reliable_channel.on_message(
+                    peer_key, sender_ip_str, listening_port, data.get("sid"), data["seq"],
+                    base if _is_int(base) else None,
+                )
+                if not is_new:
+                    return
             update_message = {
                 "type": "NEW_MESSAGE", 
                 "payload": {"sender": peer_key, "content": data.get("content"), "sender_nick": nickname}
             }
-            if loop:
-                asyncio.run_coroutine_threadsafe(manager.broadcast(json.dumps(update_message)), loop)
+            _attach_history(update_message["payload"], history_store.append(
+                peer_key, "in", data.get("content"), sender=peer_key, nickname=nickname
+            ))
+            _notify_ui(update_message)
+
+    except json.JSONDecodeError as e:
+        decode_errors.inc("json")
+        logger.debug("Undecodable datagram from %s:%s: %s", sender_ip_str, sender_port, e)
+    except RuntimeError as e:
+        logger.warning("Error processing incoming message: %s", e)
+
+def _attach_history(payload: dict, record):
+    """Adds the stored message's id and timestamp, which the UI pages from."""
+    if record is not None:
+        payload["id"], payload["ts"] = record["id"], record["ts"]
+    return payload
+
+def _is_int(value) -> bool:
+    """True for a real integer field; JSON booleans are ints to Python."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _version_supported(data: dict) -> bool:
+    version = data.get("version")
+    return isinstance(version, int) and config.MIN_PROTOCOL_VERSION <= version <= config.PROTOCOL_VERSION
+
+def _peer_version(peer_key: str) -> int:
+    """Negotiated wire version for a known peer; JSON for anyone else."""
+    peer = discovered_peers.get(peer_key)
+    return peer.version if peer else wire.JSON_VERSION
+
+def encode_discovery(frame_type: str, version: int, confirm: bool = False) -> bytes:
+    """Builds a discovery frame for a peer speaking ``version``.
+
+    The JSON form claims version 1 so older peers accept it and advertises
+    what we really speak in ``max_version``. ``sid`` identifies this process
+    so peers can tell a restart (which needs fresh replies) from a repeat.
+    ``confirm`` asks the recipient for a sealed HEARTBEAT proving its key.
+    """
+    frame = {
+        "type": frame_type,
+        "nickname": config.NICKNAME,
+        "version": wire.JSON_VERSION,
+        "max_version": config.PROTOCOL_VERSION,
+        "port": MY_LISTENING_PORT,
+        "sid": discovery_scheduler.session_id,
+    }
+    if group_directory.local_names():
+        frame["groups"] = group_directory.local_names()
+        frame["mcast"] = int(group_directory.multicast_ok)
+    if session_keys.enabled:
+        frame["pub"] = session_keys.public_key
+    if confirm:
+        frame["confirm"] = 1
+    return wire.encode_for(version, frame)
+
+def _send_payload(payload: bytes, ip: str, port: int):
+    """Sends one logical payload, sealed for the peer when we hold a session
+    with it and split into MTU-sized fragments if needed."""
+    _send_datagrams(_datagrams_for(payload, ip, port))
+
+def _send_in_background(payload: bytes, ip: str, port: int):
+    """Queues a send on the I/O executor from synchronous code (timers, callbacks)."""
+    io_pool.executor().submit(_send_payload, payload, ip, port).add_done_callback(_report_send_error)
+
+def _send_batch_in_background(datagrams):
+    """Queues ready-made (data, ip_bytes, port) datagrams on the I/O executor,
+    unsealed. The core's sender sockets block on a full send buffer, so even
+    one datagram must not be sent from the event loop."""
+    io_pool.executor().submit(_send_datagrams, datagrams).add_done_callback(_report_send_error)
+
+def _send_datagrams(datagrams):
+    if len(datagrams) > 1:
+        send_batch(datagrams)
+    else:
+        data, ip_bytes, port = datagrams[0]
+        core_lib.send_udp_datagram(data, len(data), ip_bytes, port)
+
+def _report_send_error(future):
+    error = future.exception()
+    if error is not None:
+        logger.warning("Background send failed: %s", error)
+
+def _seal(payload: bytes, ip: str, port: int) -> bytes:
+    """Encrypts a unicast payload for ip:port. Sealing happens per
+    transmission, so every retransmission gets a fresh nonce."""
+    sealed = session_keys.seal(ip, port, MY_LISTENING_PORT, payload)
+    if sealed is not None:
+        return sealed
+    if session_keys.required:
+        raise ValueError(f"No encryption session with {ip}:{port}")
+    return payload
+
+def _datagrams_for(payload: bytes, ip: str, port: int, seal: bool = True) -> list:
+    """The (bytes, ip, port) datagrams that carry ``payload`` to one peer;
+    ``seal=False`` for multicast group addresses, which have no session."""
+    if seal:
+        payload = _seal(payload, ip, port)
+    ip_bytes = ip.encode('utf-8')
+    if fragment.needs_fragmenting(payload):
+        return [(frag, ip_bytes, port) for frag in fragment.split(payload)]
+    return [(payload, ip_bytes, port)]
+
+def _parse_recipient(recipient_ip: str):
+    """Splits a UI peer key "IP:PORT" into (ip, port), defaulting to port 8888."""
+    try:
+        ip_part, port_part = recipient_ip.split(":")
+        return ip_part, int(port_part)
+    except ValueError:
+        return recipient_ip, 8888
+
+_ingress_batch = None
+
+def on_ingress_ready():
+    """Called on the core listener thread when datagrams are waiting.
+
+    Only hops onto the event loop; the actual parsing happens in
+    drain_ingress so one GIL handoff covers the whole batch.
+    """
+    if loop:
+        loop.call_soon_threadsafe(drain_ingress)
 
-    except (json.JSONDecodeError, RuntimeError) as e:
-        print(f"Error processing incoming message: {e}")
+def drain_ingress():
+    """Pulls queued datagrams out of the core in batches on the event loop."""
+    global _ingress_batch
+    if _ingress_batch is None:
+        _ingress_batch = IngressBatch(INGRESS_BATCH_SIZE)
+
+    started = time.perf_counter()
+    handled = 0
+    for payload, sender_ip, sender_port in _ingress_batch.poll():
+        # The batch is already dequeued; one bad datagram must not cost the rest
+        try:
+            handle_incoming_message(payload, sender_ip, sender_port)
+        except Exception:
+            logger.exception("Dropped datagram from %s:%s", sender_ip.decode('utf-8', errors='ignore'), sender_port)
+        handled += 1
+    if handled:
+        ingress_batch_seconds.observe(time.perf_counter() - started)
+        ingress_batch_size.observe(handled)
+
+    # A cut-short batch means more may be queued without a fresh notification;
+    # yield to other callbacks and come back for the rest.
+    if _ingress_batch.may_have_more and loop:
+        loop.call_soon(drain_ingress)
 
 async def check_stale_peers_task():
     """Periodically checks for and removes stale peers."""
     while True:
         await asyncio.sleep(PEER_CHECK_INTERVAL)
-        stale_peers_found = False
-        with _peers_lock:
-            current_time = time.monotonic()
-            stale_keys = [key for key, data in discovered_peers.items() if current_time - data["last_seen"] > PEER_TIMEOUT]
-            if stale_keys:
-                print(f"Removing stale peers: {stale_keys}")
-                for key in stale_keys:
-                    discovered_peers.pop(key, None)
-                stale_peers_found = True
-        if stale_peers_found:
-            _broadcast_peer_update()
+        reassembler.expire()
+        stale_keys = discovered_peers.expire()
+        if stale_keys:
+            logger.info("Removing stale peers: %s", stale_keys)
+            for key in stale_keys:
+                reliable_channel.forget(key)
+
+async def refresh_interfaces():
+    """Rescans interfaces off the loop; on a change, updates the core and
+    announces soon so peers on a newly joined network find us."""
+    if not await io_pool.run(interface_table.refresh):
+        return False
+    set_broadcast_addresses([ip.encode('utf-8') for ip in interface_table.broadcasts])
+    discovery_scheduler.peers_changed()
+    logger.info(
+        "Interfaces changed: own %s, broadcast to %s",
+        sorted(interface_table.own_ips), list(interface_table.broadcasts) or "255.255.255.255",
+    )
+    return True
+
+async def watch_interfaces_task():
+    """Rescans on netlink address/link events (Linux) and every INTERFACE_REFRESH seconds."""
+    changed = asyncio.Event()
+    monitor = interfaces.open_change_monitor()
+    if monitor is not None:
+        def on_change():
+            interfaces.drain_change_monitor(monitor)
+            changed.set()
+        try:
+            loop.add_reader(monitor.fileno(), on_change)
+        except NotImplementedError:
+            monitor.close()
+            monitor = None
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(changed.wait(), interfaces.INTERFACE_REFRESH)
+                await asyncio.sleep(0.5)  # one rescan for a burst of notifications
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+            await refresh_interfaces()
+    finally:
+        if monitor is not None:
+            loop.remove_reader(monitor.fileno())
+            monitor.close()
 
 @router.get("/health")
 async def health_check():
@@ -205,11 +482,28 @@ async def health_check():
 
 @router.get("/peers")
 async def get_peers():
-    with _peers_lock:
-        return [
-            {"ip": f"{data['ip']}:{data['port']}", "nickname": data["nickname"]} 
-            for data in discovered_peers.values()
-        ]
+    return [peer.as_payload() for peer in discovered_peers.snapshot()]
+
+@router.get("/stats")
+async def get_stats():
+    return {
+        "send_sockets": read_send_stats(),
+        "ingress_dropped": core_lib.get_ingress_dropped(),
+        "websocket": manager.stats(),
+        "discovery": discovery_scheduler.stats(),
+        "interfaces": interface_table.describe(),
+        "crypto": session_keys.describe(),
+    }
+
+@router.get("/metrics")
+async def get_metrics():
+    """Counters and latency histograms in the Prometheus text exposition format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@router.get("/peers/stats")
+async def get_peer_stats():
+    """Per-peer delivery statistics for reliable sends (RTT, RTO, counters)."""
+    return reliable_channel.stats()
 
 @router.post("/send")
 async def send_message(message: dict):
@@ -217,39 +511,198 @@ async def send_message(message: dict):
     if not recipient_ip or not content:
         return {"status": "error", "detail": "Missing recipient_ip or content"}
     
-    # Extract IP and Port from the UI string key "IP:PORT"
+    ip_part, target_port = _parse_recipient(recipient_ip)
+    peer_key = f"{ip_part}:{target_port}"
+    payload = {"type": "MESSAGE", "content": content, "port": MY_LISTENING_PORT}
+    if message.get('reliable'):
+        result = await reliable_channel.send(peer_key, ip_part, target_port, payload)
+        if result["delivered"]:
+            response = {"status": "delivered", "rtt_ms": result["rtt_ms"], "attempts": result["attempts"]}
+            return _attach_history(response, history_store.append(peer_key, "out", content))
+        return {"status": "failed", "detail": f"no acknowledgement after {result['attempts']} attempts"}
+
     try:
-        ip_part, port_part = recipient_ip.split(":")
-        target_port = int(port_part)
-    except ValueError:
-        # Fallback to defaults if no port is present
-        ip_part = recipient_ip
-        target_port = 8888
+        await io_pool.run(_send_payload, wire.encode_for(_peer_version(peer_key), payload), ip_part, target_port)
+    except ValueError as e:
+        return {"status": "error", "detail": str(e)}
+    logger.info("Sent message to %s:%s: %s", ip_part, target_port, log.content(content))
+    return _attach_history({"status": "message sent"}, history_store.append(peer_key, "out", content))
+
+@router.post("/send/bulk")
+async def send_bulk(message: dict):
+    """Sends one message to many recipients.
+
+    Plain sends leave as a single batched core call; with ``reliable`` every
+    recipient is tracked independently and the call returns once all of
+    them are delivered or given up on. Results are keyed by peer.
+    """
+    recipients, content = message.get('recipients'), message.get('content')
+    if not isinstance(recipients, list) or not recipients or not content:
+        return {"status": "error", "detail": "Missing recipients or content"}
+
+    targets = {}
+    for recipient in recipients:
+        ip_part, target_port = _parse_recipient(str(recipient))
+        targets[f"{ip_part}:{target_port}"] = (ip_part, target_port)
 
     payload = {"type": "MESSAGE", "content": content, "port": MY_LISTENING_PORT}
-    core_lib.send_udp_message(
-        json.dumps(payload).encode('utf-8'), 
-        ip_part.encode('utf-8'), 
-        target_port
-    )
-    print(f"Sent message to {ip_part}:{target_port}: {content}")
-    return {"status": "message sent"}
+    if message.get('reliable'):
+        outcomes = await asyncio.gather(*(
+            reliable_channel.send(peer_key, ip_part, target_port, payload)
+            for peer_key, (ip_part, target_port) in targets.items()
+        ))
+        results = {}
+        for peer_key, result in zip(targets, outcomes):
+            if result["delivered"]:
+                results[peer_key] = {"status": "delivered", "rtt_ms": result["rtt_ms"], "attempts": result["attempts"]}
+                history_store.append(peer_key, "out", content)
+            else:
+                results[peer_key] = {"status": "failed", "detail": f"no acknowledgement after {result['attempts']} attempts"}
+        return {"status": "ok", "results": results}
+
+    datagrams, results = [], {}
+    for peer_key, (ip_part, target_port) in targets.items():
+        try:
+            datagrams.extend(_datagrams_for(wire.encode_for(_peer_version(peer_key), payload), ip_part, target_port))
+            results[peer_key] = {"status": "message sent"}
+        except ValueError as e:
+            results[peer_key] = {"status": "error", "detail": str(e)}
+    if datagrams:
+        await io_pool.run(send_batch, datagrams)
+    for peer_key, result in results.items():
+        if result["status"] == "message sent":
+            history_store.append(peer_key, "out", content)
+    sent = sum(1 for result in results.values() if result["status"] == "message sent")
+    logger.info("Sent message to %s recipients: %s", sent, log.content(content))
+    return {"status": "ok", "results": results}
+
+@router.get("/files")
+async def list_files():
+    """All file transfers in both directions with their progress."""
+    return transfers.list()
+
+@router.post("/files")
+async def send_file(request: dict):
+    recipient_ip, path = request.get('recipient_ip'), request.get('path')
+    if not recipient_ip or not path:
+        return {"status": "error", "detail": "Missing recipient_ip or path"}
+    if not os.path.isfile(path):
+        return {"status": "error", "detail": f"No such file: {path}"}
+
+    ip_part, target_port = _parse_recipient(recipient_ip)
+    # Hashing reads the whole file; keep it off the loop and the send thread
+    sha256 = await asyncio.get_running_loop().run_in_executor(None, transfer.file_digest, path)
+    return transfers.offer(f"{ip_part}:{target_port}", ip_part, target_port, path, sha256)
+
+@router.post("/files/{transfer_id}/accept")
+async def accept_file(transfer_id: int, request: dict = None):
+    directory = (request or {}).get('directory')
+    try:
+        return transfers.accept(transfer_id, directory)
+    except KeyError:
+        return {"status": "error", "detail": "Unknown transfer"}
+    except OSError as e:
+        return {"status": "error", "detail": str(e)}
+
+@router.post("/files/{transfer_id}/resume")
+async def resume_file(transfer_id: int):
+    try:
+        return transfers.resume(transfer_id)
+    except KeyError:
+        return {"status": "error", "detail": "Unknown transfer"}
+
+@router.post("/files/{transfer_id}/cancel")
+async def cancel_file(transfer_id: int):
+    try:
+        return transfers.cancel(transfer_id)
+    except KeyError:
+        return {"status": "error", "detail": "Unknown transfer"}
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
-    with _peers_lock:
-        peers_payload = [{"ip": ip, "nickname": data["nickname"]} for ip, data in discovered_peers.items()]
-    initial_data = {"type": "PEER_LIST_UPDATE", "payload": peers_payload}
-    await websocket.send_text(json.dumps(initial_data))
+    # Snapshot + version handshake; PEER_DELTA frames continue from here
+    await manager.connect(websocket, initial=[json.dumps(peer_feed.snapshot(discovered_peers))])
     try:
-        while True: await websocket.receive_text()
+        while True:
+            request = await websocket.receive_text()
+            try:
+                wants_resync = json.loads(request).get("type") == "PEER_RESYNC"
+            except (json.JSONDecodeError, AttributeError):
+                wants_resync = False
+            if wants_resync:
+                manager.send(websocket, json.dumps(peer_feed.snapshot(discovered_peers)))
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+@router.get("/groups")
+async def list_groups():
+    """Groups we joined or have seen peers advertise, with their members."""
+    return group_directory.describe()
+
+@router.post("/groups/{name}/join")
+async def join_group(name: str):
+    try:
+        address = groups.group_address(name)
+    except ValueError as e:
+        return {"status": "error", "detail": str(e)}
+    if not group_directory.is_member(name):
+        joined = bool(await io_pool.run(core_lib.join_multicast_group, address.encode('utf-8')))
+        group_directory.add_local(name, joined)
+        discovery_scheduler.announce_soon()
+        if not joined:
+            logger.warning("Multicast join for group %s failed; members will unicast to us", name)
+    return {"status": "joined", "group": name, "address": address, "multicast": group_directory.multicast_ok}
+
+@router.post("/groups/{name}/leave")
+async def leave_group(name: str):
+    if not group_directory.remove_local(name):
+        return {"status": "error", "detail": "Not a member of this group"}
+    await io_pool.run(core_lib.leave_multicast_group, groups.group_address(name).encode('utf-8'))
+    discovery_scheduler.announce_soon()
+    return {"status": "left", "group": name}
+
+@router.post("/groups/{name}/send")
+async def send_group_message(name: str, message: dict):
+    """One datagram to the group address, plus unicast copies for members
+    that cannot receive it, all in a single core call."""
+    content = message.get('content')
+    if not content:
+        return {"status": "error", "detail": "Missing content"}
+    try:
+        use_multicast, unicast = group_directory.route(name)
+    except ValueError as e:
+        return {"status": "error", "detail": str(e)}
+    if not use_multicast and not unicast:
+        return {"status": "error", "detail": "No known members"}
+
+    frame = {"type": "GROUP_MESSAGE", "group": name, "content": content, "port": MY_LISTENING_PORT}
+    try:
+        datagrams = []
+        if use_multicast:
+            payload = wire.encode_for(config.PROTOCOL_VERSION, frame)
+            datagrams.extend(_datagrams_for(payload, groups.group_address(name), group_directory.port, seal=False))
+        for ip_part, target_port in unicast:
+            payload = wire.encode_for(_peer_version(f"{ip_part}:{target_port}"), frame)
+            datagrams.extend(_datagrams_for(payload, ip_part, target_port))
+    except ValueError as e:
+        return {"status": "error", "detail": str(e)}
+    await io_pool.run(send_batch, datagrams)
+    logger.info(
+        "Sent group message to %s (multicast: %s, unicast: %s): %s",
+        name, use_multicast, len(unicast), log.content(content),
+    )
+    response = {"status": "message sent", "multicast": use_multicast, "unicast": len(unicast)}
+    return _attach_history(response, history_store.append(history.group_key(name), "out", content))
+
+@router.get("/messages")
+async def get_messages(peer: str, before: int = None, before_id: int = None, limit: int = history.PAGE_SIZE):
+    """One page of a conversation (``peer`` is "IP:PORT" or "group:<name>"),
+    oldest first. Pass ``next`` back as before/before_id for the page before it."""
+    messages, cursor = await history_store.page(peer, before, before_id, limit)
+    return {"messages": messages, "next": cursor}
+
 @router.post("/test/discover")
 async def test_discover(data: dict):
-    # This test endpoint does not need to be thread-safe
     sender_ip = data.get('sender_ip')
     if sender_ip:
         try:
@@ -259,13 +712,7 @@ async def test_discover(data: dict):
             ip_part = sender_ip
             port = 8888
         nickname = data.get('nickname') or sender_ip
-        discovered_peers[sender_ip] = {
-            "ip": ip_part,
-            "port": port,
-            "nickname": nickname,
-            "last_seen": time.monotonic()
-        }
-        _broadcast_peer_update()
+        discovered_peers.observe(ip_part, port, nickname, wire.JSON_VERSION)
     return {"status": "ok"}
 
 @router.post("/test/message")
@@ -3,6 +3,10 @@ import os
 import platform
 import sys
 
+from backend import log
+
+logger = log.get_logger("core")
+
 def get_lib_path():
     meipass = getattr(sys, "_MEIPASS", None)
     if meipass:
@@ -33,6 +37,26 @@ def get_lib_path():
 
     return os.path.join(os.path.dirname(__file__), "lib", "Debug", filename)
 
+WN_DATAGRAM_MAX = 65507
+WN_IP_STR_MAX = 16
+
+class WnDatagram(ctypes.Structure):
+    """Mirror of the core's ``wn_datagram``; filled in bulk by ``poll_messages``.
+
+    The payload lives in the arena passed alongside, at ``[offset, offset + length)``.
+    """
+    _fields_ = [
+        ("sender_ip", ctypes.c_char * WN_IP_STR_MAX),
+        ("sender_port", ctypes.c_int),
+        ("length", ctypes.c_int),
+        ("offset", ctypes.c_int),
+    ]
+
+# Order of the {sent, errors} pairs reported by get_send_stats()
+SEND_SOCKET_KINDS = ("unicast", "broadcast", "multicast")
+# Order of the counters reported by get_recv_stats()
+RECV_STAT_FIELDS = ("datagrams", "bytes", "syscalls", "dropped")
+
 lib_path = get_lib_path()
 
 if platform.system() == "Windows" and hasattr(os, 'add_dll_directory'):
@@ -42,86 +66,193 @@ if platform.system() == "Windows" and hasattr(os, 'add_dll_directory'):
     except FileNotFoundError:
         pass
 
+# WHISPERNET_CORE=python skips the native library, e.g. to benchmark the fallback
+WHISPERNET_CORE = os.getenv("WHISPERNET_CORE", "native")
+
 try:
+    if WHISPERNET_CORE == "python":
+        raise OSError("WHISPERNET_CORE=python")
     # winmode=0 tells Python >=3.8 to load dependencies normally
     core_lib = ctypes.CDLL(lib_path, winmode=0)
 except Exception as e:
-    print("WARNING: Could not load core library, using fallback mock. Error:", e)
-    import threading
-    import socket as _socket
-
-    class _Fallback:
-        def __init__(self):
-            self._listener_thread = None
-            self._sock = None
-            self._running = False
-
-        def start_udp_listener(self, port, callback):
-            if self._running: return 8888
-            self._running = True
-            self._sock = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM)
-            try: self._sock.bind(("", port))
-            except Exception: pass
-
-            def _listen():
-                while self._running:
-                    try:
-                        data, addr = self._sock.recvfrom(65535)
-                        sender_ip = addr[0].encode('utf-8')
-                        try: callback(data, sender_ip, addr[1])
-                        except Exception: pass
-                    except Exception: break
-
-            self._listener_thread = threading.Thread(target=_listen, daemon=True)
-            self._listener_thread.start()
-            return port
-
-        def stop_udp_listener(self):
-            self._running = False
-            if self._sock:
-                try: self._sock.close()
-                except Exception: pass
-                self._sock = None
-
-        def send_udp_message(self, message_bytes, addr_bytes, port):
-            addr = addr_bytes.decode('utf-8') if isinstance(addr_bytes, (bytes, bytearray)) else str(addr_bytes)
-            s = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM)
-            try:
-                s.setsockopt(_socket.SOL_SOCKET, _socket.SO_BROADCAST, 1)
-                s.sendto(message_bytes, (addr, port))
-            except Exception: pass
-            finally: s.close()
-
-        def send_broadcast_message(self, message_bytes, port):
-            self.send_udp_message(message_bytes, b"255.255.255.255", port)
-
-        def join_multicast_group(self, multicast_ip_bytes):
-            return 1
-
-        def get_local_ip(self, out_buffer, max_len):
-            try:
-                ip_bytes = b"127.0.0.1"
-                out_buffer[:len(ip_bytes)] = ip_bytes
-                return 1
-            except:
-                return 0
-
-    core_lib = _Fallback()
-
-ON_MESSAGE_RECEIVED_FUNC = ctypes.CFUNCTYPE(None, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int)
+    logger.warning("Could not load core library, using the Python fallback. Error: %s", e)
+    from backend.fallback_core import PythonCore
+    core_lib = PythonCore(SEND_SOCKET_KINDS)
+
+# (data, length, sender_ip, sender_port); data is a raw pointer, slice it with data[:length]
+ON_MESSAGE_RECEIVED_FUNC = ctypes.CFUNCTYPE(None, ctypes.POINTER(ctypes.c_char), ctypes.c_int, ctypes.c_char_p, ctypes.c_int)
+ON_INGRESS_READY_FUNC = ctypes.CFUNCTYPE(None)
 
 try:
     core_lib.start_udp_listener.argtypes = [ctypes.c_int, ON_MESSAGE_RECEIVED_FUNC]
     core_lib.start_udp_listener.restype = ctypes.c_int
+
+    core_lib.start_udp_listener_queued.argtypes = [ctypes.c_int, ON_INGRESS_READY_FUNC]
+    core_lib.start_udp_listener_queued.restype = ctypes.c_int
+
+    core_lib.start_udp_listener_queued_sharded.argtypes = [ctypes.c_int, ctypes.c_int, ON_INGRESS_READY_FUNC]
+    core_lib.start_udp_listener_queued_sharded.restype = ctypes.c_int
+
+    core_lib.poll_messages.argtypes = [ctypes.POINTER(WnDatagram), ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+    core_lib.poll_messages.restype = ctypes.c_int
+
+    core_lib.get_ingress_dropped.argtypes = []
+    core_lib.get_ingress_dropped.restype = ctypes.c_ulonglong
+
+    core_lib.get_recv_stats.argtypes = [ctypes.POINTER(ctypes.c_ulonglong), ctypes.c_int]
+    core_lib.get_recv_stats.restype = ctypes.c_int
     
     core_lib.send_udp_message.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
 
+    core_lib.send_udp_datagram.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+    core_lib.send_udp_datagram.restype = ctypes.c_int
+
+    core_lib.send_udp_batch.argtypes = [
+        ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_int),
+        ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_int), ctypes.c_int
+    ]
+    core_lib.send_udp_batch.restype = ctypes.c_int
+
     core_lib.send_broadcast_message.argtypes = [ctypes.c_char_p, ctypes.c_int]
     
+    core_lib.get_send_stats.argtypes = [ctypes.POINTER(ctypes.c_ulonglong), ctypes.c_int]
+    core_lib.get_send_stats.restype = ctypes.c_int
+
+    core_lib.set_broadcast_addresses.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.c_int]
+    core_lib.set_broadcast_addresses.restype = ctypes.c_int
+
     core_lib.join_multicast_group.argtypes = [ctypes.c_char_p]
     core_lib.join_multicast_group.restype = ctypes.c_int
+
+    core_lib.leave_multicast_group.argtypes = [ctypes.c_char_p]
+    core_lib.leave_multicast_group.restype = ctypes.c_int
     
     core_lib.get_local_ip.argtypes = [ctypes.c_char_p, ctypes.c_int]
     core_lib.get_local_ip.restype = ctypes.c_int
+
+    # AEAD sessions for unicast frames (see backend/crypto.py)
+    core_lib.wn_x25519.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
+    core_lib.wn_x25519.restype = ctypes.c_int
+
+    core_lib.wn_aead_seal.argtypes = [
+        ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p,
+    ]
+    core_lib.wn_aead_seal.restype = ctypes.c_int
+
+    core_lib.wn_aead_open.argtypes = [
+        ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p,
+    ]
+    core_lib.wn_aead_open.restype = ctypes.c_int
+
+    core_lib.wn_crypto_init.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+    core_lib.wn_crypto_init.restype = ctypes.c_int
+
+    core_lib.wn_crypto_configure.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+    core_lib.wn_crypto_configure.restype = ctypes.c_int
+
+    core_lib.wn_session_install.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p]
+    core_lib.wn_session_install.restype = ctypes.c_int
+
+    core_lib.wn_session_forget.argtypes = [ctypes.c_char_p, ctypes.c_int]
+    core_lib.wn_session_forget.restype = None
+
+    core_lib.wn_session_seal.argtypes = [
+        ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int,
+    ]
+    core_lib.wn_session_seal.restype = ctypes.c_int
+
+    core_lib.wn_session_open.argtypes = [
+        ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int),
+    ]
+    core_lib.wn_session_open.restype = ctypes.c_int
+
+    core_lib.get_crypto_stats.argtypes = [ctypes.POINTER(ctypes.c_ulonglong), ctypes.c_int]
+    core_lib.get_crypto_stats.restype = ctypes.c_int
+
+    # Listener handles, for running several independent listeners in one process
+    core_lib.wn_listener_open.argtypes = [
+        ctypes.c_int, ctypes.c_int, ON_MESSAGE_RECEIVED_FUNC, ON_INGRESS_READY_FUNC, ctypes.POINTER(ctypes.c_int),
+    ]
+    core_lib.wn_listener_open.restype = ctypes.c_void_p
+
+    core_lib.wn_listener_shards.argtypes = [ctypes.c_void_p]
+    core_lib.wn_listener_shards.restype = ctypes.c_int
+
+    core_lib.wn_listener_poll.argtypes = [
+        ctypes.c_void_p, ctypes.POINTER(WnDatagram), ctypes.c_int, ctypes.c_char_p, ctypes.c_int,
+    ]
+    core_lib.wn_listener_poll.restype = ctypes.c_int
+
+    core_lib.wn_listener_join_multicast.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    core_lib.wn_listener_join_multicast.restype = ctypes.c_int
+
+    core_lib.wn_listener_leave_multicast.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    core_lib.wn_listener_leave_multicast.restype = ctypes.c_int
+
+    core_lib.wn_listener_close.argtypes = [ctypes.c_void_p]
+    core_lib.wn_listener_close.restype = None
 except Exception:
-    pass
\ No newline at end of file
+    pass
+
+def send_batch(datagrams):
+    """Sends a list of ``(payload, ip, port)`` tuples through one core call.
+
+    ``payload`` and ``ip`` are bytes. Returns the number of datagrams the
+    core handed to the kernel.
+    """
+    count = len(datagrams)
+    if count == 0:
+        return 0
+    messages = (ctypes.c_char_p * count)(*[d[0] for d in datagrams])
+    lengths = (ctypes.c_int * count)(*[len(d[0]) for d in datagrams])
+    recipient_ips = (ctypes.c_char_p * count)(*[d[1] for d in datagrams])
+    ports = (ctypes.c_int * count)(*[d[2] for d in datagrams])
+    return core_lib.send_udp_batch(messages, lengths, recipient_ips, ports, count)
+
+def set_broadcast_addresses(addresses):
+    """Tells the core which destinations (bytes) are directed broadcasts,
+    so they go out on its broadcast socket."""
+    ips = (ctypes.c_char_p * max(1, len(addresses)))(*addresses)
+    return core_lib.set_broadcast_addresses(ips, len(addresses))
+
+def read_send_stats():
+    """Returns ``{kind: {"sent": n, "errors": n}}`` for each core sender socket."""
+    out = (ctypes.c_ulonglong * (2 * len(SEND_SOCKET_KINDS)))()
+    written = core_lib.get_send_stats(out, len(out))
+    return {
+        kind: {"sent": out[2 * i], "errors": out[2 * i + 1]}
+        for i, kind in enumerate(SEND_SOCKET_KINDS)
+        if 2 * i + 1 < written
+    }
+
+def read_recv_stats():
+    """Returns the core's receive counters as ``{field: n}`` in one call."""
+    out = (ctypes.c_ulonglong * len(RECV_STAT_FIELDS))()
+    written = core_lib.get_recv_stats(out, len(out))
+    return {field: out[i] for i, field in enumerate(RECV_STAT_FIELDS) if i < written}
+
+class IngressBatch:
+    """Reusable record array and payload arena for draining the ingress queue.
+
+    Payloads returned by ``poll`` are memoryviews into the shared arena and
+    are only valid until the next call.
+    """
+
+    def __init__(self, max_count=256, arena_size=1 << 20):
+        self.max_count = max_count
+        self.records = (WnDatagram * max_count)()
+        self.arena = ctypes.create_string_buffer(max(arena_size, WN_DATAGRAM_MAX))
+        self.view = memoryview(self.arena).cast('B')
+        self.may_have_more = False
+
+    def poll(self):
+        count = core_lib.poll_messages(self.records, self.max_count, self.arena, len(self.arena))
+        datagrams = []
+        used = 0
+        for i in range(count):
+            record = self.records[i]
+            used = record.offset + record.length
+            datagrams.append((self.view[record.offset:used], record.sender_ip, record.sender_port))
+        # Either limit may have cut the drain short without a fresh notification
+        self.may_have_more = count == self.max_count or (count > 0 and len(self.arena) - used < WN_DATAGRAM_MAX)
+        return datagrams
@@ -1,5 +1,8 @@
 import os
 
-PROTOCOL_VERSION = 1
+# Highest wire version we speak (2 = binary frames, see wire.py) and the
+# oldest we still accept from peers (1 = JSON only).
+PROTOCOL_VERSION = 2
+MIN_PROTOCOL_VERSION = 1
 # Allow overriding the nickname via an Environment Variable
 NICKNAME = os.getenv("NICKNAME", "DefaultUser")
\ No newline at end of file
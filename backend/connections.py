@@ -0,0 +1,138 @@
+"""
+WebSocket fan-out to the browser UI.
+
+Every connected client gets its own bounded outbound queue and a writer
+task, so one slow or stalled tab never holds up the others and a failing
+socket only takes itself down. A frame is serialized once and the same
+string is queued for every client.
+
+When a client's queue is full the slow-consumer policy applies:
+
+    drop-oldest   discard the oldest queued frame (default); peer deltas
+                  then show a version gap and the UI resyncs
+    disconnect    close the client with 1013 (try again later)
+"""
+import asyncio
+import itertools
+import os
+from collections import deque
+
+from backend import log
+
+logger = log.get_logger("ws")
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "1024"))
+WS_SLOW_POLICY = os.getenv("WS_SLOW_POLICY", "drop-oldest")
+
+
+class _Client:
+    __slots__ = ("id", "websocket", "queue", "ready", "writer", "sent", "dropped", "high_water")
+
+    def __init__(self, client_id, websocket):
+        self.id = client_id
+        self.websocket = websocket
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.writer = None
+        self.sent = 0
+        self.dropped = 0
+        self.high_water = 0
+
+
+class ConnectionManager:
+    def __init__(self, queue_size=WS_QUEUE_SIZE, slow_policy=WS_SLOW_POLICY):
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self._clients = {}  # websocket -> _Client
+        self._ids = itertools.count(1)
+        self.disconnected_slow = 0
+
+    @property
+    def active_connections(self):
+        return list(self._clients)
+
+    async def connect(self, websocket, initial=()):
+        """Accepts ``websocket`` and queues ``initial`` frames ahead of any broadcast."""
+        await websocket.accept()
+        client = _Client(next(self._ids), websocket)
+        self._clients[websocket] = client
+        for message in initial:
+            self._enqueue(client, message)
+        client.writer = asyncio.ensure_future(self._write(client))
+
+    def disconnect(self, websocket):
+        client = self._clients.pop(websocket, None)
+        if client is not None and client.writer is not None:
+            client.writer.cancel()
+
+    def send(self, websocket, message: str):
+        """Queues ``message`` for one client, in order with broadcasts."""
+        client = self._clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, message)
+
+    def publish(self, message: str):
+        """Queues ``message`` for every client without waiting on any of them."""
+        for client in list(self._clients.values()):
+            self._enqueue(client, message)
+
+    async def broadcast(self, message: str):
+        self.publish(message)
+
+    def stats(self):
+        return {
+            "clients": [
+                {
+                    "id": client.id,
+                    "queued": len(client.queue),
+                    "high_water": client.high_water,
+                    "sent": client.sent,
+                    "dropped": client.dropped,
+                }
+                for client in self._clients.values()
+            ],
+            "queue_size": self.queue_size,
+            "slow_policy": self.slow_policy,
+            "disconnected_slow": self.disconnected_slow,
+        }
+
+    def _enqueue(self, client, message):
+        if len(client.queue) >= self.queue_size:
+            if self.slow_policy == "disconnect":
+                self._drop_slow(client)
+                return
+            client.queue.popleft()
+            client.dropped += 1
+        client.queue.append(message)
+        client.high_water = max(client.high_water, len(client.queue))
+        client.ready.set()
+
+    def _drop_slow(self, client):
+        logger.warning("Disconnecting client %s: %s frames behind", client.id, len(client.queue))
+        self.disconnected_slow += 1
+        self.disconnect(client.websocket)
+        asyncio.ensure_future(self._close(client.websocket, 1013))
+
+    async def _write(self, client):
+        websocket = client.websocket
+        try:
+            while True:
+                if not client.queue:
+                    client.ready.clear()
+                    await client.ready.wait()
+                    continue
+                await websocket.send_text(client.queue.popleft())
+                client.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The socket is gone or broken; only this client is affected
+            logger.info("Dropping client %s after send error: %s", client.id, e)
+            self._clients.pop(websocket, None)
+
+    @staticmethod
+    async def _close(websocket, code):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
@@ -0,0 +1,166 @@
+"""
+Encrypted unicast frames on top of the core's AEAD sessions.
+
+Every process makes a fresh X25519 key pair at startup and advertises the
+public half as ``pub`` in its discovery frames. Hearing a peer's key
+installs a session with it in the core (see core/src/crypto.cpp), so the
+handshake costs no extra round trip: a DISCOVERY_REQUEST and its
+DISCOVERY_REPLY carry both keys. From then on, unicast frames to that peer
+are sealed with ChaCha20-Poly1305 and carry a small binary header that can
+never be mistaken for JSON:
+
+    magic "WNE" | epoch u8 | port u16 | stream u32 | counter u64 | ciphertext | tag[16]
+
+A different key for a peer we already hold a session with is only kept as
+pending: the node asks that address to confirm (a discovery frame with
+``confirm``), and the peer answers with a sealed HEARTBEAT. The session
+moves to the new key once such a frame authenticates under it, so one
+spoofed discovery frame cannot reset a live session.
+
+Discovery, heartbeats, multicast group traffic and raw file chunks stay in
+the clear. The exchange is unauthenticated: it keeps message contents away
+from passive listeners on the LAN, not from an active man in the middle.
+
+ENCRYPTION selects the policy: ``prefer`` (default) seals whenever a
+session exists and still accepts plaintext from older peers, ``require``
+refuses to send or accept plaintext for anything but the cleartext frame
+types, and ``off`` neither advertises a key nor seals.
+"""
+import ctypes
+import os
+import struct
+import threading
+
+from backend import log
+
+logger = log.get_logger("crypto")
+
+ENCRYPTION = os.getenv("ENCRYPTION", "prefer")
+SESSION_CAPACITY = int(os.getenv("SESSION_CAPACITY", "1024"))
+SESSION_TTL = int(os.getenv("SESSION_TTL", "600"))
+REKEY_MESSAGES = int(os.getenv("REKEY_MESSAGES", "1000000"))
+REKEY_SECONDS = int(os.getenv("REKEY_SECONDS", "600"))
+
+MAGIC = b"WNE"
+HEADER = struct.Struct("!3sBHIQ")
+TAG_SIZE = 16
+OVERHEAD = HEADER.size + TAG_SIZE
+KEY_SIZE = 32
+
+# wn_session_install results
+SESSION_UNCHANGED = 0
+SESSION_INSTALLED = 1
+SESSION_PENDING = 2
+
+STAT_FIELDS = ("sessions", "sealed", "opened", "rejected", "rekeys", "evicted")
+# Frame types that are accepted in the clear even with ENCRYPTION=require
+CLEARTEXT_TYPES = frozenset(("DISCOVERY_REQUEST", "DISCOVERY_REPLY", "HEARTBEAT", "GROUP_MESSAGE"))
+
+
+def is_sealed(datagram) -> bool:
+    return len(datagram) >= OVERHEAD and datagram[:len(MAGIC)] == MAGIC
+
+
+class SessionKeys:
+    """Our key pair and the core's per-peer sessions.
+
+    Inactive until ``start`` succeeds; until then, and with a core that has
+    no AEAD support (the Python fallback), ``seal`` returns None and no key
+    is advertised.
+    """
+
+    def __init__(self, lib, mode=ENCRYPTION):
+        self._lib = lib
+        self.mode = mode
+        self.public_key = None  # hex, as carried in discovery frames
+        self._open_buffer = ctypes.create_string_buffer(1 << 16)
+        self._open_view = memoryview(self._open_buffer).cast("B")
+        self._sender_port = ctypes.c_int()
+        self.sender_port = None  # listening port from the header of the last opened frame
+        self._seal_buffers = threading.local()
+
+    @property
+    def enabled(self):
+        return self.public_key is not None
+
+    @property
+    def required(self):
+        return self.mode == "require"
+
+    def start(self):
+        if self.mode == "off":
+            return False
+        if not hasattr(self._lib, "wn_crypto_init"):
+            logger.warning("Core has no AEAD support; frames stay unencrypted")
+            return False
+        public = ctypes.create_string_buffer(KEY_SIZE)
+        if not self._lib.wn_crypto_init(os.urandom(KEY_SIZE), public):
+            logger.error("Could not create a session key pair; frames stay unencrypted")
+            return False
+        self._lib.wn_crypto_configure(SESSION_CAPACITY, SESSION_TTL, REKEY_MESSAGES, REKEY_SECONDS)
+        self.public_key = public.raw.hex()
+        return True
+
+    def on_peer_key(self, ip, port, public_key):
+        """Installs or refreshes the session for a peer that advertised
+        ``public_key`` (hex). Returns SESSION_INSTALLED for a new session,
+        SESSION_PENDING when the key differs from a live session's and awaits
+        confirmation, and SESSION_UNCHANGED otherwise."""
+        if not self.enabled or not isinstance(public_key, str):
+            return SESSION_UNCHANGED
+        try:
+            raw = bytes.fromhex(public_key)
+        except ValueError:
+            return SESSION_UNCHANGED
+        if len(raw) != KEY_SIZE:
+            return SESSION_UNCHANGED
+        status = self._lib.wn_session_install(ip.encode("utf-8"), port, raw)
+        return status if status in (SESSION_INSTALLED, SESSION_PENDING) else SESSION_UNCHANGED
+
+    def forget(self, ip, port):
+        if self.enabled:
+            self._lib.wn_session_forget(ip.encode("utf-8"), port)
+
+    def seal(self, ip, port, local_port, payload):
+        """The sealed form of ``payload`` for ip:port, or None without a session.
+        Safe to call from several I/O threads at once."""
+        if not self.enabled:
+            return None
+        buffer = getattr(self._seal_buffers, "buffer", None)
+        if buffer is None or len(buffer) < len(payload) + OVERHEAD:
+            buffer = self._seal_buffers.buffer = ctypes.create_string_buffer(len(payload) + OVERHEAD)
+        length = self._lib.wn_session_seal(
+            ip.encode("utf-8"), port, local_port, bytes(payload), len(payload), buffer, len(buffer)
+        )
+        if length < 0:
+            return None
+        return buffer.raw[:length]
+
+    def open(self, sender_ip, datagram):
+        """Decrypts a sealed datagram from ``sender_ip`` (bytes). Returns a
+        memoryview into a shared buffer, valid until the next call, or None
+        if there is no session or the frame fails authentication."""
+        if not self.enabled:
+            return None
+        if len(self._open_buffer) < len(datagram):
+            self._open_buffer = ctypes.create_string_buffer(len(datagram))
+            self._open_view = memoryview(self._open_buffer).cast("B")
+        data = datagram if isinstance(datagram, bytes) else bytes(datagram)
+        length = self._lib.wn_session_open(
+            sender_ip, data, len(data), self._open_buffer, len(self._open_buffer), ctypes.byref(self._sender_port)
+        )
+        if length < 0:
+            return None
+        self.sender_port = self._sender_port.value
+        return self._open_view[:length]
+
+    def stats(self):
+        """The core's session counters as ``{field: n}``; empty while inactive."""
+        if not self.enabled:
+            return {}
+        out = (ctypes.c_ulonglong * len(STAT_FIELDS))()
+        written = self._lib.get_crypto_stats(out, len(out))
+        return {field: out[i] for i, field in enumerate(STAT_FIELDS) if i < written}
+
+    def describe(self):
+        return {"mode": self.mode, "public_key": self.public_key, **self.stats()}
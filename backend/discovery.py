@@ -0,0 +1,137 @@
+"""
+Adaptive discovery scheduling.
+
+Three kinds of traffic keep the peer table fresh:
+
+    DISCOVERY_REQUEST  broadcast/multicast/loopback announce that asks
+                       unknown peers to answer with a DISCOVERY_REPLY
+    DISCOVERY_REPLY    unicast answer, sent once per requester session
+    HEARTBEAT          small announce that only refreshes liveness
+
+Announces go out quickly at startup and back off exponentially (with
+jitter) while the peer set is stable; any add/remove resets the interval.
+Liveness falls back to one heartbeat per HEARTBEAT_INTERVAL, skipped when
+an announce went out in the meantime, plus a rate-limited unicast
+heartbeat to peers that cannot hear our broadcasts because they listen on
+a port other than the discovery port.
+
+Every announce carries a random per-process session id (``sid``). A
+requester we have already answered in its current session knows us, so
+its later requests get no reply. Requests without a sid come from older
+peers that rely on replies for liveness and are always answered.
+
+The scheduler only decides; sending is left to the caller, which keeps it
+usable from the simulation in bench/discovery_sim.py.
+"""
+import os
+import random
+
+DISCOVERY_PORT = 8888
+MIN_INTERVAL = float(os.getenv("DISCOVERY_MIN_INTERVAL", "1"))
+MAX_INTERVAL = float(os.getenv("DISCOVERY_MAX_INTERVAL", "60"))
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "5"))
+JITTER = 0.2
+
+ANNOUNCE = "announce"
+HEARTBEAT = "heartbeat"
+
+
+class DiscoveryScheduler:
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, jitter=JITTER,
+                 discovery_port=DISCOVERY_PORT, rng=None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.jitter = jitter
+        self.discovery_port = discovery_port
+        self._rng = rng or random.Random()
+        self.session_id = self._rng.getrandbits(32)
+
+        self.interval = min_interval
+        self._changed = False
+        self._last_announce = 0.0
+        self._next_announce = 0.0
+        self._next_heartbeat = 0.0
+        self._replied = {}       # peer key -> sid we answered
+        self._last_unicast = {}  # peer key -> when we last sent it a liveness packet
+
+        self.announces = 0
+        self.heartbeats = 0
+        self.replies = 0
+        self.replies_suppressed = 0
+
+    def start(self, now):
+        self._next_announce = now
+        self._next_heartbeat = now + self.heartbeat_interval
+
+    def _jittered(self, interval):
+        return interval * (1 + self._rng.uniform(-self.jitter, self.jitter))
+
+    def peers_changed(self):
+        """The peer set gained or lost a member; announce quickly again."""
+        self._changed = True
+        self.announce_soon()
+
+    def announce_soon(self):
+        """Something we advertise changed (e.g. group membership)."""
+        self._next_announce = min(self._next_announce, self._last_announce + self.min_interval)
+
+    def next_wakeup(self):
+        return min(self._next_announce, self._next_heartbeat)
+
+    def due(self, now):
+        """Returns ANNOUNCE, HEARTBEAT or None for ``now`` and advances the timers."""
+        if now >= self._next_announce:
+            if self._changed:
+                self.interval = self.min_interval
+                self._changed = False
+            else:
+                self.interval = min(self.max_interval, self.interval * 2)
+            self._last_announce = now
+            self._next_announce = now + self._jittered(self.interval)
+            # The announce doubles as this period's heartbeat
+            self._next_heartbeat = now + self._jittered(self.heartbeat_interval)
+            self.announces += 1
+            return ANNOUNCE
+        if now >= self._next_heartbeat:
+            self._next_heartbeat = now + self._jittered(self.heartbeat_interval)
+            self.heartbeats += 1
+            return HEARTBEAT
+        return None
+
+    def should_reply(self, peer_key, sid):
+        """Whether a DISCOVERY_REQUEST from ``peer_key`` needs an answer."""
+        if sid is None:
+            return True
+        if self._replied.get(peer_key) == sid:
+            self.replies_suppressed += 1
+            return False
+        self._replied[peer_key] = sid
+        self.replies += 1
+        return True
+
+    def unicast_heartbeat_targets(self, peers, now):
+        """Peers that cannot hear our broadcasts and are due a unicast heartbeat."""
+        targets = []
+        for peer in peers:
+            if peer.port == self.discovery_port:
+                continue
+            key = peer.key
+            if now - self._last_unicast.get(key, float("-inf")) >= self.heartbeat_interval * (1 - self.jitter):
+                self._last_unicast[key] = now
+                targets.append(peer)
+        return targets
+
+    def forget(self, peer_key):
+        self._replied.pop(peer_key, None)
+        self._last_unicast.pop(peer_key, None)
+
+    def stats(self):
+        return {
+            "interval_s": round(self.interval, 3),
+            "announces": self.announces,
+            "heartbeats": self.heartbeats,
+            "replies": self.replies,
+            "replies_suppressed": self.replies_suppressed,
+        }
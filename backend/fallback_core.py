@@ -0,0 +1,325 @@
+"""
+Pure-Python stand-in for the native core.
+
+bindings.py uses this when the shared library cannot be loaded. It keeps
+the native core's call surface, so the rest of the backend does not know
+which one it is talking to.
+
+Receiving: the listener socket is an asyncio datagram endpoint on the
+running loop. Datagrams land in a bounded ingress queue straight from
+``datagram_received``. Selector transports read one datagram per loop
+iteration, so on selector loops the protocol also drains whatever else
+the socket holds, up to RECV_BATCH per wakeup. The ready callback is scheduled with ``call_soon``
+once per batch, and ``poll_messages`` drains the queue into the caller's
+record array and arena exactly like the native queue. No thread sits
+between the socket and the handler. Started outside a running loop
+(scripts, unit tests), the listener falls back to a reader thread that
+feeds the same queue.
+
+Sending: one long-lived socket per destination kind (unicast, broadcast,
+multicast), created on first use and safe to share between I/O threads.
+
+Multicast groups are joined on the listener socket itself.
+"""
+import asyncio
+import collections
+import ctypes
+import socket
+import struct
+import threading
+
+from backend import log
+
+logger = log.get_logger("core")
+
+INGRESS_QUEUE_CAPACITY = 1024  # matches the native core
+MULTICAST_TTL = 1
+RECV_BUFFER = 65535
+RECV_BATCH = 256  # datagrams read per readiness callback on selector loops
+
+
+def classify_destination(addr, directed_broadcasts=frozenset()):
+    try:
+        packed = socket.inet_aton(addr)
+    except OSError:
+        return "unicast"
+    if 224 <= packed[0] <= 239:
+        return "multicast"
+    if packed[3] == 255 or addr in directed_broadcasts:
+        return "broadcast"
+    return "unicast"
+
+
+class _IngressProtocol(asyncio.DatagramProtocol):
+    def __init__(self, core, sock, drain):
+        self._core = core
+        self._sock = sock
+        self._drain = drain  # safe only when nothing else reads the socket (no proactor)
+
+    def datagram_received(self, data, addr):
+        core = self._core
+        core._recv_counts[2] += 1
+        core._received(data, addr)
+        if not self._drain:
+            return
+        recvfrom = self._sock.recvfrom
+        for _ in range(RECV_BATCH - 1):
+            core._recv_counts[2] += 1
+            try:
+                data, addr = recvfrom(RECV_BUFFER)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # the transport sees the error on its next read
+            core._received(data, addr)
+
+    def error_received(self, exc):
+        pass  # ICMP errors from earlier sends; the socket stays usable
+
+
+class PythonCore:
+    def __init__(self, send_socket_kinds, ingress_capacity=INGRESS_QUEUE_CAPACITY):
+        self._send_socket_kinds = send_socket_kinds
+        self._sock = None
+        self._transport = None
+        self._endpoint = None
+        self._reader = None
+        self._loop = None
+        self._deliver = None
+        self._on_ready = None
+        self._ingress = collections.deque()
+        self._ingress_capacity = ingress_capacity
+        self._ingress_pending = False
+        self._ingress_dropped = 0
+        self._recv_counts = [0, 0, 0]  # datagrams, bytes, syscalls
+        self._senders = {}
+        self._senders_lock = threading.Lock()
+        self._send_counts = {kind: [0, 0] for kind in send_socket_kinds}
+        self._directed_broadcasts = frozenset()
+
+    # --- Listener ---
+
+    def start_udp_listener(self, port, callback):
+        """Calls ``callback(data, length, sender_ip, sender_port)`` per datagram."""
+        def deliver(data, sender_ip, sender_port):
+            try:
+                callback(data, len(data), sender_ip, sender_port)
+            except Exception:
+                pass
+        return self._start(port, deliver)
+
+    def start_udp_listener_queued(self, port, on_ready):
+        self._on_ready = on_ready
+        return self._start(port, self._enqueue)
+
+    def start_udp_listener_queued_sharded(self, port, shards, on_ready):
+        """One socket regardless of ``shards``; the loop reads it on one thread anyway."""
+        return self.start_udp_listener_queued(port, on_ready)
+
+    def _start(self, port, deliver):
+        if self._sock is not None:
+            return self._sock.getsockname()[1]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind(("", port))
+        except OSError:
+            try:
+                sock.bind(("", 0))
+            except OSError:
+                sock.close()
+                return -1
+        self._sock = sock
+        self._deliver = deliver
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+        if self._loop is not None:
+            sock.setblocking(False)
+            drain = isinstance(self._loop, asyncio.selector_events.BaseSelectorEventLoop)
+            self._endpoint = self._loop.create_task(
+                self._loop.create_datagram_endpoint(lambda: _IngressProtocol(self, sock, drain), sock=sock)
+            )
+            self._endpoint.add_done_callback(self._endpoint_ready)
+        else:
+            sock.settimeout(0.2)
+            self._reader = threading.Thread(target=self._read_blocking, args=(sock,), daemon=True)
+            self._reader.start()
+        return sock.getsockname()[1]
+
+    def _endpoint_ready(self, task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.error("Datagram endpoint failed: %s", task.exception())
+            return
+        self._transport = task.result()[0]
+
+    def _read_blocking(self, sock):
+        while self._sock is sock:
+            self._recv_counts[2] += 1
+            try:
+                data, addr = sock.recvfrom(RECV_BUFFER)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self._received(data, addr)
+
+    def _received(self, data, addr):
+        self._recv_counts[0] += 1
+        self._recv_counts[1] += len(data)
+        self._deliver(data, addr[0].encode("utf-8"), addr[1])
+
+    def _enqueue(self, data, sender_ip, sender_port):
+        if len(self._ingress) >= self._ingress_capacity:
+            self._ingress_dropped += 1
+            return
+        self._ingress.append((data, sender_ip, sender_port))
+        if not self._ingress_pending:
+            self._ingress_pending = True
+            if self._loop is not None:
+                self._loop.call_soon(self._on_ready)
+            else:
+                self._on_ready()
+
+    def poll_messages(self, out, max_count, arena, arena_len):
+        self._ingress_pending = False
+        count = 0
+        used = 0
+        base = ctypes.addressof(arena)
+        while self._ingress and count < max_count:
+            data, sender_ip, sender_port = self._ingress[0]
+            if len(data) > arena_len - used:
+                break
+            self._ingress.popleft()
+            ctypes.memmove(base + used, data, len(data))
+            record = out[count]
+            record.sender_ip = sender_ip
+            record.sender_port = sender_port
+            record.length = len(data)
+            record.offset = used
+            used += len(data)
+            count += 1
+        return count
+
+    def stop_udp_listener(self):
+        sock, self._sock = self._sock, None
+        if self._endpoint is not None and not self._endpoint.done():
+            self._endpoint.cancel()
+        if self._transport is not None:
+            self._transport.close()
+        elif sock is not None:
+            sock.close()
+        if self._reader is not None:
+            self._reader.join()
+        self._transport = self._endpoint = self._reader = self._loop = None
+        self._ingress.clear()
+        self._ingress_pending = False
+
+    # --- Counters ---
+
+    def get_ingress_dropped(self):
+        return self._ingress_dropped
+
+    def get_recv_stats(self, out, max_len):
+        values = (*self._recv_counts, self._ingress_dropped)
+        written = min(len(values), max_len)
+        for i in range(written):
+            out[i] = values[i]
+        return written
+
+    def get_send_stats(self, out, max_len):
+        written = 0
+        for kind in self._send_socket_kinds:
+            if written + 2 > max_len:
+                break
+            out[written], out[written + 1] = self._send_counts[kind]
+            written += 2
+        return written
+
+    # --- Sending ---
+
+    def _sender(self, kind):
+        sock = self._senders.get(kind)
+        if sock is not None:
+            return sock
+        with self._senders_lock:
+            sock = self._senders.get(kind)
+            if sock is None:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                if kind == "broadcast":
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                elif kind == "multicast":
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+                    # local instances on this host must hear each other
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+                self._senders[kind] = sock
+        return sock
+
+    def _send_to(self, payload, addr, port):
+        kind = classify_destination(addr, self._directed_broadcasts)
+        try:
+            self._sender(kind).sendto(payload, (addr, port))
+            self._send_counts[kind][0] += 1
+            return True
+        except OSError:
+            self._send_counts[kind][1] += 1
+            return False
+
+    def send_udp_message(self, message_bytes, addr_bytes, port):
+        self.send_udp_datagram(message_bytes, len(message_bytes), addr_bytes, port)
+
+    def send_udp_datagram(self, data, length, addr_bytes, port):
+        addr = addr_bytes.decode("utf-8") if isinstance(addr_bytes, (bytes, bytearray)) else str(addr_bytes)
+        return 1 if self._send_to(bytes(data[:length]), addr, port) else 0
+
+    def send_udp_batch(self, messages, lengths, recipient_ips, ports, count):
+        # Read through the raw pointers: indexing a c_char_p array stops at NUL
+        pointers = ctypes.cast(messages, ctypes.POINTER(ctypes.c_void_p))
+        sent = 0
+        for i in range(count):
+            payload = ctypes.string_at(pointers[i], lengths[i])
+            if self._send_to(payload, recipient_ips[i].decode("utf-8"), ports[i]):
+                sent += 1
+        return sent
+
+    def send_broadcast_message(self, message_bytes, port):
+        self.send_udp_message(message_bytes, b"255.255.255.255", port)
+
+    def set_broadcast_addresses(self, ips, count):
+        self._directed_broadcasts = frozenset(ips[i].decode("utf-8") for i in range(count))
+        return count
+
+    # --- Multicast and addressing ---
+
+    def _membership(self, option, multicast_ip_bytes):
+        sock = self._sock
+        if sock is None:
+            return 0
+        try:
+            mreq = struct.pack("4s4s", socket.inet_aton(multicast_ip_bytes.decode("utf-8")), socket.inet_aton("0.0.0.0"))
+            sock.setsockopt(socket.IPPROTO_IP, option, mreq)
+        except (OSError, UnicodeDecodeError):
+            return 0
+        return 1
+
+    def join_multicast_group(self, multicast_ip_bytes):
+        return self._membership(socket.IP_ADD_MEMBERSHIP, multicast_ip_bytes)
+
+    def leave_multicast_group(self, multicast_ip_bytes):
+        return self._membership(socket.IP_DROP_MEMBERSHIP, multicast_ip_bytes)
+
+    def get_local_ip(self, out_buffer, max_len):
+        """The address of the interface that routes off-host; nothing is sent."""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            try:
+                probe.connect(("8.8.8.8", 53))
+                ip_bytes = probe.getsockname()[0].encode("utf-8")
+            except OSError:
+                return 0
+        if len(ip_bytes) >= max_len:
+            return 0
+        out_buffer[:len(ip_bytes) + 1] = ip_bytes + b"\0"
+        return 1
@@ -0,0 +1,176 @@
+"""
+Application-level fragmentation for datagrams above the path MTU.
+
+Large payloads are split into fragments that each fit a single
+Ethernet/Wi-Fi frame, so the IP layer never has to fragment them. Every
+fragment starts with a small binary header that can never be mistaken for
+JSON:
+
+    magic "WNF" | version u8 | message_id u32 | index u16 | count u16
+
+The receiver collects fragments per sender in a Reassembler, which bounds
+the memory it is willing to spend and evicts messages that never complete.
+"""
+import itertools
+import os
+import random
+import struct
+import time
+from collections import OrderedDict
+
+MAGIC = b"WNF"
+VERSION = 1
+HEADER = struct.Struct("!3sBIHH")
+
+# Payload bytes per fragment; with the header this stays below a 1500 byte MTU
+# after IP/UDP headers and leaves room for tunnels/VPN overhead.
+FRAGMENT_PAYLOAD = int(os.getenv("FRAGMENT_PAYLOAD", "1200"))
+MAX_FRAGMENTS = int(os.getenv("FRAGMENT_MAX_COUNT", "1024"))
+REASSEMBLY_TIMEOUT = float(os.getenv("FRAGMENT_TIMEOUT", "10"))
+MAX_SENDER_BYTES = int(os.getenv("FRAGMENT_MAX_SENDER_BYTES", str(2 * 1024 * 1024)))
+MAX_SENDER_MESSAGES = int(os.getenv("FRAGMENT_MAX_SENDER_MESSAGES", "16"))
+MAX_TOTAL_BYTES = int(os.getenv("FRAGMENT_MAX_TOTAL_BYTES", str(16 * 1024 * 1024)))
+
+_message_ids = itertools.count(random.getrandbits(31))
+
+
+def needs_fragmenting(payload) -> bool:
+    return len(payload) > FRAGMENT_PAYLOAD
+
+
+def is_fragment(datagram) -> bool:
+    return len(datagram) >= HEADER.size and datagram[:len(MAGIC)] == MAGIC
+
+
+def split(payload) -> list:
+    """Splits ``payload`` into ready-to-send fragment datagrams."""
+    view = memoryview(payload)
+    count = (len(view) + FRAGMENT_PAYLOAD - 1) // FRAGMENT_PAYLOAD
+    if count > MAX_FRAGMENTS:
+        raise ValueError(f"payload of {len(view)} bytes exceeds {MAX_FRAGMENTS} fragments")
+
+    message_id = next(_message_ids) & 0xFFFFFFFF
+    return [
+        HEADER.pack(MAGIC, VERSION, message_id, index, count)
+        + view[index * FRAGMENT_PAYLOAD:(index + 1) * FRAGMENT_PAYLOAD]
+        for index in range(count)
+    ]
+
+
+class _Partial:
+    __slots__ = ("sender", "count", "chunks", "received", "size", "deadline")
+
+    def __init__(self, sender, count, deadline):
+        self.sender = sender
+        self.count = count
+        self.chunks = [None] * count
+        self.received = 0
+        self.size = 0
+        self.deadline = deadline
+
+
+class Reassembler:
+    """Collects fragments into whole payloads with bounded memory.
+
+    Limits are enforced per sender (bytes and in-flight messages) and
+    globally; when one is hit the oldest partial message is dropped.
+    Partials that do not complete within ``timeout`` seconds are evicted.
+    """
+
+    def __init__(self, timeout=REASSEMBLY_TIMEOUT, max_sender_bytes=MAX_SENDER_BYTES,
+                 max_sender_messages=MAX_SENDER_MESSAGES, max_total_bytes=MAX_TOTAL_BYTES):
+        self.timeout = timeout
+        self.max_sender_bytes = max_sender_bytes
+        self.max_sender_messages = max_sender_messages
+        self.max_total_bytes = max_total_bytes
+        # Insertion order == arrival order of the first fragment, so the
+        # front of the dict is always the next partial to time out.
+        self._partials = OrderedDict()
+        self._sender_bytes = {}
+        self._sender_messages = {}
+        self._total_bytes = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._partials)
+
+    @property
+    def buffered_bytes(self):
+        return self._total_bytes
+
+    def add(self, sender, datagram, now=None):
+        """Feeds one fragment datagram from ``sender``.
+
+        Returns the reassembled payload as bytes once the last fragment
+        arrives, otherwise None.
+        """
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+
+        magic, version, message_id, index, count = HEADER.unpack_from(datagram)
+        if magic != MAGIC or version != VERSION or count == 0 or count > MAX_FRAGMENTS or index >= count:
+            return None
+        chunk = bytes(datagram[HEADER.size:])
+
+        if count == 1:
+            return chunk
+
+        key = (sender, message_id)
+        partial = self._partials.get(key)
+        if partial is None:
+            partial = _Partial(sender, count, now + self.timeout)
+            self._partials[key] = partial
+            self._sender_messages[sender] = self._sender_messages.get(sender, 0) + 1
+        elif partial.count != count:
+            self._drop(key)
+            return None
+
+        if partial.chunks[index] is not None:
+            return None  # duplicate
+
+        partial.chunks[index] = chunk
+        partial.received += 1
+        partial.size += len(chunk)
+        self._sender_bytes[sender] = self._sender_bytes.get(sender, 0) + len(chunk)
+        self._total_bytes += len(chunk)
+
+        if partial.received == partial.count:
+            self._drop(key, evicted=False)
+            return b"".join(partial.chunks)
+
+        self._enforce_limits(sender)
+        return None
+
+    def expire(self, now=None):
+        """Evicts partial messages whose reassembly window has passed."""
+        now = time.monotonic() if now is None else now
+        while self._partials:
+            key, partial = next(iter(self._partials.items()))
+            if partial.deadline > now:
+                break
+            self._drop(key)
+
+    def _enforce_limits(self, sender):
+        while (self._sender_bytes.get(sender, 0) > self.max_sender_bytes
+               or self._sender_messages.get(sender, 0) > self.max_sender_messages):
+            oldest = next((key for key, p in self._partials.items() if p.sender == sender), None)
+            if oldest is None:
+                break
+            self._drop(oldest)
+        while self._total_bytes > self.max_total_bytes and self._partials:
+            self._drop(next(iter(self._partials)))
+
+    def _drop(self, key, evicted=True):
+        partial = self._partials.pop(key)
+        sender = partial.sender
+        self._total_bytes -= partial.size
+        remaining_bytes = self._sender_bytes.get(sender, 0) - partial.size
+        remaining_messages = self._sender_messages.get(sender, 0) - 1
+        if remaining_messages > 0:
+            self._sender_bytes[sender] = remaining_bytes
+            self._sender_messages[sender] = remaining_messages
+        else:
+            self._sender_bytes.pop(sender, None)
+            self._sender_messages.pop(sender, None)
+        if evicted:
+            self.evicted += 1
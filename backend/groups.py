@@ -0,0 +1,127 @@
+"""
+Named groups over multicast.
+
+Every group name maps to a fixed address in the organization-local scope
+239.192.0.0/16, derived from a hash of the name, so peers agree on it
+without coordination. A GROUP_MESSAGE is sent once to that address on the
+discovery port and reaches every member listening there. Members that
+cannot receive it get unicast copies in the same batched core call. That
+covers peers listening on another port and peers whose multicast join
+failed.
+
+Membership travels with discovery. Announces and heartbeats carry the
+groups a peer has joined (``groups``) and whether it receives multicast
+(``mcast``). Receivers always check the group name, because two names
+can share an address and a host may deliver traffic for groups that
+another socket joined.
+"""
+import hashlib
+import re
+
+GROUP_PORT = 8888
+_NAME = re.compile(r"^[A-Za-z0-9_.\- ]{1,64}$")
+
+
+def validate(name: str) -> str:
+    if not isinstance(name, str) or not _NAME.match(name):
+        raise ValueError("Group names are 1-64 letters, digits, spaces, '.', '_' or '-'")
+    return name
+
+
+def group_address(name: str) -> str:
+    digest = hashlib.sha1(validate(name).encode("utf-8")).digest()
+    return f"239.192.{digest[0]}.{digest[1]}"
+
+
+class _Membership:
+    __slots__ = ("ip", "port", "groups", "multicast")
+
+    def __init__(self, ip, port, groups, multicast):
+        self.ip = ip
+        self.port = port
+        self.groups = groups
+        self.multicast = multicast
+
+
+class GroupDirectory:
+    """Which groups we joined and which peers belong to which group.
+
+    Pure bookkeeping: joining the multicast address itself is up to the
+    caller, which reports whether it worked through ``add_local``.
+    """
+
+    def __init__(self, port=GROUP_PORT):
+        self.port = port
+        self._local = {}    # name -> True if our multicast join succeeded
+        self._peers = {}    # peer key -> _Membership
+        self._members = {}  # name -> set of peer keys
+
+    @property
+    def multicast_ok(self):
+        return all(self._local.values())
+
+    def local_names(self):
+        return sorted(self._local)
+
+    def is_member(self, name):
+        return name in self._local
+
+    def add_local(self, name, multicast_ok=True):
+        self._local[validate(name)] = multicast_ok
+
+    def remove_local(self, name):
+        return self._local.pop(name, None) is not None
+
+    def update_peer(self, key, ip, port, names, multicast=True):
+        """Records the groups a peer advertised in its latest discovery frame."""
+        names = frozenset(n for n in names or () if isinstance(n, str) and _NAME.match(n))
+        current = self._peers.get(key)
+        if current is not None and current.groups == names:
+            current.multicast = bool(multicast)
+            return
+        self.forget_peer(key)
+        if not names:
+            return
+        self._peers[key] = _Membership(ip, port, names, bool(multicast))
+        for name in names:
+            self._members.setdefault(name, set()).add(key)
+
+    def forget_peer(self, key):
+        membership = self._peers.pop(key, None)
+        if membership is None:
+            return
+        for name in membership.groups:
+            members = self._members.get(name)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._members[name]
+
+    def route(self, name):
+        """How to reach every known member of ``name``.
+
+        Returns ``(use_multicast, unicast)``: whether one datagram to the
+        group address is needed, and the ``(ip, port)`` of members that must
+        get their own copy.
+        """
+        validate(name)
+        use_multicast, unicast = False, []
+        for key in sorted(self._members.get(name, ())):
+            membership = self._peers[key]
+            if membership.multicast and membership.port == self.port:
+                use_multicast = True
+            else:
+                unicast.append((membership.ip, membership.port))
+        return use_multicast, unicast
+
+    def describe(self):
+        names = set(self._local) | set(self._members)
+        return [
+            {
+                "name": name,
+                "address": group_address(name),
+                "joined": name in self._local,
+                "members": sorted(self._members.get(name, ())),
+            }
+            for name in sorted(names)
+        ]
@@ -0,0 +1,146 @@
+"""
+Persistent message history.
+
+Messages are appended to a SQLite database in WAL mode, indexed by
+conversation (the peer key, or ``group:<name>`` for groups) and
+timestamp, and read back a page at a time, newest first.
+
+The connection lives on the store's own single-thread executor. Appends
+from the event loop only queue the row, get their id immediately, and
+are written in batches: one transaction per flush, however many messages
+arrived in the meantime. Reads run on the same thread, after every
+append queued before them.
+
+Until ``open()`` is called the store records nothing, so importing the
+API has no side effects on disk.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import log
+
+HISTORY_PATH = os.getenv(
+    "WHISPERNET_HISTORY", os.path.join(os.path.expanduser("~"), ".whispernet", "history.db")
+)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    peer TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    direction TEXT NOT NULL,
+    sender TEXT,
+    nickname TEXT,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_peer_ts ON messages (peer, ts, id);
+"""
+logger = log.get_logger("history")
+
+_COLUMNS = ("id", "peer", "ts", "direction", "sender", "nickname", "content")
+
+
+def group_key(name: str) -> str:
+    return f"group:{name}"
+
+
+class MessageStore:
+    def __init__(self):
+        self.path = None
+        self._db = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whispernet-history")
+        self._lock = threading.Lock()
+        self._pending = []
+        self._flush_queued = False
+        self._next_id = 1
+
+    @property
+    def is_open(self):
+        return self._db is not None
+
+    async def open(self, path=HISTORY_PATH):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._open, path)
+
+    def _open(self, path):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(_SCHEMA)
+        self._next_id = (db.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0) + 1
+        self.path = path
+        self._db = db
+
+    def append(self, peer, direction, content, sender=None, nickname=None, ts=None):
+        """Records one message; returns it as a dict (with its id), or None
+        if the store is not open."""
+        if self._db is None:
+            return None
+        ts = int(time.time() * 1000) if ts is None else ts
+        content = str(content)
+        with self._lock:
+            message_id = self._next_id
+            self._next_id += 1
+            self._pending.append((message_id, peer, ts, direction, sender, nickname, content))
+            queue_flush = not self._flush_queued
+            self._flush_queued = True
+        if queue_flush:
+            self._executor.submit(self._flush)
+        return dict(zip(_COLUMNS, (message_id, peer, ts, direction, sender, nickname, content)))
+
+    def _flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._flush_queued = False
+        if not rows:
+            return
+        try:
+            with self._db:
+                self._db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.error("Failed to store %s messages: %s", len(rows), e)
+
+    async def page(self, peer, before=None, before_id=None, limit=PAGE_SIZE):
+        """Up to ``limit`` messages of one conversation older than the cursor,
+        oldest first, plus the cursor for the page before them (or None)."""
+        if self._db is None:
+            return [], None
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._page, peer, before, before_id, limit
+        )
+
+    def _page(self, peer, before, before_id, limit):
+        self._flush()
+        if before is None:
+            where, args = "peer = ?", (peer,)
+        elif before_id is None:
+            where, args = "peer = ? AND ts < ?", (peer, before)
+        else:
+            where, args = "peer = ? AND (ts < ? OR (ts = ? AND id < ?))", (peer, before, before, before_id)
+        rows = self._db.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM messages WHERE {where} ORDER BY ts DESC, id DESC LIMIT ?",
+            args + (limit + 1,),
+        ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        messages = [dict(zip(_COLUMNS, row)) for row in reversed(rows)]
+        cursor = {"before": messages[0]["ts"], "before_id": messages[0]["id"]} if more else None
+        return messages, cursor
+
+    def close(self):
+        if self._db is not None:
+            self._executor.submit(self._close).result()
+        self._executor.shutdown(wait=False)
+
+    def _close(self):
+        self._flush()
+        self._db.close()
+        self._db = None
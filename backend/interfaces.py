@@ -0,0 +1,141 @@
+"""
+Live table of this host's IPv4 interfaces.
+
+The table answers two questions. ``is_own(ip)`` is a set lookup that tells
+self-echoes apart from peers. ``broadcasts`` lists the directed broadcast
+address of every interface that has one, so discovery reaches each
+attached subnet. 255.255.255.255 only leaves through the default route,
+and many routers drop it.
+
+Scans use ifaddr plus the core's routed-address probe and run on the I/O
+executor. On Linux a netlink socket reports address and link changes, so
+a laptop that changes networks rescans right away. Elsewhere, and as a
+backstop, the table is rescanned every INTERFACE_REFRESH seconds.
+"""
+import ipaddress
+import os
+import socket
+
+from backend import log
+
+logger = log.get_logger("interfaces")
+
+INTERFACE_REFRESH = float(os.getenv("INTERFACE_REFRESH", "30"))
+LOOPBACK_IP = "127.0.0.1"
+
+# rtnetlink multicast groups (linux/rtnetlink.h)
+_RTMGRP_LINK = 0x1
+_RTMGRP_IPV4_IFADDR = 0x10
+
+
+class Interface:
+    __slots__ = ("name", "ip", "prefix", "broadcast")
+
+    def __init__(self, name, ip, prefix, broadcast):
+        self.name = name
+        self.ip = ip
+        self.prefix = prefix
+        self.broadcast = broadcast
+
+    def as_payload(self):
+        return {"name": self.name, "ip": self.ip, "prefix": self.prefix, "broadcast": self.broadcast}
+
+
+def directed_broadcast(ip, prefix):
+    """The subnet broadcast address for ``ip/prefix``, or None where there is none."""
+    try:
+        network = ipaddress.IPv4Network(f"{ip}/{prefix}", strict=False)
+    except ValueError:
+        return None
+    if network.prefixlen >= 31 or network.is_loopback:
+        return None
+    return str(network.broadcast_address)
+
+
+def scan_adapters():
+    """(name, ip, prefix) for every IPv4 address on the host."""
+    import ifaddr  # imported on first scan, on the I/O executor, not at startup
+
+    found = []
+    for adapter in ifaddr.get_adapters():
+        for ip in adapter.ips:
+            if isinstance(ip.ip, str):
+                found.append((adapter.nice_name, ip.ip, ip.network_prefix))
+    return found
+
+
+class InterfaceTable:
+    """Own addresses and per-interface broadcast targets.
+
+    ``scan()`` returns ``(name, ip, prefix)`` tuples; ``probe()`` returns
+    the routed primary address or None. Both run only inside ``refresh``.
+    Readers see whole snapshots, because every attribute is replaced and
+    never mutated.
+    """
+
+    def __init__(self, scan=scan_adapters, probe=lambda: None):
+        self._scan = scan
+        self._probe = probe
+        self.interfaces = ()
+        self.own_ips = frozenset((LOOPBACK_IP,))
+        self.broadcasts = ()
+
+    def is_own(self, ip):
+        return ip in self.own_ips
+
+    def refresh(self):
+        """Rescans; returns True if the addresses or broadcast targets changed."""
+        try:
+            found = self._scan()
+        except Exception as e:
+            logger.warning("Interface scan failed: %s", e)
+            found = [(i.name, i.ip, i.prefix) for i in self.interfaces]
+
+        interfaces = []
+        for name, ip, prefix in found:
+            if ip == LOOPBACK_IP:
+                continue
+            interfaces.append(Interface(name, ip, prefix, directed_broadcast(ip, prefix)))
+        own_ips = {LOOPBACK_IP}
+        own_ips.update(i.ip for i in interfaces)
+        primary = self._probe()
+        if primary:
+            own_ips.add(primary)
+        broadcasts = tuple(sorted({i.broadcast for i in interfaces if i.broadcast}))
+
+        own_ips = frozenset(own_ips)
+        changed = own_ips != self.own_ips or broadcasts != self.broadcasts
+        self.interfaces = tuple(interfaces)
+        self.own_ips = own_ips
+        self.broadcasts = broadcasts
+        return changed
+
+    def describe(self):
+        return {
+            "interfaces": [i.as_payload() for i in self.interfaces],
+            "own_ips": sorted(self.own_ips),
+            "broadcasts": list(self.broadcasts),
+        }
+
+
+def open_change_monitor():
+    """A non-blocking socket that becomes readable when interface addresses
+    or links change, or None where that is not available (non-Linux)."""
+    if not hasattr(socket, "AF_NETLINK"):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, _RTMGRP_LINK | _RTMGRP_IPV4_IFADDR))
+    except OSError:
+        return None
+    sock.setblocking(False)
+    return sock
+
+
+def drain_change_monitor(sock):
+    """Discards pending notifications; the table rescans instead of parsing them."""
+    try:
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass  # BlockingIOError once empty
@@ -0,0 +1,39 @@
+"""
+Dedicated executor for blocking native calls.
+
+ctypes releases the GIL while a core function runs, but the calling thread
+still waits for it, and the core's sender sockets are blocking. Every send
+and interface scan goes through this executor (``run()`` from coroutines,
+``executor().submit`` from callbacks and the receive path) so a slow route
+lookup or a full socket buffer stalls a worker thread instead of the event
+loop.
+
+The pool defaults to a single thread so datagrams submitted in order also
+leave in order; IO_WORKERS raises it when many independent sends overlap.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+IO_WORKERS = int(os.getenv("IO_WORKERS", "1"))
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="whispernet-io")
+    return _executor
+
+
+async def run(fn, *args):
+    """Runs ``fn(*args)`` on the I/O executor and awaits its result."""
+    return await asyncio.get_running_loop().run_in_executor(executor(), fn, *args)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
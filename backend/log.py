@@ -0,0 +1,122 @@
+"""
+Non-blocking logging for the backend.
+
+Every ``whispernet.*`` logger feeds one bounded in-memory queue. A
+background thread drains it to stdout, so packet handling and request
+handlers never wait on a slow pipe or console. When the queue is full,
+records are dropped and counted rather than blocking the caller.
+
+Repeated events are rate limited per message template. Each one gets a
+token bucket (LOG_RATE_BURST records, refilled at LOG_RATE_PER_SEC), and
+the next record that gets through reports how many were suppressed.
+
+Message bodies only reach the log through ``content()``, which hides
+them unless LOG_REDACT_CONTENT=0.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", "20"))
+LOG_RATE_PER_SEC = float(os.getenv("LOG_RATE_PER_SEC", "2"))
+LOG_REDACT_CONTENT = os.getenv("LOG_REDACT_CONTENT", "1") != "0"
+
+ROOT = "whispernet"
+
+
+def content(text) -> str:
+    """A message body as it may appear in the log."""
+    if not LOG_REDACT_CONTENT:
+        return str(text)
+    return f"<{len(str(text))} chars>"
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per message template; warnings and errors pass through."""
+
+    def __init__(self, burst=LOG_RATE_BURST, per_second=LOG_RATE_PER_SEC, clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.per_second = per_second
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}  # template -> [tokens, last refill, suppressed since last pass]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(record.msg)
+            if bucket is None:
+                bucket = self._buckets[record.msg] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Formatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{line} ({suppressed} similar suppressed)" if suppressed else line
+
+
+_queue = queue.Queue(LOG_QUEUE_SIZE)
+_handler = _DroppingQueueHandler(_queue)
+_handler.addFilter(RateLimitFilter())
+_output = logging.StreamHandler(sys.stdout)
+_output.setFormatter(_Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+_listener = logging.handlers.QueueListener(_queue, _output)
+
+_root = logging.getLogger(ROOT)
+_root.setLevel(LOG_LEVEL)
+_root.addHandler(_handler)
+_root.propagate = False
+_listener.start()
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def dropped() -> int:
+    """Records discarded because the queue was full."""
+    return _handler.dropped
+
+
+def stop():
+    """Flushes whatever is queued; later records are dropped silently."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop)
@@ -2,24 +2,39 @@ import sys
 import os
 if not getattr(sys, "frozen", False):
     sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from backend import startup
+startup.profile_imports()
 import uvicorn
 import asyncio
-import json
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from dotenv import load_dotenv 
 from backend import api
-from backend.bindings import core_lib, ON_MESSAGE_RECEIVED_FUNC
+from backend.bindings import core_lib, ON_INGRESS_READY_FUNC, send_batch
 from backend import config
+from backend import discovery
+from backend import io_pool
+from backend import log
+from backend import wire
 
 load_dotenv()
 
+logger = log.get_logger("main")
+startup.report_imports(logger)
+
 UDP_PORT = 8888
 ACTUAL_UDP_PORT = 8888
+# Listener sockets sharing UDP_PORT via SO_REUSEPORT, each with its own
+# receive thread and queue (native core on Linux only)
+RECV_SHARDS = int(os.getenv("RECV_SHARDS", "1"))
 MULTICAST_IP = b"239.255.255.250" # Modern Router-Friendly IP
-c_callback_handler = ON_MESSAGE_RECEIVED_FUNC(api.handle_incoming_message)
+BROADCAST_IP = b"255.255.255.255"
+# Discovery goes out as compact binary frames; DISCOVERY_WIRE=json keeps the
+# legacy JSON broadcast for networks full of older peers.
+DISCOVERY_VERSION = wire.JSON_VERSION if os.getenv("DISCOVERY_WIRE", "binary") == "json" else config.PROTOCOL_VERSION
+c_ingress_ready_handler = ON_INGRESS_READY_FUNC(api.on_ingress_ready)
 
 app = FastAPI(title="WhisperNet Backend")
 
@@ -59,56 +74,100 @@ if os.path.exists(static_dir):
             return FileResponse(local_path)
         return FileResponse(os.path.join(static_dir, "index.html"))
 
-async def discover_peers_task():
-    """Sends out discovery packets using Broadcast, Multicast, and Localhost."""
+async def discover_peers_task(interfaces_ready):
+    """Sends discovery announces and heartbeats using Broadcast, Multicast, and Localhost.
+
+    backend/discovery.py decides when: announces start fast and back off
+    while the peer set is stable, heartbeats keep us alive in between.
+    The first announce waits for the startup interface scan, which picks
+    the broadcast addresses and lets us recognise our own echoes.
+    """
+    try:
+        await interfaces_ready
+    except Exception:
+        logger.exception("Startup interface scan failed; announcing to 255.255.255.255")
+    first_sent = False
+    loop = asyncio.get_running_loop()
+    scheduler = api.discovery_scheduler
+    scheduler.start(loop.time())
     while True:
-        discovery_payload = {
-            "type": "DISCOVERY_REQUEST",
-            "nickname": config.NICKNAME,
-            "version": config.PROTOCOL_VERSION,
-            "port": ACTUAL_UDP_PORT 
-        }
-        discovery_message = json.dumps(discovery_payload).encode("utf-8")
-        
-        # 1. Broadast via the new C++ function (shouts to whole subnet)
-        core_lib.send_broadcast_message(discovery_message, UDP_PORT)
+        await asyncio.sleep(max(0.0, scheduler.next_wakeup() - loop.time()))
+        now = loop.time()
+        action = scheduler.due(now)
+        if action is None:
+            continue
+        # One bad round (say, a peer entry the core rejects) must not end discovery
+        try:
+            await _send_discovery_round(scheduler, action, now)
+        except Exception:
+            logger.exception("Discovery round failed")
+            continue
+        if not first_sent:
+            first_sent = True
+            logger.info("First discovery sent %.0f ms after launch", startup.elapsed_ms())
+
+async def _send_discovery_round(scheduler, action, now):
+    """Builds one announce or heartbeat round and sends it as a single batch."""
+    frame_type = "DISCOVERY_REQUEST" if action == discovery.ANNOUNCE else "HEARTBEAT"
+    discovery_message = api.encode_discovery(frame_type, DISCOVERY_VERSION)
+
+    # All of these go out in a single core call (one sendmmsg() on Linux):
+    # 1. Broadcast to every attached subnet's directed broadcast address
+    #    (255.255.255.255 only if no interface has one)
+    # 2. Multicast (bypasses restrictive routers)
+    # 3. Localhost (Guarantees loopback works if no internet connection exists)
+    # 4. Unicast heartbeats to peers on other ports, which never hear 1-3
+    broadcasts = [ip.encode("utf-8") for ip in api.interface_table.broadcasts] or [BROADCAST_IP]
+    datagrams = [(discovery_message, ip, UDP_PORT) for ip in broadcasts]
+    datagrams += [
+        (discovery_message, MULTICAST_IP, UDP_PORT),
+        (discovery_message, b"127.0.0.1", UDP_PORT),
+    ]
+    reachable = [p for p in api.discovered_peers.snapshot() if p.version >= wire.BINARY_VERSION]
+    for peer in scheduler.unicast_heartbeat_targets(reachable, now):
+        heartbeat = api.encode_discovery("HEARTBEAT", peer.version)
+        datagrams.append((heartbeat, peer.ip.encode("utf-8"), peer.port))
+    await io_pool.run(send_batch, datagrams)
 
-        # 2. Multicast via the new C++ Multicast feature (bypasses restrictive routers)
-        core_lib.send_udp_message(discovery_message, MULTICAST_IP, UDP_PORT)
-        
-        # 3. Localhost (Guarantees loopback works if no internet connection exists)
-        core_lib.send_udp_message(discovery_message, b"127.0.0.1", UDP_PORT)
-        
-        await asyncio.sleep(5)
-        
 @app.on_event("startup")
 async def startup_event():
     global ACTUAL_UDP_PORT
-    print("Starting WhisperNet core...")
+    logger.info("Starting WhisperNet core...")
     api.loop = asyncio.get_running_loop()
 
-    # Start the core listener (Removed duplicate call)
-    bound_port = core_lib.start_udp_listener(UDP_PORT, c_callback_handler)
+    # Key pair for encrypted sessions; advertised from the first announce on
+    if api.session_keys.start():
+        logger.info("Encryption: %s (public key %s...)", api.session_keys.mode, api.session_keys.public_key[:16])
+
+    # Interface scan (and the core's routed-IP probe) runs off the loop,
+    # alongside opening history and binding the listener
+    interfaces_ready = asyncio.ensure_future(api.refresh_interfaces())
+    await api.history_store.open()
+
+    # Start the core listener; datagrams queue natively and are drained in batches
+    bound_port = core_lib.start_udp_listener_queued_sharded(UDP_PORT, RECV_SHARDS, c_ingress_ready_handler)
     
     if bound_port > 0:
         ACTUAL_UDP_PORT = bound_port
         api.MY_LISTENING_PORT = bound_port 
-        print(f"Successfully bound UDP listener to port: {ACTUAL_UDP_PORT}")
+        logger.info("Successfully bound UDP listener to port: %s", ACTUAL_UDP_PORT)
 
         # Join the Multicast group
         if core_lib.join_multicast_group(MULTICAST_IP):
-            print(f"Successfully joined Multicast Group: {MULTICAST_IP.decode('utf-8')}")
+            logger.info("Successfully joined Multicast Group: %s", MULTICAST_IP.decode('utf-8'))
         else:
-            print("Warning: Failed to join Multicast Group.")
+            logger.warning("Failed to join Multicast Group.")
     else:
-        print("CRITICAL: Failed to bind C++ UDP listener.")
+        logger.critical("Failed to bind C++ UDP listener.")
     
     # Start tasks
-    asyncio.create_task(discover_peers_task())
+    asyncio.create_task(discover_peers_task(interfaces_ready))
     asyncio.create_task(api.check_stale_peers_task()) 
+    asyncio.create_task(api.watch_interfaces_task())
 
     # Open default browser automatically if running in PyInstaller bundled mode
-    if getattr(sys, "frozen", False):
+    # (OPEN_BROWSER=0 to skip, e.g. for bench/startup.py)
+    if getattr(sys, "frozen", False) and os.getenv("OPEN_BROWSER", "1") != "0":
         import webbrowser
         port = int(os.environ.get("API_PORT", 8000))
         
@@ -120,8 +179,11 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    print("Stopping WhisperNet core...")
+    logger.info("Stopping WhisperNet core...")
     core_lib.stop_udp_listener()
+    io_pool.shutdown()
+    api.history_store.close()
+    log.stop()
 
 if __name__ == "__main__":
     port = int(os.environ.get("API_PORT", 8000))
@@ -0,0 +1,217 @@
+"""
+Indexed table of discovered peers.
+
+Peers are keyed by ``"ip:port"``. A secondary count of LAN (non-loopback)
+peers per port answers "is this loopback sighting a duplicate of a LAN
+peer?" in O(1), and expiry runs off a min-heap of deadlines, so a check
+only touches peers whose deadline has actually passed instead of
+rescanning the table.
+
+Each peer has exactly one heap entry. Refreshing a peer only moves its
+``last_seen``; when the entry comes due, a peer that was seen since is
+re-armed at its new deadline and anything else is removed.
+
+PeerFeed turns registry changes into versioned PEER_DELTA frames for the
+UI, coalescing everything that changes within a short window into one frame.
+"""
+import asyncio
+import heapq
+import os
+import threading
+import time
+
+LOOPBACK_IP = "127.0.0.1"
+DELTA_WINDOW = float(os.getenv("PEER_DELTA_WINDOW", "0.1"))
+
+
+class Peer:
+    __slots__ = ("ip", "port", "nickname", "version", "last_seen", "deadline")
+
+    def __init__(self, ip, port, nickname, version, last_seen):
+        self.ip = ip
+        self.port = port
+        self.nickname = nickname
+        self.version = version
+        self.last_seen = last_seen
+        self.deadline = 0.0
+
+    @property
+    def key(self):
+        return f"{self.ip}:{self.port}"
+
+    def as_payload(self):
+        return {"ip": self.key, "nickname": self.nickname}
+
+
+class _TimedLock:
+    """A lock that reports how long each critical section held it."""
+    __slots__ = ("_lock", "_on_release", "_acquired")
+
+    def __init__(self, on_release):
+        self._lock = threading.Lock()
+        self._on_release = on_release
+        self._acquired = 0.0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._acquired = time.perf_counter()
+
+    def __exit__(self, *exc):
+        held = time.perf_counter() - self._acquired
+        self._lock.release()
+        self._on_release(held)
+        return False
+
+
+class PeerRegistry:
+    """Thread-safe peer table with loopback de-duplication and heap expiry.
+
+    ``on_change(kind, peer)`` is called with ``"added"``, ``"updated"`` (the
+    nickname changed) or ``"removed"`` for every visible change.
+    ``on_lock_held(seconds)``, if given, is called after every critical
+    section with how long the table lock was held.
+    """
+
+    def __init__(self, timeout, on_change=None, on_lock_held=None):
+        self.timeout = timeout
+        self._on_change = on_change or (lambda kind, peer: None)
+        self._lock = _TimedLock(on_lock_held) if on_lock_held else threading.Lock()
+        self._peers = {}
+        self._lan_ports = {}  # port -> number of non-loopback peers using it
+        self._expiry = []     # (deadline, key)
+
+    def __len__(self):
+        return len(self._peers)
+
+    def __contains__(self, key):
+        return key in self._peers
+
+    def get(self, key):
+        return self._peers.get(key)
+
+    def snapshot(self):
+        """A list copy of every peer, safe to iterate without the lock."""
+        with self._lock:
+            return list(self._peers.values())
+
+    def observe(self, ip, port, nickname, version, now=None):
+        """Records a discovery sighting.
+
+        Returns True if the visible peer list changed (new peer, new
+        nickname, or a loopback entry replaced by its LAN address), False if
+        the peer was only refreshed, and None if the sighting was dropped as
+        a loopback duplicate of a peer already known by its LAN address.
+        """
+        now = time.monotonic() if now is None else now
+        key = f"{ip}:{port}"
+        with self._lock:
+            changed = False
+            if ip != LOOPBACK_IP:
+                changed = self._remove(f"{LOOPBACK_IP}:{port}") is not None
+            elif self._lan_ports.get(port):
+                return None
+
+            peer = self._peers.get(key)
+            if peer is None:
+                peer = self._peers[key] = Peer(ip, port, nickname, version, now)
+                if ip != LOOPBACK_IP:
+                    self._lan_ports[port] = self._lan_ports.get(port, 0) + 1
+                self._arm(peer, key)
+                self._on_change("added", peer)
+                return True
+
+            if peer.nickname != nickname:
+                peer.nickname = nickname
+                self._on_change("updated", peer)
+                changed = True
+            peer.version = version
+            peer.last_seen = now
+            return changed
+
+    def remove(self, key):
+        with self._lock:
+            return self._remove(key) is not None
+
+    def expire(self, now=None):
+        """Removes peers not seen for ``timeout`` seconds; returns their keys."""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                deadline, key = heapq.heappop(self._expiry)
+                peer = self._peers.get(key)
+                if peer is None or peer.deadline != deadline:
+                    continue  # removed, or entry from an earlier incarnation
+                if peer.last_seen + self.timeout > now:
+                    self._arm(peer, key)
+                else:
+                    self._remove(key)
+                    expired.append(key)
+        return expired
+
+    def _arm(self, peer, key):
+        peer.deadline = peer.last_seen + self.timeout
+        heapq.heappush(self._expiry, (peer.deadline, key))
+
+    def _remove(self, key):
+        peer = self._peers.pop(key, None)
+        if peer is None:
+            return None
+        if peer.ip != LOOPBACK_IP:
+            remaining = self._lan_ports[peer.port] - 1
+            if remaining:
+                self._lan_ports[peer.port] = remaining
+            else:
+                del self._lan_ports[peer.port]
+        self._on_change("removed", peer)
+        return peer
+
+
+class PeerFeed:
+    """Versioned, coalesced peer-list deltas.
+
+    Changes are collected per peer key for ``window`` seconds and published
+    as one ``PEER_DELTA`` frame carrying ``since``/``version``. A client that
+    holds the snapshot at ``since`` applies the events and moves to
+    ``version``; any other client asks for a fresh snapshot. Events are
+    idempotent upserts/deletes, so a snapshot that already reflects pending
+    changes is safe to follow with their delta. Runs on the event loop.
+    """
+
+    def __init__(self, publish, window=DELTA_WINDOW):
+        self._publish = publish
+        self.window = window
+        self.version = 0
+        self._pending = {}  # key -> [existed before the window, latest payload or None]
+        self._flush_handle = None
+
+    def record(self, kind, peer):
+        payload = None if kind == "removed" else peer.as_payload()
+        entry = self._pending.get(peer.key)
+        if entry is None:
+            self._pending[peer.key] = [kind != "added", payload]
+        else:
+            entry[1] = payload
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        events = []
+        for key, (existed, payload) in pending.items():
+            if payload is not None:
+                events.append({"type": "PEER_UPDATED" if existed else "PEER_ADDED", "payload": payload})
+            elif existed:
+                events.append({"type": "PEER_REMOVED", "payload": {"ip": key}})
+        if not events:
+            return  # e.g. a peer that appeared and vanished within one window
+        self.version += 1
+        self._publish({"type": "PEER_DELTA", "since": self.version - 1, "version": self.version, "events": events})
+
+    def snapshot(self, registry):
+        return {
+            "type": "PEER_SNAPSHOT",
+            "version": self.version,
+            "payload": [peer.as_payload() for peer in registry.snapshot()],
+        }
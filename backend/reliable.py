@@ -0,0 +1,309 @@
+"""
+Optional reliable delivery for direct messages.
+
+Reliable MESSAGE frames carry a per-peer sequence number (``seq``) and a
+random per-process session id (``sid``) so a restarted peer is not mistaken
+for a duplicate stream. The receiver answers with an ``ACK`` frame holding
+the highest in-order sequence (``cum``) plus a selective list of the newest
+sequences received beyond it (``sack``). Every transmission also carries
+the lowest sequence the sender still holds (``base``); anything below it
+was delivered or given up on, so the receiver moves ``cum`` up to it
+rather than waiting forever on an abandoned frame.
+
+The sender keeps a sliding window of unacknowledged frames per peer and
+retransmits on an adaptive RTO (RFC 6298 SRTT/RTTVAR with Karn's rule and
+exponential backoff). Every retransmission timer lives in one heap that is
+serviced by a single ``loop.call_at`` handle, and ACKs for a whole ingress
+batch are flushed together on the next loop iteration; no threads or
+per-message tasks are involved.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+from collections import deque
+
+WINDOW_SIZE = int(os.getenv("RELIABLE_WINDOW", "32"))
+MAX_ATTEMPTS = int(os.getenv("RELIABLE_MAX_ATTEMPTS", "6"))
+INITIAL_RTO = float(os.getenv("RELIABLE_INITIAL_RTO", "0.5"))
+MIN_RTO = float(os.getenv("RELIABLE_MIN_RTO", "0.05"))
+MAX_RTO = float(os.getenv("RELIABLE_MAX_RTO", "8"))
+MAX_SACK = 64
+MAX_OUT_OF_ORDER = 1024
+
+_ALPHA = 1 / 8
+_BETA = 1 / 4
+
+
+class _Pending:
+    __slots__ = ("seq", "frame", "future", "first_sent", "deadline", "attempts", "retransmitted")
+
+    def __init__(self, seq, frame, future):
+        self.seq = seq
+        self.frame = frame
+        self.future = future
+        self.first_sent = 0.0
+        self.deadline = 0.0
+        self.attempts = 0
+        self.retransmitted = False
+
+
+class _SendState:
+    __slots__ = ("peer_key", "ip", "port", "next_seq", "in_flight", "backlog", "srtt", "rttvar", "rto",
+                 "last_rtt", "delivered", "failed", "retransmits")
+
+    def __init__(self, peer_key, ip, port):
+        self.peer_key = peer_key
+        self.ip = ip
+        self.port = port
+        self.next_seq = 1
+        self.in_flight = {}
+        self.backlog = deque()
+        self.srtt = None
+        self.rttvar = None
+        self.rto = INITIAL_RTO
+        self.last_rtt = None
+        self.delivered = 0
+        self.failed = 0
+        self.retransmits = 0
+
+    def sample_rtt(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - _BETA) * self.rttvar + _BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - _ALPHA) * self.srtt + _ALPHA * rtt
+        self.rto = min(MAX_RTO, max(MIN_RTO, self.srtt + 4 * self.rttvar))
+        self.last_rtt = rtt
+
+    def base(self):
+        """Lowest sequence not yet acknowledged or abandoned."""
+        if self.in_flight:
+            return min(self.in_flight)
+        return self.backlog[0].seq if self.backlog else self.next_seq
+
+
+class _ReceiveState:
+    __slots__ = ("sid", "cum", "out_of_order")
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.cum = 0
+        self.out_of_order = set()
+
+
+class ReliableChannel:
+    """Sliding-window, ACK-based delivery on top of a datagram transmit function.
+
+    ``transmit(payload: bytes, ip: str, port: int)`` puts one logical payload
+    on the wire; ``local_port()`` returns our listening port for the
+    ``port`` field of outgoing frames. ``encode(peer_key, frame)`` turns a
+    frame dict into bytes for that peer (JSON unless given).
+    """
+
+    def __init__(self, transmit, local_port, encode=None):
+        self._transmit = transmit
+        self._local_port = local_port
+        self._encode = encode or (lambda peer_key, frame: json.dumps(frame).encode("utf-8"))
+        self.session_id = random.getrandbits(32)
+        self._senders = {}
+        self._receivers = {}
+        self._timers = []
+        self._timer_order = itertools.count()
+        self._timer_handle = None
+        self._timer_when = None
+        self._pending_acks = {}
+        self._ack_flush_scheduled = False
+
+    # --- sending -----------------------------------------------------------
+
+    def send(self, peer_key, ip, port, message):
+        """Queues ``message`` (a dict) for reliable delivery to ``peer_key``.
+
+        Returns a future resolving to ``{"delivered": bool, "rtt_ms": float|None,
+        "attempts": int}``.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._senders.get(peer_key)
+        if state is None:
+            state = self._senders[peer_key] = _SendState(peer_key, ip, port)
+        state.ip, state.port = ip, port
+
+        seq = state.next_seq
+        state.next_seq += 1
+        pending = _Pending(seq, dict(message, seq=seq, sid=self.session_id), loop.create_future())
+        state.backlog.append(pending)
+        self._fill_window(state)
+        return pending.future
+
+    def _fill_window(self, state):
+        while state.backlog and len(state.in_flight) < WINDOW_SIZE:
+            pending = state.backlog.popleft()
+            state.in_flight[pending.seq] = pending
+            self._transmit_pending(state, pending)
+
+    def _transmit_pending(self, state, pending):
+        now = asyncio.get_running_loop().time()
+        if pending.attempts == 0:
+            pending.first_sent = now
+        pending.attempts += 1
+        pending.deadline = now + state.rto
+        # Encoded per transmission so ``base`` is current on retransmissions
+        payload = self._encode(state.peer_key, dict(pending.frame, base=state.base()))
+        self._transmit(payload, state.ip, state.port)
+        heapq.heappush(self._timers, (pending.deadline, next(self._timer_order), pending.seq, state))
+        self._arm_timer()
+
+    def _arm_timer(self):
+        if not self._timers:
+            return
+        when = self._timers[0][0]
+        if self._timer_handle is not None and self._timer_when <= when:
+            return
+        if self._timer_handle is not None:
+            self._timer_handle.cancel()
+        self._timer_when = when
+        self._timer_handle = asyncio.get_running_loop().call_at(when, self._on_timer)
+
+    def _on_timer(self):
+        self._timer_handle = None
+        now = asyncio.get_running_loop().time()
+        backed_off = set()
+        while self._timers and self._timers[0][0] <= now:
+            deadline, _, seq, state = heapq.heappop(self._timers)
+            pending = state.in_flight.get(seq)
+            if pending is None or pending.deadline != deadline:
+                continue  # acknowledged or rescheduled since
+            if pending.attempts >= MAX_ATTEMPTS:
+                del state.in_flight[seq]
+                state.failed += 1
+                self._resolve(pending, False, None)
+                self._fill_window(state)
+                continue
+            # Exponential backoff, once per timer expiry for each peer
+            if id(state) not in backed_off:
+                state.rto = min(MAX_RTO, state.rto * 2)
+                backed_off.add(id(state))
+            pending.retransmitted = True
+            state.retransmits += 1
+            self._transmit_pending(state, pending)
+        self._arm_timer()
+
+    def on_ack(self, peer_key, ack):
+        """Processes an ACK frame from ``peer_key``."""
+        state = self._senders.get(peer_key)
+        if state is None or ack.get("sid") != self.session_id:
+            return
+        cum = ack.get("cum", 0)
+        sack = ack.get("sack") or []
+        if not isinstance(cum, int) or not isinstance(sack, list):
+            return
+        sacked = {seq for seq in sack if isinstance(seq, int)}
+        now = asyncio.get_running_loop().time()
+
+        newest_sample = None
+        for seq in [s for s in state.in_flight if s <= cum or s in sacked]:
+            pending = state.in_flight.pop(seq)
+            rtt = now - pending.first_sent
+            if not pending.retransmitted and (newest_sample is None or seq > newest_sample[0]):
+                newest_sample = (seq, rtt)
+            state.delivered += 1
+            self._resolve(pending, True, rtt)
+        if newest_sample is not None:
+            state.sample_rtt(newest_sample[1])
+        self._fill_window(state)
+
+    @staticmethod
+    def _resolve(pending, delivered, rtt):
+        if not pending.future.done():
+            pending.future.set_result({
+                "delivered": delivered,
+                "rtt_ms": round(rtt * 1000, 3) if rtt is not None else None,
+                "attempts": pending.attempts,
+            })
+
+    # --- receiving ---------------------------------------------------------
+
+    def on_message(self, peer_key, ip, port, sid, seq, base=None):
+        """Records a reliable frame from ``peer_key`` and schedules its ACK.
+
+        ``base`` is the sender's lowest outstanding sequence (None from
+        older peers). Returns True if the frame is new and should be
+        delivered, False for duplicates.
+        """
+        state = self._receivers.get(peer_key)
+        if state is None or state.sid != sid:
+            state = self._receivers[peer_key] = _ReceiveState(sid)
+
+        if base is not None and base - 1 > state.cum:
+            # The sender gave up on everything below base; close the hole
+            state.cum = base - 1
+            state.out_of_order = {s for s in state.out_of_order if s > state.cum}
+            while state.cum + 1 in state.out_of_order:
+                state.cum += 1
+                state.out_of_order.discard(state.cum)
+
+        fresh = seq > state.cum and seq not in state.out_of_order
+        if fresh:
+            if seq == state.cum + 1:
+                state.cum = seq
+                while state.cum + 1 in state.out_of_order:
+                    state.cum += 1
+                    state.out_of_order.discard(state.cum)
+            elif len(state.out_of_order) < MAX_OUT_OF_ORDER:
+                state.out_of_order.add(seq)
+            else:
+                fresh = False  # no room to track it; let the sender retry
+
+        self._pending_acks[peer_key] = (ip, port)
+        if not self._ack_flush_scheduled:
+            self._ack_flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_acks)
+        return fresh
+
+    def _flush_acks(self):
+        self._ack_flush_scheduled = False
+        pending_acks, self._pending_acks = self._pending_acks, {}
+        for peer_key, (ip, port) in pending_acks.items():
+            state = self._receivers.get(peer_key)
+            if state is None:
+                continue
+            ack = {
+                "type": "ACK",
+                "port": self._local_port(),
+                "sid": state.sid,
+                "cum": state.cum,
+                "sack": sorted(state.out_of_order)[-MAX_SACK:],
+            }
+            self._transmit(self._encode(peer_key, ack), ip, port)
+
+    # --- bookkeeping -------------------------------------------------------
+
+    def forget(self, peer_key):
+        """Drops receive state and idle send state for a departed peer."""
+        self._receivers.pop(peer_key, None)
+        state = self._senders.get(peer_key)
+        if state is not None and not state.in_flight and not state.backlog:
+            del self._senders[peer_key]
+
+    def stats(self):
+        def ms(value):
+            return round(value * 1000, 3) if value is not None else None
+
+        return {
+            peer_key: {
+                "srtt_ms": ms(state.srtt),
+                "rttvar_ms": ms(state.rttvar),
+                "rto_ms": ms(state.rto),
+                "last_rtt_ms": ms(state.last_rtt),
+                "in_flight": len(state.in_flight),
+                "queued": len(state.backlog),
+                "delivered": state.delivered,
+                "failed": state.failed,
+                "retransmits": state.retransmits,
+            }
+            for peer_key, state in self._senders.items()
+        }
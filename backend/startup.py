@@ -0,0 +1,109 @@
+"""
+Startup timing.
+
+main.py imports this module before anything heavy, so ``elapsed_ms()``
+measures from (nearly) the start of the interpreter: it is logged when
+the first discovery packet goes out. In a --onefile release that clock
+starts after the bundle has been unpacked; bench/startup.py measures the
+whole launch from outside.
+
+PROFILE_IMPORTS=N times every module imported while main.py loads and
+logs the N slowest, by self time (the module's own code) and cumulative
+time (including what it imports). Unlike ``python -X importtime`` this
+also works in a frozen release binary.
+"""
+import builtins
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+PROFILE_IMPORTS = int(os.getenv("PROFILE_IMPORTS", "0"))
+
+_started = time.perf_counter()
+
+
+def elapsed_ms():
+    """Milliseconds since this module was first imported."""
+    return (time.perf_counter() - _started) * 1000
+
+
+class ImportProfiler:
+    """Times modules loaded through ``import`` statements on the installing
+    thread; imports of modules that are already loaded are not counted."""
+
+    def __init__(self):
+        self.self_times = {}
+        self.total_times = {}
+        self._children = []  # per open import: time spent in nested imports
+        self._thread = None
+        self._original = builtins.__import__
+
+    def install(self):
+        self._thread = threading.get_ident()
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        # Modules that captured the hook meanwhile (logging.config keeps
+        # its own reference to __import__) still call it; it then just
+        # passes through
+        builtins.__import__ = self._original
+        self._thread = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = _absolute_name(name, globals, level)
+        if module is None or module in sys.modules or threading.get_ident() != self._thread:
+            return self._original(name, globals, locals, fromlist, level)
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._children.pop()
+            self.self_times[module] = self.self_times.get(module, 0.0) + elapsed - nested
+            self.total_times[module] = self.total_times.get(module, 0.0) + elapsed
+            if self._children:
+                self._children[-1] += elapsed
+
+    def slowest(self, limit):
+        """[(module, self_ms, cumulative_ms)], slowest self time first."""
+        ranked = sorted(self.self_times, key=self.self_times.get, reverse=True)[:limit]
+        return [(m, self.self_times[m] * 1000, self.total_times[m] * 1000) for m in ranked]
+
+
+def _absolute_name(name, globals, level):
+    if not level:
+        return name
+    try:
+        return importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__") or "")
+    except (ImportError, ValueError):
+        return None
+
+
+_profiler = None
+
+
+def profile_imports():
+    """Starts timing imports if PROFILE_IMPORTS is set."""
+    global _profiler
+    if PROFILE_IMPORTS > 0 and _profiler is None:
+        _profiler = ImportProfiler()
+        _profiler.install()
+
+
+def report_imports(logger):
+    """Stops timing imports and logs the slowest ones."""
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.uninstall()
+    # One record for the whole table: per-line records would share a
+    # template and be cut off by the log rate limiter
+    rows = "".join(
+        f"\n  {self_ms:8.1f} {total_ms:8.1f}  {module}"
+        for module, self_ms, total_ms in _profiler.slowest(PROFILE_IMPORTS)
+    )
+    logger.info("Imports done after %.0f ms; slowest (self / cumulative ms):%s", elapsed_ms(), rows)
+    _profiler = None
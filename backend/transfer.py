@@ -0,0 +1,793 @@
+"""
+Chunked, resumable LAN file transfers over the core's UDP path.
+
+Control frames are small JSON datagrams:
+
+    FILE_OFFER   sender -> receiver   id, name, size, chunk_size, sha256
+    FILE_STATE   receiver -> sender   authoritative resync: received count and
+                                      the missing chunk ranges (accept/resume/poll)
+    FILE_ACK     receiver -> sender   incremental: received count, lowest missing
+                                      chunk, gaps below the highest chunk seen in
+                                      this session and an echoed timestamp
+    FILE_POLL    sender -> receiver   "send me a FILE_STATE" after an ACK timeout
+    FILE_CANCEL  either direction
+
+Data travels as binary datagrams with a fixed header that can never be
+mistaken for JSON (see CHUNK_HEADER), sent in bursts through one
+``send_batch`` call. The sender slices chunks straight out of an mmap of the
+source file and paces itself with a congestion window (slow start, additive
+increase, multiplicative decrease on reported gaps). The receiver writes
+into a preallocated, memory-mapped ``<name>.<id>.wnpart`` file and tracks a bitmap of
+received chunks, persisted next to it, so a transfer picks up where it left
+off when a peer drops out and comes back. The sidecar is only trusted for
+the same offer id and content hash, and the finished file is checked
+against the offered SHA-256 before it is moved into place.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import time
+from collections import deque
+
+MAGIC = b"WNC"
+VERSION = 1
+# magic, version, transfer id, chunk index, sender timestamp (ms, wrapping)
+CHUNK_HEADER = struct.Struct("!3sBIII")
+
+CHUNK_SIZE = int(os.getenv("TRANSFER_CHUNK_SIZE", "1200"))
+# Limits on what a peer's FILE_OFFER may ask us to track. A chunk must fit
+# in one UDP datagram (65507 bytes of payload) behind its header.
+MIN_CHUNK_SIZE = 256
+MAX_CHUNK_SIZE = 65507 - CHUNK_HEADER.size
+MAX_FILE_SIZE = int(os.getenv("TRANSFER_MAX_SIZE", str(64 << 30)))
+MAX_CHUNKS = 1 << 26  # an 8 MB bitmap
+MAX_OFFERS_PER_PEER = int(os.getenv("TRANSFER_MAX_OFFERS_PER_PEER", "8"))
+MAX_PENDING_OFFERS = int(os.getenv("TRANSFER_MAX_PENDING_OFFERS", "64"))
+INITIAL_CWND = 16
+MAX_CWND = int(os.getenv("TRANSFER_MAX_CWND", "4096"))
+SEND_BURST = 64
+MAX_RANGES = 64
+TICK = 0.02
+PROGRESS_INTERVAL = 0.25
+SIDECAR_INTERVAL = 1.0
+CONTROL_RETRY = 1.0
+CONTROL_RETRIES = 3
+STALL_TIMEOUT = float(os.getenv("TRANSFER_STALL_TIMEOUT", "10"))
+DOWNLOAD_DIR = os.getenv(
+    "WHISPERNET_DOWNLOADS", os.path.join(os.path.expanduser("~"), "Downloads", "WhisperNet")
+)
+PARTIAL_SUFFIX = ".wnpart"
+SIDECAR_SUFFIX = ".wnpart.json"
+
+ACTIVE_STATES = ("offered", "sending", "receiving", "stalled", "verifying")
+DIGEST_BLOCK = 1 << 20
+
+
+def is_chunk(datagram) -> bool:
+    return len(datagram) >= CHUNK_HEADER.size and datagram[:len(MAGIC)] == MAGIC
+
+
+def _now_ms():
+    return int(time.monotonic() * 1000) & 0xFFFFFFFF
+
+
+def file_digest(path) -> str:
+    """Hex SHA-256 of a file's contents; blocking, so run it off the loop."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DIGEST_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _offer_acceptable(size, chunk_size, sha256):
+    """Whether a peer's offer is within what we are willing to track."""
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in (size, chunk_size)):
+        return False
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE or not 0 <= size <= MAX_FILE_SIZE:
+        return False
+    if (size + chunk_size - 1) // chunk_size > MAX_CHUNKS:
+        return False
+    return sha256 is None or isinstance(sha256, str)
+
+
+def _clamp_ranges(ranges, count):
+    """A peer's ``[begin, end)`` chunk ranges cut to [0, count); malformed
+    entries are dropped."""
+    clamped = []
+    if not isinstance(ranges, list):
+        return clamped
+    for entry in ranges[:MAX_RANGES]:
+        if not (isinstance(entry, list) and len(entry) == 2
+                and all(isinstance(i, int) and not isinstance(i, bool) for i in entry)):
+            continue
+        begin, end = max(0, entry[0]), min(count, entry[1])
+        if begin < end:
+            clamped.append([begin, end])
+    return clamped
+
+
+def _unique_path(path):
+    """``path``, or "name (n).ext" for the first n that does not exist yet."""
+    stem, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(path):
+        path = f"{stem} ({n}){ext}"
+        n += 1
+    return path
+
+
+class _Bitmap:
+    """One bit per chunk, with a running count of set bits."""
+    __slots__ = ("bits", "size", "count")
+
+    def __init__(self, size, bits=None):
+        self.size = size
+        self.bits = bytearray(bits) if bits is not None else bytearray((size + 7) // 8)
+        self.count = sum(bin(b).count("1") for b in self.bits) if bits is not None else 0
+
+    def test(self, i):
+        return (self.bits[i >> 3] >> (i & 7)) & 1
+
+    def set(self, i):
+        mask = 1 << (i & 7)
+        if self.bits[i >> 3] & mask:
+            return False
+        self.bits[i >> 3] |= mask
+        self.count += 1
+        return True
+
+    def first_missing(self, start):
+        i = start
+        while i < self.size:
+            if i & 7 == 0 and self.bits[i >> 3] == 0xFF:
+                i += 8
+            elif self.test(i):
+                i += 1
+            else:
+                return i
+        return self.size
+
+    def missing_ranges(self, start, stop, limit=MAX_RANGES):
+        """Returns up to ``limit`` ``[begin, end)`` runs of unset bits in [start, stop)."""
+        ranges = []
+        i = self.first_missing(start)
+        while i < stop and len(ranges) < limit:
+            j = i + 1
+            while j < stop:
+                if j & 7 == 0 and j + 8 <= stop and self.bits[j >> 3] == 0:
+                    j += 8
+                elif self.test(j):
+                    break
+                else:
+                    j += 1
+            ranges.append([i, j])
+            i = self.first_missing(j)
+        return ranges
+
+
+class _Outgoing:
+    __slots__ = (
+        "id", "peer_key", "ip", "port", "path", "name", "size", "chunk_size", "count", "sha256",
+        "file", "map", "view", "state", "plan", "retx", "last_retx", "highest_sent",
+        "cwnd", "ssthresh", "sent_total", "lost_marked", "received_base", "received",
+        "srtt", "last_ack", "last_poll", "last_loss", "offers_sent", "last_offer",
+        "started", "last_progress", "error",
+    )
+
+    direction = "outgoing"
+
+    def __init__(self, transfer_id, peer_key, ip, port, path, sha256):
+        self.id = transfer_id
+        self.peer_key = peer_key
+        self.ip = ip
+        self.port = port
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = os.path.getsize(path)
+        self.chunk_size = CHUNK_SIZE
+        self.count = (self.size + CHUNK_SIZE - 1) // CHUNK_SIZE
+        self.sha256 = sha256
+        self.file = open(path, "rb")
+        # mmap refuses empty files; those complete on the first FILE_STATE
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.view = memoryview(self.map) if self.map is not None else memoryview(b"")
+        self.state = "offered"
+        self.plan = deque()
+        self.retx = deque()
+        self.last_retx = {}
+        self.highest_sent = -1
+        self.cwnd = INITIAL_CWND
+        self.ssthresh = MAX_CWND
+        self.sent_total = 0
+        self.lost_marked = 0
+        self.received_base = 0
+        self.received = 0
+        self.srtt = None
+        self.last_ack = 0.0
+        self.last_poll = 0.0
+        self.last_loss = 0.0
+        self.offers_sent = 0
+        self.last_offer = 0.0
+        self.started = time.monotonic()
+        self.last_progress = (0.0, 0)
+        self.error = None
+
+    def pipe(self):
+        """Estimated chunks in flight: sent this session, not yet received or declared lost."""
+        return self.sent_total - (self.received - self.received_base) - self.lost_marked
+
+    def rto(self):
+        return max(0.2, 4 * self.srtt) if self.srtt is not None else 1.0
+
+    def has_work(self):
+        return bool(self.retx or self.plan)
+
+    def next_index(self, now):
+        if self.retx:
+            index = self.retx.popleft()
+            self.last_retx[index] = now
+            return index
+        while self.plan:
+            begin, end = self.plan[0]
+            if begin >= end:
+                self.plan.popleft()
+                continue
+            self.plan[0][0] = begin + 1
+            self.highest_sent = max(self.highest_sent, begin)
+            return begin
+        return None
+
+    def transferred(self):
+        return min(self.size, self.received * self.chunk_size)
+
+    def close(self):
+        self.view.release()
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+class _Incoming:
+    __slots__ = (
+        "id", "peer_key", "ip", "port", "name", "size", "chunk_size", "count", "sha256", "path",
+        "part_path", "sidecar_path", "file", "map", "bitmap", "state", "cum", "session_highest", "echo_ts",
+        "ack_pending", "last_chunk", "last_state", "states_sent", "last_sidecar", "dirty",
+        "started", "last_progress", "error",
+    )
+
+    direction = "incoming"
+
+    def __init__(self, transfer_id, peer_key, ip, port, name, size, chunk_size, sha256):
+        self.id = transfer_id
+        self.peer_key = peer_key
+        self.ip = ip
+        self.port = port
+        self.name = name
+        self.size = size
+        self.chunk_size = chunk_size
+        self.count = (size + chunk_size - 1) // chunk_size
+        self.sha256 = sha256
+        self.path = None
+        self.part_path = None
+        self.sidecar_path = None
+        self.file = None
+        self.map = None
+        self.bitmap = None  # allocated on accept, not for every offer that arrives
+        self.state = "offered"
+        self.cum = 0
+        self.session_highest = -1
+        self.echo_ts = None
+        self.ack_pending = False
+        self.last_chunk = 0.0
+        self.last_state = 0.0
+        self.states_sent = 0
+        self.last_sidecar = 0.0
+        self.dirty = False
+        self.started = time.monotonic()
+        self.last_progress = (0.0, 0)
+        self.error = None
+
+    def open(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.name)
+        # Keyed on the transfer id: two downloads of the same name must not
+        # share (and overwrite) one partial file
+        partial = f"{self.path}.{self.id:08x}"
+        self.part_path = partial + PARTIAL_SUFFIX
+        self.sidecar_path = partial + SIDECAR_SUFFIX
+        self.bitmap = _Bitmap(self.count)
+        self._load_sidecar()
+
+        mode = "r+b" if os.path.exists(self.part_path) else "w+b"
+        self.file = open(self.part_path, mode)
+        self.file.truncate(self.size)
+        if self.size:
+            if hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(self.file.fileno(), 0, self.size)
+                except OSError:
+                    pass  # sparse file is fine, just less contiguous
+            self.map = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_WRITE)
+        self.cum = self.bitmap.first_missing(0)
+
+    def _load_sidecar(self):
+        sidecar = self.sidecar_path
+        if not (os.path.exists(self.part_path) and os.path.exists(sidecar)):
+            return
+        try:
+            with open(sidecar, "r") as f:
+                meta = json.load(f)
+            # Same name and size is not enough: only resume this very offer
+            if (meta.get("id") == self.id and meta.get("sha256") == self.sha256
+                    and meta.get("size") == self.size and meta.get("chunk_size") == self.chunk_size):
+                bits = base64.b64decode(meta["bitmap"])
+                if len(bits) == len(self.bitmap.bits):
+                    self.bitmap = _Bitmap(self.count, bits)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save_sidecar(self):
+        if self.map is not None:
+            self.map.flush()
+        meta = {
+            "id": self.id,
+            "sha256": self.sha256,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "bitmap": base64.b64encode(bytes(self.bitmap.bits)).decode("ascii"),
+        }
+        with open(self.sidecar_path, "w") as f:
+            json.dump(meta, f)
+        self.dirty = False
+
+    def write(self, index, data):
+        offset = index * self.chunk_size
+        self.map[offset:offset + len(data)] = data
+
+    def transferred(self):
+        return min(self.size, self.bitmap.count * self.chunk_size) if self.bitmap is not None else 0
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class TransferManager:
+    """Owns every transfer in both directions.
+
+    ``send_json(frame, ip, port)`` sends one control frame,
+    ``send_raw(datagrams)`` sends a list of ``(bytes, ip_bytes, port)``
+    datagrams in one batch, ``notify(event)`` pushes an event dict to the
+    UI and ``local_port()`` returns our listening port.
+    """
+
+    def __init__(self, send_json, send_raw, notify, local_port):
+        self._send_json = send_json
+        self._send_raw = send_raw
+        self._notify = notify
+        self._local_port = local_port
+        self.outgoing = {}
+        self.incoming = {}
+        self._tick_handle = None
+        self._ack_flush_scheduled = False
+
+    # --- public API --------------------------------------------------------
+
+    def offer(self, peer_key, ip, port, path, sha256=None):
+        """Offers ``path`` to a peer; pass ``sha256`` (see file_digest) when
+        it was already computed off the event loop."""
+        transfer_id = random.getrandbits(32)
+        while transfer_id in self.outgoing:
+            transfer_id = random.getrandbits(32)
+        t = _Outgoing(transfer_id, peer_key, ip, port, path, sha256 or file_digest(path))
+        self.outgoing[transfer_id] = t
+        self._send_offer(t, time.monotonic())
+        self._ensure_ticker()
+        return self.describe(t)
+
+    def accept(self, transfer_id, directory=None):
+        t = self.incoming.get(transfer_id)
+        if t is None:
+            raise KeyError(transfer_id)
+        if t.state == "offered":
+            t.open(directory or DOWNLOAD_DIR)
+            t.state = "receiving"
+            if t.bitmap.count == t.count:
+                self._complete_incoming(t)
+                return self.describe(t)
+        if t.state in ("receiving", "stalled"):
+            t.state = "receiving"
+            t.states_sent = 0
+            self._send_state(t, time.monotonic())
+            self._ensure_ticker()
+        return self.describe(t)
+
+    def resume(self, transfer_id):
+        """Re-establishes a stalled transfer from whichever side we are."""
+        now = time.monotonic()
+        if transfer_id in self.outgoing:
+            t = self.outgoing[transfer_id]
+            if t.state in ("offered", "stalled", "sending"):
+                t.offers_sent = 0
+                self._send_offer(t, now)
+        elif transfer_id in self.incoming:
+            return self.accept(transfer_id)
+        else:
+            raise KeyError(transfer_id)
+        self._ensure_ticker()
+        return self.describe(t)
+
+    def cancel(self, transfer_id):
+        t = self.outgoing.get(transfer_id) or self.incoming.get(transfer_id)
+        if t is None:
+            raise KeyError(transfer_id)
+        if t.state in ACTIVE_STATES:
+            self._control(t, {"type": "FILE_CANCEL", "id": t.id})
+            self._finish(t, "cancelled")
+            if t.direction == "incoming" and t.part_path:
+                for path in (t.part_path, t.sidecar_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        return self.describe(t)
+
+    def list(self):
+        return [self.describe(t) for t in list(self.outgoing.values()) + list(self.incoming.values())]
+
+    def on_peer_seen(self, peer_key):
+        """A peer (re)appeared in discovery; kick any transfer stalled on it."""
+        for t in list(self.outgoing.values()) + list(self.incoming.values()):
+            if t.peer_key == peer_key and t.state == "stalled":
+                self.resume(t.id)
+
+    # --- incoming frames ---------------------------------------------------
+
+    def on_control(self, peer_key, ip, port, frame):
+        kind = frame.get("type")
+        transfer_id = frame.get("id")
+        if not isinstance(transfer_id, int) or isinstance(transfer_id, bool):
+            return
+        now = time.monotonic()
+
+        if kind == "FILE_OFFER":
+            self._on_offer(peer_key, ip, port, frame, now)
+            return
+
+        if kind in ("FILE_STATE", "FILE_ACK"):
+            t = self.outgoing.get(transfer_id)
+            if t is None or t.peer_key != peer_key or t.state not in ACTIVE_STATES:
+                return
+            if not all(isinstance(frame.get(key, 0), int) for key in ("received", "cum")):
+                return
+            t.ip, t.port = ip, port
+            if kind == "FILE_STATE":
+                self._on_state(t, frame, now)
+            else:
+                self._on_ack(t, frame, now)
+            return
+
+        if kind == "FILE_POLL":
+            t = self.incoming.get(transfer_id)
+            if t is not None and t.peer_key == peer_key and t.state in ("receiving", "stalled", "done"):
+                if t.state == "stalled":
+                    t.state = "receiving"
+                self._send_state(t, now)
+            return
+
+        if kind == "FILE_CANCEL":
+            t = self.outgoing.get(transfer_id) or self.incoming.get(transfer_id)
+            if t is not None and t.peer_key == peer_key and t.state in ACTIVE_STATES:
+                self._finish(t, "cancelled")
+
+    def on_chunk(self, sender_ip, datagram):
+        magic, version, transfer_id, index, ts = CHUNK_HEADER.unpack_from(datagram)
+        t = self.incoming.get(transfer_id)
+        if (t is None or version != VERSION or t.ip != sender_ip
+                or t.state not in ("receiving", "stalled") or index >= t.count):
+            return
+        now = time.monotonic()
+        t.state = "receiving"
+        t.last_chunk = now
+        t.echo_ts = ts
+
+        data = datagram[CHUNK_HEADER.size:]
+        if len(data) != min(t.chunk_size, t.size - index * t.chunk_size):
+            return
+
+        gap = index > t.session_highest + 1
+        t.session_highest = max(t.session_highest, index)
+        if t.bitmap.set(index):
+            t.write(index, data)
+            t.dirty = True
+            if index == t.cum:
+                t.cum = t.bitmap.first_missing(index)
+            if t.bitmap.count == t.count:
+                self._complete_incoming(t)
+                return
+
+        if gap:
+            self._send_ack(t)  # report the hole right away
+        else:
+            t.ack_pending = True
+            if not self._ack_flush_scheduled:
+                # One ACK per transfer per ingress batch
+                self._ack_flush_scheduled = True
+                asyncio.get_running_loop().call_soon(self._flush_acks)
+
+    # --- sender side -------------------------------------------------------
+
+    def _send_offer(self, t, now):
+        t.offers_sent += 1
+        t.last_offer = now
+        self._control(t, {
+            "type": "FILE_OFFER", "id": t.id, "name": t.name,
+            "size": t.size, "chunk_size": t.chunk_size, "sha256": t.sha256,
+        })
+
+    def _on_state(self, t, frame, now):
+        # Authoritative resync: forget everything in flight and follow the
+        # receiver's list of missing ranges.
+        t.last_ack = now
+        t.received = t.received_base = frame.get("received", 0)
+        t.sent_total = 0
+        t.lost_marked = 0
+        t.retx.clear()
+        t.last_retx.clear()
+        t.highest_sent = -1
+        t.plan = deque(_clamp_ranges(frame.get("missing"), t.count))
+        if frame.get("cum", 0) >= t.count:
+            self._finish(t, "done")
+            return
+        if t.state != "sending":
+            t.state = "sending"
+            t.cwnd = INITIAL_CWND
+            self._emit(t, "FILE_PROGRESS")
+        self._pump(t)
+
+    def _on_ack(self, t, frame, now):
+        if t.state != "sending":
+            return
+        t.last_ack = now
+        ts = frame.get("ts")
+        if isinstance(ts, int):
+            rtt = ((_now_ms() - ts) & 0xFFFFFFFF) / 1000
+            if rtt < 10:
+                t.srtt = rtt if t.srtt is None else 0.875 * t.srtt + 0.125 * rtt
+
+        newly = max(0, frame.get("received", t.received) - t.received)
+        t.received += newly
+        cum = frame.get("cum", 0)
+        if cum >= t.count:
+            self._finish(t, "done")
+            return
+
+        loss = False
+        retx_guard = 2 * (t.srtt or 0.05)
+        for begin, end in _clamp_ranges(frame.get("missing"), t.count):
+            for index in range(begin, min(end, t.highest_sent + 1)):
+                last = t.last_retx.get(index)
+                if last is not None and now - last < retx_guard:
+                    continue
+                t.retx.append(index)
+                t.last_retx[index] = now
+                t.lost_marked += 1
+                loss = True
+        if len(t.last_retx) > 4 * MAX_CWND:
+            t.last_retx = {i: at for i, at in t.last_retx.items() if i >= cum}
+
+        if loss and now - t.last_loss > (t.srtt or 0.05):
+            t.ssthresh = max(INITIAL_CWND, t.cwnd / 2)
+            t.cwnd = t.ssthresh
+            t.last_loss = now
+        elif newly:
+            t.cwnd += newly if t.cwnd < t.ssthresh else newly / t.cwnd
+            t.cwnd = min(t.cwnd, MAX_CWND)
+        self._pump(t)
+
+    def _pump(self, t):
+        if t.state != "sending":
+            return
+        now = time.monotonic()
+        ip = t.ip.encode("utf-8")
+        view, chunk_size, header = t.view, t.chunk_size, CHUNK_HEADER
+        ts = _now_ms()
+        batch = []
+        while len(batch) < SEND_BURST and t.pipe() < t.cwnd:
+            index = t.next_index(now)
+            if index is None:
+                break
+            offset = index * chunk_size
+            batch.append((header.pack(MAGIC, VERSION, t.id, index, ts) + view[offset:offset + chunk_size], ip, t.port))
+            t.sent_total += 1
+        if batch:
+            self._send_raw(batch)
+            if t.has_work() and t.pipe() < t.cwnd:
+                asyncio.get_running_loop().call_soon(self._pump, t)
+
+    # --- receiver side -----------------------------------------------------
+
+    def _on_offer(self, peer_key, ip, port, frame, now):
+        transfer_id = frame.get("id")
+        t = self.incoming.get(transfer_id)
+        if t is None:
+            name = os.path.basename(str(frame.get("name") or "")).strip() or f"transfer-{transfer_id}"
+            size = frame.get("size")
+            chunk_size = frame.get("chunk_size")
+            sha256 = frame.get("sha256")
+            if not _offer_acceptable(size, chunk_size, sha256):
+                return
+            pending = [i for i in self.incoming.values() if i.state == "offered"]
+            if (len(pending) >= MAX_PENDING_OFFERS
+                    or sum(1 for i in pending if i.peer_key == peer_key) >= MAX_OFFERS_PER_PEER):
+                return
+            t = _Incoming(transfer_id, peer_key, ip, port, name, size, chunk_size, sha256)
+            self.incoming[transfer_id] = t
+            self._emit(t, "FILE_OFFER")
+            return
+        if t.peer_key != peer_key:
+            return
+        t.ip, t.port = ip, port
+        # A repeated offer for a known transfer is the sender asking to resume
+        if t.state in ("receiving", "stalled", "done"):
+            if t.state == "stalled":
+                t.state = "receiving"
+            t.states_sent = 0
+            self._send_state(t, now)
+            self._ensure_ticker()
+
+    def _send_state(self, t, now):
+        t.states_sent += 1
+        t.last_state = now
+        t.session_highest = -1
+        self._control(t, {
+            "type": "FILE_STATE", "id": t.id, "received": t.bitmap.count, "cum": t.cum,
+            "missing": t.bitmap.missing_ranges(t.cum, t.count),
+        })
+
+    def _send_ack(self, t):
+        t.ack_pending = False
+        self._control(t, {
+            "type": "FILE_ACK", "id": t.id, "received": t.bitmap.count, "cum": t.cum,
+            "missing": t.bitmap.missing_ranges(t.cum, t.session_highest),
+            "ts": t.echo_ts,
+        })
+
+    def _flush_acks(self):
+        self._ack_flush_scheduled = False
+        for t in self.incoming.values():
+            if t.ack_pending and t.state == "receiving":
+                self._send_ack(t)
+
+    def _complete_incoming(self, t):
+        t.cum = t.count
+        t.close()
+        if t.sha256 is None:  # offered by a peer that does not send a hash
+            self._install_incoming(t)
+            return
+        t.state = "verifying"
+        asyncio.get_running_loop().run_in_executor(None, file_digest, t.part_path).add_done_callback(
+            lambda future: self._on_verified(t, future)
+        )
+
+    def _on_verified(self, t, future):
+        if t.state != "verifying":
+            return  # cancelled meanwhile
+        error = future.exception()
+        if error is None and future.result() == t.sha256:
+            self._install_incoming(t)
+            return
+        t.error = str(error) if error is not None else "checksum mismatch"
+        for path in (t.part_path, t.sidecar_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._control(t, {"type": "FILE_CANCEL", "id": t.id})
+        self._finish(t, "failed")
+
+    def _install_incoming(self, t):
+        try:
+            os.remove(t.sidecar_path)
+        except OSError:
+            pass
+        t.path = _unique_path(t.path)
+        os.replace(t.part_path, t.path)
+        self._send_state(t, time.monotonic())
+        self._finish(t, "done")
+
+    # --- shared ------------------------------------------------------------
+
+    def _control(self, t, frame):
+        frame["port"] = self._local_port()
+        self._send_json(frame, t.ip, t.port)
+
+    def _finish(self, t, state):
+        t.state = state
+        t.close()
+        self._emit(t, "FILE_DONE" if state == "done" else "FILE_PROGRESS")
+
+    def describe(self, t):
+        elapsed = max(1e-6, time.monotonic() - t.started)
+        return {
+            "id": t.id,
+            "direction": t.direction,
+            "peer": t.peer_key,
+            "name": t.name,
+            "size": t.size,
+            "transferred": t.size if t.state == "done" else t.transferred(),
+            "state": t.state,
+            "rate_bps": round(t.transferred() / elapsed, 1),
+            "cwnd": round(t.cwnd, 1) if t.direction == "outgoing" else None,
+            "path": t.path,
+            "error": t.error,
+        }
+
+    def _emit(self, t, kind):
+        t.last_progress = (time.monotonic(), t.transferred())
+        self._notify({"type": kind, "payload": self.describe(t)})
+
+    def _ensure_ticker(self):
+        if self._tick_handle is None:
+            self._tick_handle = asyncio.get_running_loop().call_later(TICK, self._tick)
+
+    def _tick(self):
+        """Single periodic timer for retries, timeouts, progress and sidecars."""
+        self._tick_handle = None
+        now = time.monotonic()
+        active = False
+
+        for t in self.outgoing.values():
+            if t.state not in ACTIVE_STATES:
+                continue
+            active = True
+            if t.state == "offered":
+                if t.offers_sent < CONTROL_RETRIES and now - t.last_offer > CONTROL_RETRY:
+                    self._send_offer(t, now)
+            elif t.state == "sending":
+                idle = now - t.last_ack
+                if idle > STALL_TIMEOUT:
+                    t.state = "stalled"
+                    self._emit(t, "FILE_PROGRESS")
+                elif idle > t.rto() and now - t.last_poll > t.rto():
+                    # ACKs dried up: assume the window is lost and resync
+                    t.last_poll = now
+                    t.cwnd = INITIAL_CWND
+                    self._control(t, {"type": "FILE_POLL", "id": t.id})
+            self._progress(t, now)
+
+        for t in self.incoming.values():
+            if t.state not in ("receiving", "stalled"):
+                continue
+            active = True
+            if t.state == "receiving" and now - max(t.last_chunk, t.last_state) > CONTROL_RETRY:
+                if t.states_sent < CONTROL_RETRIES or now - t.last_chunk < STALL_TIMEOUT:
+                    self._send_state(t, now)
+                else:
+                    t.state = "stalled"
+                    t.save_sidecar()
+                    self._emit(t, "FILE_PROGRESS")
+            if t.dirty and now - t.last_sidecar > SIDECAR_INTERVAL:
+                t.last_sidecar = now
+                t.save_sidecar()
+            self._progress(t, now)
+
+        if active:
+            self._ensure_ticker()
+
+    def _progress(self, t, now):
+        last_at, last_bytes = t.last_progress
+        if now - last_at >= PROGRESS_INTERVAL and t.transferred() != last_bytes:
+            self._emit(t, "FILE_PROGRESS")
@@ -0,0 +1,161 @@
+"""
+Compact binary framing for the hot protocol frames.
+
+Every binary frame starts with a fixed 8-byte header followed by
+length-prefixed, tagged fields:
+
+    magic "WNB" | version u8 | type u8 | flags u8 | port u16
+    field*:  tag u8 | length u16 | value
+
+Discovery requests/replies, HEARTBEAT, MESSAGE, ACK and GROUP_MESSAGE
+frames have a binary form; anything else (and anything too large for a u16
+field) stays JSON.
+Decoding yields the same dict shape ``json.loads`` would, so the handlers
+do not care which encoding a frame arrived in.
+
+Negotiation rides on ``config.PROTOCOL_VERSION``: JSON discovery frames
+still say ``"version": 1`` so older peers accept them, and advertise
+``"max_version"``. A peer is only sent binary frames once it has shown,
+through either encoding, that it speaks BINARY_VERSION or later.
+"""
+import json
+import struct
+
+from backend import config
+
+MAGIC = b"WNB"
+JSON_VERSION = 1
+BINARY_VERSION = 2
+HEADER = struct.Struct("!3sBBBH")
+
+FLAG_RELIABLE = 0x01
+
+_TYPES = ("DISCOVERY_REQUEST", "DISCOVERY_REPLY", "MESSAGE", "ACK", "HEARTBEAT", "GROUP_MESSAGE")
+_TYPE_CODES = {name: code for code, name in enumerate(_TYPES, start=1)}
+
+_FIELD = struct.Struct("!BH")
+_U32 = struct.Struct("!I")
+
+# tag -> (key, kind)
+_FIELDS = {
+    1: ("nickname", "str"),
+    2: ("content", "str"),
+    3: ("seq", "u32"),
+    4: ("sid", "u32"),
+    5: ("cum", "u32"),
+    6: ("sack", "u32s"),
+    7: ("group", "str"),
+    8: ("groups", "strs"),  # newline-separated names
+    9: ("mcast", "u32"),
+    10: ("pub", "hex"),  # raw bytes on the wire, a hex string in the dict
+    11: ("base", "u32"),
+    12: ("confirm", "u32"),
+}
+_TAGS = {key: (tag, kind) for tag, (key, kind) in _FIELDS.items()}
+_MAX_FIELD = 0xFFFF
+
+
+def is_binary(datagram) -> bool:
+    return len(datagram) >= HEADER.size and datagram[:len(MAGIC)] == MAGIC
+
+
+def negotiate(advertised) -> int:
+    """The version to use with a peer that advertised ``advertised``."""
+    try:
+        return min(int(advertised), config.PROTOCOL_VERSION)
+    except (TypeError, ValueError):
+        return JSON_VERSION
+
+
+def encode(frame):
+    """Encodes ``frame`` (a dict) as a binary frame, or returns None if the
+    frame type or one of its values has no binary form."""
+    code = _TYPE_CODES.get(frame.get("type"))
+    if code is None:
+        return None
+
+    parts = []
+    for key, value in frame.items():
+        if key in ("type", "port", "version", "max_version"):
+            continue
+        spec = _TAGS.get(key)
+        if spec is None:
+            return None  # unknown key: keep the JSON form so nothing is lost
+        tag, kind = spec
+        if value is None:
+            continue
+        if kind == "str":
+            raw = str(value).encode("utf-8")
+        elif kind == "strs":
+            raw = "\n".join(value).encode("utf-8")
+        elif kind == "u32":
+            if not 0 <= value <= 0xFFFFFFFF:
+                return None
+            raw = _U32.pack(value)
+        elif kind == "hex":
+            try:
+                raw = bytes.fromhex(value)
+            except (TypeError, ValueError):
+                return None
+        else:
+            raw = struct.pack(f"!{len(value)}I", *value)
+        if len(raw) > _MAX_FIELD:
+            return None
+        parts.append(_FIELD.pack(tag, len(raw)))
+        parts.append(raw)
+
+    flags = FLAG_RELIABLE if "seq" in frame else 0
+    header = HEADER.pack(MAGIC, BINARY_VERSION, code, flags, frame.get("port") or 0)
+    return header + b"".join(parts)
+
+
+def decode(datagram):
+    """Parses a binary frame into a dict; returns None if it is malformed or
+    from a wire version we do not speak."""
+    if len(datagram) < HEADER.size:
+        return None
+    magic, version, code, flags, port = HEADER.unpack_from(datagram)
+    if magic != MAGIC or not BINARY_VERSION <= version <= config.PROTOCOL_VERSION:
+        return None
+    if not 1 <= code <= len(_TYPES):
+        return None
+
+    frame = {"type": _TYPES[code - 1], "version": version, "port": port}
+    offset, end = HEADER.size, len(datagram)
+    while offset < end:
+        if offset + _FIELD.size > end:
+            return None
+        tag, length = _FIELD.unpack_from(datagram, offset)
+        offset += _FIELD.size
+        if offset + length > end:
+            return None
+        spec = _FIELDS.get(tag)
+        if spec is not None:
+            key, kind = spec
+            raw = datagram[offset:offset + length]
+            if kind == "str":
+                frame[key] = str(raw, "utf-8", errors="ignore")
+            elif kind == "strs":
+                frame[key] = str(raw, "utf-8", errors="ignore").split("\n") if length else []
+            elif kind == "u32":
+                if length != _U32.size:
+                    return None
+                frame[key] = _U32.unpack_from(raw)[0]
+            elif kind == "hex":
+                frame[key] = bytes(raw).hex()
+            else:
+                if length % _U32.size:
+                    return None
+                frame[key] = list(struct.unpack_from(f"!{length // _U32.size}I", raw))
+        offset += length  # unknown tags are skipped for forward compatibility
+    return frame
+
+
+def encode_for(version, frame) -> bytes:
+    """Encodes ``frame`` for a peer speaking ``version``: binary when both the
+    peer and the frame allow it, JSON otherwise."""
+    if version >= BINARY_VERSION:
+        payload = encode(frame)
+        if payload is not None:
+            return payload
+    return json.dumps(frame).encode("utf-8")
@@ -0,0 +1,176 @@
+"""
+Discovery traffic simulation: legacy fixed-rate discovery vs the adaptive
+scheduler in backend/discovery.py.
+
+N nodes on one broadcast domain, all listening on the discovery port, join
+at random times within the join window. No packets are lost. Each announce
+or heartbeat costs three sends (broadcast, multicast, loopback) and reaches
+every other node twice (broadcast + multicast copies); replies are unicast.
+
+    legacy    DISCOVERY_REQUEST every 5 s; every receiver replies every time
+    adaptive  DiscoveryScheduler timing, one reply per requester session,
+              HEARTBEAT for liveness
+
+Reported per model: total packets sent and frames received over the run,
+the steady-state send rate over the second half of the run, when every node
+first knew every other node, and the longest silence between one node's
+liveness packets (must stay under PEER_TIMEOUT, 15 s by default).
+
+    python bench/discovery_sim.py
+    python bench/discovery_sim.py --peers 10 100 1000 --duration 600
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import discovery
+
+LEGACY_INTERVAL = 5.0
+SENDS_PER_ANNOUNCE = 3   # broadcast, multicast, loopback
+COPIES_PER_ANNOUNCE = 2  # broadcast + multicast reach every other node
+
+
+class _Network:
+    """Who knows whom, tracked both ways so learning is O(1) per pair."""
+
+    def __init__(self, size):
+        self.alive = []
+        self.unaware = [set() for _ in range(size)]     # s -> nodes that do not know s
+        self.unknown_by = [set() for _ in range(size)]  # r -> nodes r does not know
+        self.missing = 0
+        self.sent = 0
+        self.received = 0
+        self.steady_sent = 0
+        self.converged_at = None
+        self.last_live = [None] * size
+        self.max_gap = 0.0
+
+    def join(self, node):
+        for other in self.alive:
+            self.unaware[other].add(node)
+            self.unknown_by[node].add(other)
+            self.unaware[node].add(other)
+            self.unknown_by[other].add(node)
+        self.missing += 2 * len(self.alive)
+        self.alive.append(node)
+
+    def learn(self, knower, known):
+        if known in self.unknown_by[knower]:
+            self.unknown_by[knower].discard(known)
+            self.unaware[known].discard(knower)
+            self.missing -= 1
+            return True
+        return False
+
+    def count(self, now, steady_from, sent, received):
+        self.sent += sent
+        self.received += received
+        if now >= steady_from:
+            self.steady_sent += sent
+
+    def live(self, node, now):
+        last = self.last_live[node]
+        if last is not None:
+            self.max_gap = max(self.max_gap, now - last)
+        self.last_live[node] = now
+
+
+def _joins(size, join_window, rng):
+    return sorted((rng.uniform(0, join_window), node) for node in range(size))
+
+
+def simulate_legacy(size, duration, join_window, seed):
+    rng = random.Random(seed)
+    net = _Network(size)
+    steady_from = duration / 2
+    events = [(t, 0, node) for t, node in _joins(size, join_window, rng)]
+    heapq.heapify(events)
+    while events:
+        now, kind, node = heapq.heappop(events)
+        if now > duration:
+            break
+        if kind == 0:
+            net.join(node)
+        others = len(net.alive) - 1
+        # Request to everyone, then every receiver answers with a unicast reply
+        net.count(now, steady_from, SENDS_PER_ANNOUNCE + others, COPIES_PER_ANNOUNCE * others + others)
+        for receiver in list(net.unaware[node]):
+            net.learn(receiver, node)
+        for sender in list(net.unknown_by[node]):
+            net.learn(node, sender)
+        net.live(node, now)
+        if net.converged_at is None and net.missing == 0 and len(net.alive) == size:
+            net.converged_at = now
+        heapq.heappush(events, (now + LEGACY_INTERVAL, 1, node))
+    return net
+
+
+def simulate_adaptive(size, duration, join_window, seed):
+    rng = random.Random(seed)
+    net = _Network(size)
+    steady_from = duration / 2
+    schedulers = [discovery.DiscoveryScheduler(rng=random.Random(seed * 7919 + node)) for node in range(size)]
+    unanswered = [set() for _ in range(size)]  # s -> nodes that have not replied to s's session yet
+    events = [(t, 0, node) for t, node in _joins(size, join_window, rng)]
+    heapq.heapify(events)
+    while events:
+        now, kind, node = heapq.heappop(events)
+        if now > duration:
+            break
+        scheduler = schedulers[node]
+        if kind == 0:
+            for other in net.alive:
+                unanswered[other].add(node)
+                unanswered[node].add(other)
+            net.join(node)
+            scheduler.start(now)
+
+        action = scheduler.due(now)
+        if action is not None:
+            others = len(net.alive) - 1
+            replies = 0
+            for receiver in list(net.unaware[node]):
+                net.learn(receiver, node)
+                schedulers[receiver].peers_changed()
+            if action == discovery.ANNOUNCE:
+                for receiver in unanswered[node]:
+                    if schedulers[receiver].should_reply(node, scheduler.session_id):
+                        replies += 1
+                        if net.learn(node, receiver):
+                            scheduler.peers_changed()
+                unanswered[node].clear()
+            net.count(now, steady_from, SENDS_PER_ANNOUNCE + replies, COPIES_PER_ANNOUNCE * others + replies)
+            net.live(node, now)
+            if net.converged_at is None and net.missing == 0 and len(net.alive) == size:
+                net.converged_at = now
+        heapq.heappush(events, (scheduler.next_wakeup(), 1, node))
+    return net
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peers", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--duration", type=float, default=600.0, help="simulated seconds")
+    parser.add_argument("--join-window", type=float, default=30.0, help="nodes join uniformly within this many seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    steady = args.duration / 2
+    print(f"{args.duration:.0f} s simulated, joins within {args.join_window:.0f} s, steady state = last {steady:.0f} s")
+    print(f"{'peers':>6} {'model':>9} {'sent':>12} {'received':>14} {'steady pkt/s':>13} {'converged':>10} {'max gap':>8}")
+    for size in args.peers:
+        for name, simulate in (("legacy", simulate_legacy), ("adaptive", simulate_adaptive)):
+            net = simulate(size, args.duration, args.join_window, args.seed)
+            converged = f"{net.converged_at:.1f} s" if net.converged_at is not None else "never"
+            print(
+                f"{size:>6} {name:>9} {net.sent:>12,} {net.received:>14,} "
+                f"{net.steady_sent / steady:>13,.1f} {converged:>10} {net.max_gap:>7.1f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
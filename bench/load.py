@@ -0,0 +1,385 @@
+"""
+End-to-end load benchmark against a real backend process.
+
+Starts one node (uvicorn backend.main:app) with the native core or the
+Python fallback (WHISPERNET_CORE=python), attaches a WebSocket client the
+way the UI does, and drives it from simulated peers: UDP sockets on
+loopback, each with its own port.
+
+    convergence   every peer sends one DISCOVERY_REQUEST at --discovery-rate;
+                  time until the WebSocket view lists every peer
+    flood         MESSAGE frames from the peers, round robin, at --rate for
+                  --duration seconds; each carries its sequence number so
+                  the WebSocket side can match it to its send time
+
+Reported per core: peer table convergence time, messages sent, delivered
+and lost, delivery rate, end-to-end latency to the WebSocket client
+(p50/p95/p99/max), node CPU time per sent packet (Linux, from /proc) and
+the core's ingress drop counter.
+
+With --encrypt (native core only) the peers advertise a key in their
+DISCOVERY_REQUEST and seal every MESSAGE frame for the node, so the flood
+measures the node's decrypt path; the results then count the frames the
+node opened.
+
+Every run can be appended as one JSON line, tagged with the commit, to
+compare results across commits:
+
+    python bench/load.py
+    python bench/load.py --core native --peers 200 --rate 5000 --duration 10
+    python bench/load.py --output bench/results.jsonl
+    python bench/load.py --core native --encrypt
+"""
+import argparse
+import asyncio
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import websockets
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+BOUND_MARKER = "bound UDP listener to port: "
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+SEND_TICK = 0.002  # seconds between send bursts while pacing
+
+
+def _free_tcp_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Node:
+    """One backend process in a scratch directory, logging to a file there."""
+
+    def __init__(self, core, shards=1, encryption="prefer", startup_timeout=20):
+        self.core = core
+        self.api_port = _free_tcp_port()
+        self.udp_port = None
+        self._dir = tempfile.TemporaryDirectory(prefix="whispernet-bench-")
+        self._log_path = os.path.join(self._dir.name, "node.log")
+        env = dict(
+            os.environ,
+            PYTHONPATH=ROOT,
+            API_PORT=str(self.api_port),
+            WHISPERNET_CORE=core,
+            RECV_SHARDS=str(shards),
+            ENCRYPTION=encryption,
+            WHISPERNET_HISTORY=os.path.join(self._dir.name, "history.db"),
+            WHISPERNET_DOWNLOADS=os.path.join(self._dir.name, "downloads"),
+            LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
+        )
+        self._log = open(self._log_path, "w")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(self.api_port), "--log-level", "warning"],
+            cwd=self._dir.name, env=env, stdout=self._log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+        )
+        self._wait_until_ready(startup_timeout)
+
+    def _wait_until_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"node exited during startup:\n{self.log_tail()}")
+            with open(self._log_path) as f:
+                text = f.read()
+            if self.udp_port is None and BOUND_MARKER in text:
+                self.udp_port = int(text.split(BOUND_MARKER, 1)[1].split()[0])
+            if self.udp_port is not None:
+                try:
+                    self.get("/api/health")
+                    return
+                except OSError:
+                    pass
+            time.sleep(0.05)
+        raise RuntimeError(f"node not ready after {timeout} s:\n{self.log_tail()}")
+
+    def get(self, path):
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.api_port}{path}", timeout=5) as response:
+            return json.loads(response.read())
+
+    def cpu_seconds(self):
+        """User + system CPU of the node process so far, or None off Linux."""
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+    def log_tail(self, lines=20):
+        with open(self._log_path) as f:
+            return "".join(f.readlines()[-lines:])
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self._log.close()
+        self._dir.cleanup()
+
+
+class Peers:
+    """Simulated peers: one loopback UDP socket per peer, replies discarded."""
+
+    def __init__(self, count):
+        self.sockets = []
+        for _ in range(count):
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.bind(("127.0.0.1", 0))
+            s.setblocking(False)
+            self.sockets.append(s)
+        self.ports = [s.getsockname()[1] for s in self.sockets]
+        self._running = True
+        self._drain = threading.Thread(target=self._discard_replies, daemon=True)
+        self._drain.start()
+
+    def _discard_replies(self):
+        selector = selectors.DefaultSelector()
+        for s in self.sockets:
+            selector.register(s, selectors.EVENT_READ)
+        while self._running:
+            for key, _ in selector.select(timeout=0.1):
+                try:
+                    while True:
+                        key.fileobj.recv(65535)
+                except (BlockingIOError, OSError):
+                    pass
+        selector.close()
+
+    def send(self, index, datagram, target):
+        try:
+            self.sockets[index].sendto(datagram, target)
+            return True
+        except (BlockingIOError, OSError):
+            return False
+
+    def close(self):
+        self._running = False
+        self._drain.join()
+        for s in self.sockets:
+            s.close()
+
+
+class UiClient:
+    """Follows /api/ws: the peer list and message arrival times."""
+
+    def __init__(self):
+        self.peers = set()
+        self.arrivals = {}  # seq -> perf_counter at arrival
+        self.all_peers_seen = asyncio.Event()
+        self.expected_peers = 0
+
+    async def run(self, url):
+        async with websockets.connect(url, max_queue=None) as ws:
+            async for raw in ws:
+                now = time.perf_counter()
+                event = json.loads(raw)
+                kind = event.get("type")
+                if kind == "PEER_SNAPSHOT":
+                    self.peers = {p["ip"] for p in event["payload"]}
+                elif kind == "PEER_DELTA":
+                    for change in event["events"]:
+                        if change["type"] == "PEER_REMOVED":
+                            self.peers.discard(change["payload"]["ip"])
+                        else:
+                            self.peers.add(change["payload"]["ip"])
+                elif kind == "NEW_MESSAGE":
+                    content = event["payload"].get("content") or ""
+                    if content.startswith("bench:"):
+                        self.arrivals[int(content.split(":")[1])] = now
+                    continue
+                if self.expected_peers and len(self.peers) >= self.expected_peers:
+                    self.all_peers_seen.set()
+
+
+async def _paced(rate, total, send_one):
+    """Calls ``send_one(i)`` ``total`` times at ``rate`` per second; returns
+    the send time of each call."""
+    sent_at = [0.0] * total
+    start = time.perf_counter()
+    i = 0
+    while i < total:
+        due = min(total, int((time.perf_counter() - start) * rate) + 1)
+        while i < due:
+            sent_at[i] = time.perf_counter()
+            send_one(i)
+            i += 1
+        await asyncio.sleep(SEND_TICK)
+    return sent_at
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def _run(node, args):
+    target = ("127.0.0.1", node.udp_port)
+    peers = Peers(args.peers)
+    ui = UiClient()
+    ui.expected_peers = args.peers
+    ws_task = asyncio.ensure_future(ui.run(f"ws://127.0.0.1:{node.api_port}/api/ws"))
+    keys = _session_with(node) if args.encrypt else None
+    try:
+        await asyncio.sleep(0.5)
+
+        def announce(i):
+            frame = {
+                "type": "DISCOVERY_REQUEST", "version": 1, "port": peers.ports[i],
+                "nickname": f"bench-{i}", "sid": i + 1,
+            }
+            if keys:
+                frame["pub"] = keys.public_key
+            peers.send(i, json.dumps(frame).encode("utf-8"), target)
+
+        started = time.perf_counter()
+        await _paced(args.discovery_rate, args.peers, announce)
+        try:
+            await asyncio.wait_for(ui.all_peers_seen.wait(), args.settle)
+            convergence = time.perf_counter() - started
+        except asyncio.TimeoutError:
+            convergence = None
+
+        total = int(args.rate * args.duration)
+        stats_before = node.get("/api/stats")
+        cpu_before = node.cpu_seconds()
+
+        def message(i):
+            peer = i % args.peers
+            datagram = json.dumps({
+                "type": "MESSAGE", "port": peers.ports[peer], "content": f"bench:{i}:{args.payload}",
+            }).encode("utf-8")
+            if keys:
+                datagram = keys.seal(*target, peers.ports[peer], datagram)
+            peers.send(peer, datagram, target)
+
+        sent_at = await _paced(args.rate, total, message)
+        flood_seconds = time.perf_counter() - sent_at[0] if total else 0.0
+        deadline = time.perf_counter() + args.settle
+        while len(ui.arrivals) < total and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        cpu_after = node.cpu_seconds()
+        stats_after = node.get("/api/stats")
+    finally:
+        ws_task.cancel()
+        peers.close()
+
+    latencies = sorted(ui.arrivals[i] - sent_at[i] for i in ui.arrivals if i < total)
+    delivered = len(latencies)
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    cpu = None if cpu_before is None or cpu_after is None else cpu_after - cpu_before
+    return {
+        "convergence_ms": ms(convergence),
+        "peers_seen": len(ui.peers),
+        "sent": total,
+        "delivered": delivered,
+        "loss": round(1 - delivered / total, 5) if total else None,
+        "delivered_per_sec": round(delivered / flood_seconds, 1) if flood_seconds else None,
+        "latency_ms": {
+            "p50": ms(_percentile(latencies, 0.50)),
+            "p95": ms(_percentile(latencies, 0.95)),
+            "p99": ms(_percentile(latencies, 0.99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+        "cpu_us_per_packet": round(cpu / total * 1e6, 2) if cpu is not None and total else None,
+        "ingress_dropped": stats_after["ingress_dropped"] - stats_before["ingress_dropped"],
+        "opened": _crypto_delta(stats_before, stats_after, "opened"),
+        "rejected": _crypto_delta(stats_before, stats_after, "rejected"),
+    }
+
+
+def _session_with(node):
+    """A key pair in this process with a session to the node. All simulated
+    peers share it; each sealed frame names its peer's port in the header."""
+    from backend import crypto
+    from backend.bindings import core_lib
+
+    keys = crypto.SessionKeys(core_lib, mode="require")
+    if not keys.start():
+        raise RuntimeError("--encrypt needs the native core with AEAD support")
+    keys.on_peer_key("127.0.0.1", node.udp_port, node.get("/api/stats")["crypto"]["public_key"])
+    return keys
+
+
+def _crypto_delta(before, after, field):
+    if field not in after.get("crypto", {}) or field not in before.get("crypto", {}):
+        return None
+    return after["crypto"][field] - before["crypto"][field]
+
+
+def bench(core, args):
+    node = Node(core, args.shards, "prefer" if args.encrypt else "off")
+    try:
+        result = asyncio.run(_run(node, args))
+    finally:
+        node.stop()
+    return {
+        "commit": _commit(),
+        "time": int(time.time()),
+        "core": core,
+        "params": {
+            "peers": args.peers, "rate": args.rate, "duration": args.duration,
+            "payload_bytes": len(args.payload), "discovery_rate": args.discovery_rate,
+            "shards": args.shards, "encrypt": args.encrypt,
+        },
+        "results": result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--core", choices=("native", "python", "both"), default="both")
+    parser.add_argument("--peers", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=2000, help="MESSAGE frames per second")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of MESSAGE flood")
+    parser.add_argument("--discovery-rate", type=float, default=500, help="DISCOVERY_REQUEST frames per second")
+    parser.add_argument("--shards", type=int, default=1, help="listener sockets on the node's port (RECV_SHARDS)")
+    parser.add_argument("--encrypt", action="store_true", help="seal MESSAGE frames for the node (native core)")
+    parser.add_argument("--payload-bytes", type=int, default=64)
+    parser.add_argument("--settle", type=float, default=5, help="seconds to wait for stragglers")
+    parser.add_argument("--output", help="append one JSON line per core to this file")
+    args = parser.parse_args()
+    args.payload = "x" * args.payload_bytes
+    if args.encrypt and args.core != "native":
+        parser.error("--encrypt needs --core native; the Python fallback has no AEAD")
+
+    cores = ("native", "python") if args.core == "both" else (args.core,)
+    print(f"{'core':<8} {'converge':>10} {'sent':>8} {'lost':>8} {'deliv/s':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'cpu us/pkt':>11} {'dropped':>8}")
+    for core in cores:
+        record = bench(core, args)
+        r = record["results"]
+        converge = "-" if r["convergence_ms"] is None else f"{r['convergence_ms']:.0f} ms"
+        print(f"{core:<8} {converge:>10} {r['sent']:>8} {r['sent'] - r['delivered']:>8} "
+              f"{r['delivered_per_sec'] or 0:>9.0f} {r['latency_ms']['p50'] or 0:>8.2f} "
+              f"{r['latency_ms']['p99'] or 0:>8.2f} {r['cpu_us_per_packet'] or 0:>11.1f} {r['ingress_dropped']:>8}")
+        if args.output:
+            with open(args.output, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
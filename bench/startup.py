@@ -0,0 +1,175 @@
+"""
+Cold start benchmark: process start to the first discovery packet.
+
+Binds UDP 8888 on loopback first, so the node under test falls back to
+another port and its first announce (which always includes a unicast copy
+to 127.0.0.1:8888) lands here. Each run starts a fresh process in a scratch
+directory and reports:
+
+    first_packet   launch until the first discovery datagram arrives
+    health         launch until GET /api/health answers
+
+By default the node is ``python backend/main.py``; --command measures a
+release build instead, e.g. the --onefile binary (which unpacks itself on
+every launch) against the --onedir folder:
+
+    python bench/startup.py
+    python bench/startup.py --command ./whispernet --runs 10
+    python bench/startup.py --command ./whispernet-onedir/whispernet
+    python bench/startup.py --output bench/startup.jsonl
+
+The first run of a series also pays for a cold OS file cache; it is
+reported separately from the median of the rest. With --output, each series
+is appended as one JSON line tagged with the commit.
+"""
+import argparse
+import json
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DISCOVERY_PORT = 8888
+
+
+def _free_tcp_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _healthy(api_port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{api_port}/api/health", timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def _stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def launch_once(command, listener, timeout):
+    """Starts the node once; returns (first_packet_ms, health_ms), either
+    None if it did not happen within ``timeout`` seconds."""
+    api_port = _free_tcp_port()
+    with tempfile.TemporaryDirectory(prefix="whispernet-startup-") as scratch:
+        env = dict(
+            os.environ,
+            API_PORT=str(api_port),
+            OPEN_BROWSER="0",
+            WHISPERNET_HISTORY=os.path.join(scratch, "history.db"),
+            WHISPERNET_DOWNLOADS=os.path.join(scratch, "downloads"),
+        )
+        if command is None:
+            command = [sys.executable, os.path.join(ROOT, "backend", "main.py")]
+        with open(os.path.join(scratch, "node.log"), "w") as log:
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                command, cwd=scratch, env=env, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL
+            )
+            first_packet = health = None
+            try:
+                deadline = started + timeout
+                while (first_packet is None or health is None) and time.perf_counter() < deadline:
+                    if process.poll() is not None:
+                        break
+                    if first_packet is None:
+                        try:
+                            listener.recvfrom(65535)
+                            first_packet = time.perf_counter() - started
+                        except socket.timeout:
+                            pass
+                    if health is None and _healthy(api_port):
+                        health = time.perf_counter() - started
+            finally:
+                _stop(process)
+        _drain(listener)
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 1)
+    return ms(first_packet), ms(health)
+
+
+def _drain(listener):
+    listener.setblocking(False)
+    try:
+        while True:
+            listener.recv(65535)
+    except (BlockingIOError, OSError):
+        pass
+    finally:
+        listener.settimeout(0.005)
+
+
+def _summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"first": values[0], "median": statistics.median(values[1:] or values), "min": min(values), "max": max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--command", help="node command line (default: python backend/main.py)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for each launch")
+    parser.add_argument("--output", help="append the series as one JSON line to this file")
+    args = parser.parse_args()
+    command = shlex.split(args.command) if args.command else None
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        listener.bind(("127.0.0.1", DISCOVERY_PORT))
+    except OSError as e:
+        sys.exit(f"UDP {DISCOVERY_PORT} is busy ({e}); stop other nodes first")
+    listener.settimeout(0.005)
+
+    first_packets, healths = [], []
+    print(f"{'run':>4} {'first packet':>13} {'health':>9}")
+    try:
+        for run in range(args.runs):
+            first_packet, health = launch_once(command, listener, args.timeout)
+            first_packets.append(first_packet)
+            healths.append(health)
+            show = lambda v: "-" if v is None else f"{v:.0f} ms"
+            print(f"{run + 1:>4} {show(first_packet):>13} {show(health):>9}")
+    finally:
+        listener.close()
+
+    record = {
+        "commit": _commit(),
+        "time": int(time.time()),
+        "command": args.command or "python backend/main.py",
+        "runs": args.runs,
+        "results": {"first_packet_ms": _summary(first_packets), "health_ms": _summary(healths)},
+    }
+    first = record["results"]["first_packet_ms"]
+    if first:
+        print(f"first packet: first run {first['first']:.0f} ms, median {first['median']:.0f} ms")
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
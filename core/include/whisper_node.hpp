@@ -11,13 +11,79 @@
     #define DLL_EXPORT
 #endif
 
+// Largest UDP payload over IPv4 (65535 - 8 byte UDP header - 20 byte IP header).
+#define WN_DATAGRAM_MAX 65507
+#define WN_IP_STR_MAX 16
+
+// One received datagram, as handed to the host by poll_messages(). The
+// payload itself is copied into the caller's arena at [offset, offset + length).
+typedef struct {
+    char sender_ip[WN_IP_STR_MAX];
+    int sender_port;
+    int length;
+    int offset;
+} wn_datagram;
+
+// Sealed unicast frames (see crypto.cpp): 18-byte header plus 16-byte tag
+#define WN_KEY_BYTES 32
+#define WN_SEAL_OVERHEAD 34
+#define WN_CRYPTO_NO_SESSION -1
+#define WN_CRYPTO_REJECTED -2
+#define WN_CRYPTO_TOO_LARGE -3
+// wn_session_install results
+#define WN_SESSION_UNCHANGED 0
+#define WN_SESSION_INSTALLED 1
+#define WN_SESSION_PENDING 2
+
+typedef void (*wn_message_callback)(const char* data, int length, const char* sender_ip, int sender_port);
+
+// A UDP listener: one or more sockets sharing a port through SO_REUSEPORT,
+// each with its own thread and ingress ring. Handles are independent, so
+// several listeners can live in one process. The start_udp_listener*,
+// poll_messages and *_multicast_group calls drive a process-wide default one.
+typedef struct wn_listener wn_listener;
+
 extern "C" {
-    DLL_EXPORT int start_udp_listener(int port, void (*on_message_received)(const char* message, const char* sender_ip, int sender_port));
+    DLL_EXPORT wn_listener* wn_listener_open(int port, int shards, wn_message_callback on_message_received,
+                                             void (*on_ingress_ready)(), int* bound_port);
+    DLL_EXPORT int wn_listener_shards(wn_listener* listener);
+    DLL_EXPORT int wn_listener_poll(wn_listener* listener, wn_datagram* out, int max_count, char* arena, int arena_len);
+    DLL_EXPORT int wn_listener_join_multicast(wn_listener* listener, const char* multicast_ip);
+    DLL_EXPORT int wn_listener_leave_multicast(wn_listener* listener, const char* multicast_ip);
+    DLL_EXPORT void wn_listener_close(wn_listener* listener);
+
+    DLL_EXPORT int start_udp_listener(int port, wn_message_callback on_message_received);
+    DLL_EXPORT int start_udp_listener_queued(int port, void (*on_ingress_ready)());
+    DLL_EXPORT int start_udp_listener_queued_sharded(int port, int shards, void (*on_ingress_ready)());
+    DLL_EXPORT int poll_messages(wn_datagram* out, int max_count, char* arena, int arena_len);
+    DLL_EXPORT unsigned long long get_ingress_dropped();
+    DLL_EXPORT int get_recv_stats(unsigned long long* out, int max_len);
     DLL_EXPORT void stop_udp_listener();
     DLL_EXPORT void send_udp_message(const char* message, const char* recipient_ip, int port);
+    DLL_EXPORT int send_udp_datagram(const char* data, int length, const char* recipient_ip, int port);
+    DLL_EXPORT int send_udp_batch(const char* const* messages, const int* lengths,
+                                  const char* const* recipient_ips, const int* ports, int count);
     DLL_EXPORT void send_broadcast_message(const char* message, int port);
+    DLL_EXPORT int get_send_stats(unsigned long long* out, int max_len);
+    DLL_EXPORT int set_broadcast_addresses(const char* const* ips, int count);
     DLL_EXPORT int join_multicast_group(const char* multicast_ip);
+    DLL_EXPORT int leave_multicast_group(const char* multicast_ip);
     DLL_EXPORT int get_local_ip(char* out_buffer, int max_len);
+
+    DLL_EXPORT int wn_x25519(unsigned char* out, const unsigned char* scalar, const unsigned char* point);
+    DLL_EXPORT int wn_aead_seal(const unsigned char* key, const unsigned char* nonce, const unsigned char* aad, int aad_len,
+                                const unsigned char* plaintext, int length, unsigned char* out);
+    DLL_EXPORT int wn_aead_open(const unsigned char* key, const unsigned char* nonce, const unsigned char* aad, int aad_len,
+                                const unsigned char* ciphertext, int length, unsigned char* out);
+    DLL_EXPORT int wn_crypto_init(const unsigned char* secret, unsigned char* public_out);
+    DLL_EXPORT int wn_crypto_configure(int capacity, int ttl_seconds, int rekey_messages, int rekey_seconds);
+    DLL_EXPORT int wn_session_install(const char* peer_ip, int peer_port, const unsigned char* peer_public);
+    DLL_EXPORT void wn_session_forget(const char* peer_ip, int peer_port);
+    DLL_EXPORT int wn_session_seal(const char* peer_ip, int peer_port, int local_port,
+                                   const char* plaintext, int length, char* out, int out_len);
+    DLL_EXPORT int wn_session_open(const char* sender_ip, const char* datagram, int length,
+                                   char* out, int out_len, int* sender_port);
+    DLL_EXPORT int get_crypto_stats(unsigned long long* out, int max_len);
 }
 
 #endif
@@ -0,0 +1,855 @@
+// Authenticated encryption for unicast frames.
+//
+// Primitives: X25519 (RFC 7748) for key agreement, ChaCha20-Poly1305
+// (RFC 8439) for sealing and HChaCha20 for key derivation. They are
+// implemented here so the core keeps building on every platform without a
+// crypto library; the unit tests check them against the RFC test vectors.
+//
+// Each process has one X25519 key pair, advertised in discovery frames. A
+// peer's public key installs a session in an LRU table keyed by the peer's
+// address and listening port:
+//
+//     k0        = HChaCha20(X25519(secret, peer_public), 0)
+//     send key  = HChaCha20(k0, local_public[0:12] | stream)
+//     recv key  = HChaCha20(k0, peer_public[0:12] | stream')
+//     rekey     = HChaCha20(key, "whispernet rekey")
+//
+// Every install starts a new send stream, so a side that lost its session
+// (expiry, eviction, restart) never reuses a nonce and the receiver knows to
+// reset its replay window. When a session is dropped, the position of its
+// receive window is kept per peer (bounded like the session table), and a
+// reinstall under the same peer key resumes from it. Frames captured from the
+// old stream therefore cannot be replayed after a forget and reinstall.
+//
+// Keys arrive in cleartext discovery frames, so a different key for a peer we
+// already have a session with does not replace it. It is held as pending,
+// and the session switches over only once a frame sealed under the pending
+// key authenticates. A frame under the current key, or the current key being
+// advertised again, discards the pending one. Sealed frames look like
+//
+//     magic "WNE" | epoch u8 | port u16 | stream u32 | counter u64 | ciphertext | tag[16]
+//
+// with the 18-byte header as associated data and nonce = 0^4 | counter (LE).
+// The sender moves to the next epoch after rekey_messages frames or
+// rekey_seconds; the receiver follows once a frame of the new epoch
+// authenticates and keeps the previous key for stragglers. Seal and open
+// work in caller-provided buffers and allocate nothing.
+#include "whisper_node.hpp"
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <cstring>
+#include <list>
+#include <mutex>
+#include <unordered_map>
+
+#ifdef _WIN32
+    #include <winsock2.h>
+    #include <ws2tcpip.h>
+#else
+    #include <arpa/inet.h>
+#endif
+
+#define SEAL_HEADER_BYTES 18
+#define SEAL_TAG_BYTES 16
+// How far ahead of the current epoch a frame may be and still be followed
+#define MAX_EPOCH_SKIP 16
+
+typedef unsigned char u8;
+
+static uint32_t load32_le(const u8* p) {
+    return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+static void store32_le(u8* p, uint32_t v) {
+    p[0] = (u8)v; p[1] = (u8)(v >> 8); p[2] = (u8)(v >> 16); p[3] = (u8)(v >> 24);
+}
+
+static void store64_le(u8* p, uint64_t v) {
+    store32_le(p, (uint32_t)v);
+    store32_le(p + 4, (uint32_t)(v >> 32));
+}
+
+static void wipe(void* p, size_t n) {
+    volatile u8* bytes = (volatile u8*)p;
+    while (n--) *bytes++ = 0;
+}
+
+// --- ChaCha20 (RFC 8439, section 2.3) ---
+
+#define ROTL32(v, n) (((v) << (n)) | ((v) >> (32 - (n))))
+#define QUARTER_ROUND(a, b, c, d) \
+    a += b; d ^= a; d = ROTL32(d, 16); \
+    c += d; b ^= c; b = ROTL32(b, 12); \
+    a += b; d ^= a; d = ROTL32(d, 8);  \
+    c += d; b ^= c; b = ROTL32(b, 7);
+
+static void chacha20_rounds(uint32_t x[16]) {
+    for (int i = 0; i < 10; ++i) {
+        QUARTER_ROUND(x[0], x[4], x[8],  x[12]);
+        QUARTER_ROUND(x[1], x[5], x[9],  x[13]);
+        QUARTER_ROUND(x[2], x[6], x[10], x[14]);
+        QUARTER_ROUND(x[3], x[7], x[11], x[15]);
+        QUARTER_ROUND(x[0], x[5], x[10], x[15]);
+        QUARTER_ROUND(x[1], x[6], x[11], x[12]);
+        QUARTER_ROUND(x[2], x[7], x[8],  x[13]);
+        QUARTER_ROUND(x[3], x[4], x[9],  x[14]);
+    }
+}
+
+static void chacha20_init(uint32_t state[16], const u8 key[32], uint32_t counter, const u8 nonce[12]) {
+    state[0] = 0x61707865; state[1] = 0x3320646e; state[2] = 0x79622d32; state[3] = 0x6b206574;
+    for (int i = 0; i < 8; ++i) state[4 + i] = load32_le(key + 4 * i);
+    state[12] = counter;
+    for (int i = 0; i < 3; ++i) state[13 + i] = load32_le(nonce + 4 * i);
+}
+
+static void chacha20_block(const uint32_t state[16], u8 out[64]) {
+    uint32_t x[16];
+    memcpy(x, state, sizeof(x));
+    chacha20_rounds(x);
+    for (int i = 0; i < 16; ++i) store32_le(out + 4 * i, x[i] + state[i]);
+}
+
+// XORs the keystream starting at block ``counter`` into ``in``
+static void chacha20_xor(const u8 key[32], uint32_t counter, const u8 nonce[12], const u8* in, u8* out, size_t length) {
+    uint32_t state[16];
+    u8 block[64];
+    chacha20_init(state, key, counter, nonce);
+    while (length > 0) {
+        chacha20_block(state, block);
+        size_t n = length < 64 ? length : 64;
+        for (size_t i = 0; i < n; ++i) out[i] = in[i] ^ block[i];
+        in += n;
+        out += n;
+        length -= n;
+        ++state[12];
+    }
+    wipe(block, sizeof(block));
+    wipe(state, sizeof(state));
+}
+
+// HChaCha20: a 256-bit subkey from a key and 16 bytes of input
+static void hchacha20(u8 out[32], const u8 key[32], const u8 input[16]) {
+    uint32_t x[16];
+    x[0] = 0x61707865; x[1] = 0x3320646e; x[2] = 0x79622d32; x[3] = 0x6b206574;
+    for (int i = 0; i < 8; ++i) x[4 + i] = load32_le(key + 4 * i);
+    for (int i = 0; i < 4; ++i) x[12 + i] = load32_le(input + 4 * i);
+    chacha20_rounds(x);
+    for (int i = 0; i < 4; ++i) {
+        store32_le(out + 4 * i, x[i]);
+        store32_le(out + 16 + 4 * i, x[12 + i]);
+    }
+    wipe(x, sizeof(x));
+}
+
+// --- Poly1305 (RFC 8439, section 2.5), 26-bit limbs ---
+
+struct Poly1305 {
+    uint32_t r[5];
+    uint32_t h[5];
+    uint32_t pad[4];
+};
+
+static void poly1305_init(Poly1305* st, const u8 key[32]) {
+    st->r[0] = (load32_le(key + 0)) & 0x3ffffff;
+    st->r[1] = (load32_le(key + 3) >> 2) & 0x3ffff03;
+    st->r[2] = (load32_le(key + 6) >> 4) & 0x3ffc0ff;
+    st->r[3] = (load32_le(key + 9) >> 6) & 0x3f03fff;
+    st->r[4] = (load32_le(key + 12) >> 8) & 0x00fffff;
+    for (int i = 0; i < 5; ++i) st->h[i] = 0;
+    for (int i = 0; i < 4; ++i) st->pad[i] = load32_le(key + 16 + 4 * i);
+}
+
+// Absorbs whole 16-byte blocks
+static void poly1305_blocks(Poly1305* st, const u8* m, size_t length) {
+    const uint32_t r0 = st->r[0], r1 = st->r[1], r2 = st->r[2], r3 = st->r[3], r4 = st->r[4];
+    const uint32_t s1 = r1 * 5, s2 = r2 * 5, s3 = r3 * 5, s4 = r4 * 5;
+    uint32_t h0 = st->h[0], h1 = st->h[1], h2 = st->h[2], h3 = st->h[3], h4 = st->h[4];
+
+    while (length >= 16) {
+        h0 += (load32_le(m + 0)) & 0x3ffffff;
+        h1 += (load32_le(m + 3) >> 2) & 0x3ffffff;
+        h2 += (load32_le(m + 6) >> 4) & 0x3ffffff;
+        h3 += (load32_le(m + 9) >> 6) & 0x3ffffff;
+        h4 += (load32_le(m + 12) >> 8) | (1u << 24);
+
+        uint64_t d0 = (uint64_t)h0 * r0 + (uint64_t)h1 * s4 + (uint64_t)h2 * s3 + (uint64_t)h3 * s2 + (uint64_t)h4 * s1;
+        uint64_t d1 = (uint64_t)h0 * r1 + (uint64_t)h1 * r0 + (uint64_t)h2 * s4 + (uint64_t)h3 * s3 + (uint64_t)h4 * s2;
+        uint64_t d2 = (uint64_t)h0 * r2 + (uint64_t)h1 * r1 + (uint64_t)h2 * r0 + (uint64_t)h3 * s4 + (uint64_t)h4 * s3;
+        uint64_t d3 = (uint64_t)h0 * r3 + (uint64_t)h1 * r2 + (uint64_t)h2 * r1 + (uint64_t)h3 * r0 + (uint64_t)h4 * s4;
+        uint64_t d4 = (uint64_t)h0 * r4 + (uint64_t)h1 * r3 + (uint64_t)h2 * r2 + (uint64_t)h3 * r1 + (uint64_t)h4 * r0;
+
+        uint32_t c = (uint32_t)(d0 >> 26); h0 = (uint32_t)d0 & 0x3ffffff;
+        d1 += c; c = (uint32_t)(d1 >> 26); h1 = (uint32_t)d1 & 0x3ffffff;
+        d2 += c; c = (uint32_t)(d2 >> 26); h2 = (uint32_t)d2 & 0x3ffffff;
+        d3 += c; c = (uint32_t)(d3 >> 26); h3 = (uint32_t)d3 & 0x3ffffff;
+        d4 += c; c = (uint32_t)(d4 >> 26); h4 = (uint32_t)d4 & 0x3ffffff;
+        h0 += c * 5; c = h0 >> 26; h0 &= 0x3ffffff;
+        h1 += c;
+
+        m += 16;
+        length -= 16;
+    }
+    st->h[0] = h0; st->h[1] = h1; st->h[2] = h2; st->h[3] = h3; st->h[4] = h4;
+}
+
+// Absorbs ``length`` bytes zero-padded to a multiple of 16, as the AEAD construction needs
+static void poly1305_padded(Poly1305* st, const u8* m, size_t length) {
+    size_t whole = length & ~(size_t)15;
+    poly1305_blocks(st, m, whole);
+    if (length > whole) {
+        u8 block[16] = {0};
+        memcpy(block, m + whole, length - whole);
+        poly1305_blocks(st, block, 16);
+    }
+}
+
+static void poly1305_finish(Poly1305* st, u8 mac[16]) {
+    uint32_t h0 = st->h[0], h1 = st->h[1], h2 = st->h[2], h3 = st->h[3], h4 = st->h[4];
+    uint32_t c;
+    c = h1 >> 26; h1 &= 0x3ffffff;
+    h2 += c; c = h2 >> 26; h2 &= 0x3ffffff;
+    h3 += c; c = h3 >> 26; h3 &= 0x3ffffff;
+    h4 += c; c = h4 >> 26; h4 &= 0x3ffffff;
+    h0 += c * 5; c = h0 >> 26; h0 &= 0x3ffffff;
+    h1 += c;
+
+    // h - p, selected in constant time when it does not borrow
+    uint32_t g0 = h0 + 5; c = g0 >> 26; g0 &= 0x3ffffff;
+    uint32_t g1 = h1 + c; c = g1 >> 26; g1 &= 0x3ffffff;
+    uint32_t g2 = h2 + c; c = g2 >> 26; g2 &= 0x3ffffff;
+    uint32_t g3 = h3 + c; c = g3 >> 26; g3 &= 0x3ffffff;
+    uint32_t g4 = h4 + c - (1u << 26);
+    uint32_t mask = (g4 >> 31) - 1;
+    g0 &= mask; g1 &= mask; g2 &= mask; g3 &= mask; g4 &= mask;
+    mask = ~mask;
+    h0 = (h0 & mask) | g0; h1 = (h1 & mask) | g1; h2 = (h2 & mask) | g2;
+    h3 = (h3 & mask) | g3; h4 = (h4 & mask) | g4;
+
+    h0 = h0 | (h1 << 26);
+    h1 = (h1 >> 6) | (h2 << 20);
+    h2 = (h2 >> 12) | (h3 << 14);
+    h3 = (h3 >> 18) | (h4 << 8);
+
+    uint64_t f;
+    f = (uint64_t)h0 + st->pad[0]; h0 = (uint32_t)f;
+    f = (uint64_t)h1 + st->pad[1] + (f >> 32); h1 = (uint32_t)f;
+    f = (uint64_t)h2 + st->pad[2] + (f >> 32); h2 = (uint32_t)f;
+    f = (uint64_t)h3 + st->pad[3] + (f >> 32); h3 = (uint32_t)f;
+    store32_le(mac + 0, h0);
+    store32_le(mac + 4, h1);
+    store32_le(mac + 8, h2);
+    store32_le(mac + 12, h3);
+    wipe(st, sizeof(*st));
+}
+
+// --- ChaCha20-Poly1305 AEAD (RFC 8439, section 2.8) ---
+
+static void aead_tag(const u8 key[32], const u8 nonce[12], const u8* aad, size_t aad_len,
+                     const u8* ciphertext, size_t length, u8 tag[16]) {
+    u8 block[64];
+    uint32_t state[16];
+    chacha20_init(state, key, 0, nonce);
+    chacha20_block(state, block);
+
+    Poly1305 st;
+    poly1305_init(&st, block);
+    poly1305_padded(&st, aad, aad_len);
+    poly1305_padded(&st, ciphertext, length);
+    u8 lengths[16];
+    store64_le(lengths, aad_len);
+    store64_le(lengths + 8, length);
+    poly1305_blocks(&st, lengths, 16);
+    poly1305_finish(&st, tag);
+    wipe(block, sizeof(block));
+    wipe(state, sizeof(state));
+}
+
+static int tags_equal(const u8 a[16], const u8 b[16]) {
+    u8 diff = 0;
+    for (int i = 0; i < 16; ++i) diff |= a[i] ^ b[i];
+    return diff == 0;
+}
+
+static void aead_seal(const u8 key[32], const u8 nonce[12], const u8* aad, size_t aad_len,
+                      const u8* plaintext, size_t length, u8* out) {
+    chacha20_xor(key, 1, nonce, plaintext, out, length);
+    aead_tag(key, nonce, aad, aad_len, out, length, out + length);
+}
+
+// Verifies before decrypting; ``length`` includes the tag
+static bool aead_open(const u8 key[32], const u8 nonce[12], const u8* aad, size_t aad_len,
+                      const u8* ciphertext, size_t length, u8* out) {
+    if (length < SEAL_TAG_BYTES) return false;
+    size_t body = length - SEAL_TAG_BYTES;
+    u8 expected[16];
+    aead_tag(key, nonce, aad, aad_len, ciphertext, body, expected);
+    if (!tags_equal(expected, ciphertext + body)) return false;
+    chacha20_xor(key, 1, nonce, ciphertext, out, body);
+    return true;
+}
+
+// --- X25519 (RFC 7748), field elements as 16 limbs of 16 bits ---
+
+typedef int64_t gf[16];
+
+static void car25519(gf o) {
+    for (int i = 0; i < 16; ++i) {
+        o[i] += (int64_t)1 << 16;
+        int64_t c = o[i] >> 16;
+        o[(i + 1) * (i < 15)] += c - 1 + 37 * (c - 1) * (i == 15);
+        o[i] -= c * ((int64_t)1 << 16);
+    }
+}
+
+static void sel25519(gf p, gf q, int64_t b) {
+    int64_t mask = ~(b - 1);
+    for (int i = 0; i < 16; ++i) {
+        int64_t t = mask & (p[i] ^ q[i]);
+        p[i] ^= t;
+        q[i] ^= t;
+    }
+}
+
+static void pack25519(u8 o[32], const gf n) {
+    gf m, t;
+    for (int i = 0; i < 16; ++i) t[i] = n[i];
+    car25519(t);
+    car25519(t);
+    car25519(t);
+    for (int j = 0; j < 2; ++j) {
+        m[0] = t[0] - 0xffed;
+        for (int i = 1; i < 15; ++i) {
+            m[i] = t[i] - 0xffff - ((m[i - 1] >> 16) & 1);
+            m[i - 1] &= 0xffff;
+        }
+        m[15] = t[15] - 0x7fff - ((m[14] >> 16) & 1);
+        int64_t b = (m[15] >> 16) & 1;
+        m[14] &= 0xffff;
+        sel25519(t, m, 1 - b);
+    }
+    for (int i = 0; i < 16; ++i) {
+        o[2 * i] = (u8)(t[i] & 0xff);
+        o[2 * i + 1] = (u8)(t[i] >> 8);
+    }
+}
+
+static void unpack25519(gf o, const u8 n[32]) {
+    for (int i = 0; i < 16; ++i) o[i] = n[2 * i] + ((int64_t)n[2 * i + 1] << 8);
+    o[15] &= 0x7fff;
+}
+
+static void fe_add(gf o, const gf a, const gf b) { for (int i = 0; i < 16; ++i) o[i] = a[i] + b[i]; }
+static void fe_sub(gf o, const gf a, const gf b) { for (int i = 0; i < 16; ++i) o[i] = a[i] - b[i]; }
+
+static void fe_mul(gf o, const gf a, const gf b) {
+    int64_t t[31] = {0};
+    for (int i = 0; i < 16; ++i) {
+        for (int j = 0; j < 16; ++j) t[i + j] += a[i] * b[j];
+    }
+    for (int i = 0; i < 15; ++i) t[i] += 38 * t[i + 16];
+    for (int i = 0; i < 16; ++i) o[i] = t[i];
+    car25519(o);
+    car25519(o);
+}
+
+static void fe_invert(gf o, const gf in) {
+    gf c;
+    for (int i = 0; i < 16; ++i) c[i] = in[i];
+    for (int a = 253; a >= 0; --a) {
+        fe_mul(c, c, c);
+        if (a != 2 && a != 4) fe_mul(c, c, in);
+    }
+    for (int i = 0; i < 16; ++i) o[i] = c[i];
+}
+
+static void x25519(u8 out[32], const u8 scalar[32], const u8 point[32]) {
+    static const gf a24 = {0xdb41, 1};
+    u8 z[32];
+    gf x, a, b, c, d, e, f;
+    memcpy(z, scalar, 32);
+    z[31] = (z[31] & 127) | 64;
+    z[0] &= 248;
+    unpack25519(x, point);
+    for (int i = 0; i < 16; ++i) {
+        b[i] = x[i];
+        a[i] = c[i] = d[i] = 0;
+    }
+    a[0] = d[0] = 1;
+    for (int i = 254; i >= 0; --i) {
+        int64_t bit = (z[i >> 3] >> (i & 7)) & 1;
+        sel25519(a, b, bit);
+        sel25519(c, d, bit);
+        fe_add(e, a, c);
+        fe_sub(a, a, c);
+        fe_add(c, b, d);
+        fe_sub(b, b, d);
+        fe_mul(d, e, e);
+        fe_mul(f, a, a);
+        fe_mul(a, c, a);
+        fe_mul(c, b, e);
+        fe_add(e, a, c);
+        fe_sub(a, a, c);
+        fe_mul(b, a, a);
+        fe_sub(c, d, f);
+        fe_mul(a, c, a24);
+        fe_add(a, a, d);
+        fe_mul(c, c, a);
+        fe_mul(a, d, f);
+        fe_mul(d, b, x);
+        fe_mul(b, e, e);
+        sel25519(a, b, bit);
+        sel25519(c, d, bit);
+    }
+    fe_invert(c, c);
+    fe_mul(a, a, c);
+    pack25519(out, a);
+    wipe(z, sizeof(z));
+}
+
+// --- Sessions ---
+
+static const u8 REKEY_INPUT[16] = {'w', 'h', 'i', 's', 'p', 'e', 'r', 'n', 'e', 't', ' ', 'r', 'e', 'k', 'e', 'y'};
+static const u8 ZERO_INPUT[16] = {0};
+
+// Replay window over the last 64 counters of one receive key
+struct RecvKey {
+    u8 key[32];
+    uint32_t stream = 0;
+    uint8_t epoch = 0;
+    bool valid = false;
+    bool seen = false;
+    uint64_t highest = 0;
+    uint64_t window = 0;
+
+    bool fresh(uint64_t counter) const {
+        if (!seen || counter > highest) return true;
+        uint64_t behind = highest - counter;
+        return behind < 64 && !(window & ((uint64_t)1 << behind));
+    }
+
+    void accept(uint64_t counter) {
+        if (!seen) {
+            seen = true;
+            highest = counter;
+            window = 1;
+        } else if (counter > highest) {
+            uint64_t shift = counter - highest;
+            window = shift >= 64 ? 1 : (window << shift) | 1;
+            highest = counter;
+        } else {
+            window |= (uint64_t)1 << (highest - counter);
+        }
+    }
+};
+
+struct Session {
+    uint64_t peer;
+    u8 peer_public[32];
+    u8 root[32];
+    u8 pending_public[32];
+    u8 pending_root[32];
+    bool has_pending;
+    u8 send_key[32];
+    uint32_t send_stream;
+    uint8_t send_epoch;
+    uint64_t send_counter;
+    int64_t send_epoch_started;
+    RecvKey recv[2]; // current, previous
+    int64_t last_used;
+};
+
+static std::mutex g_crypto_mutex;
+static bool g_identity_set = false;
+static u8 g_secret[32];
+static u8 g_public[32];
+static std::list<Session> g_sessions; // most recently used first
+static std::unordered_map<uint64_t, std::list<Session>::iterator> g_session_index;
+static std::atomic<uint32_t> g_next_stream{1};
+
+// Receive window position of a dropped session, restored if the peer's key is unchanged
+struct RecvFloor {
+    u8 peer_public[32];
+    uint32_t stream;
+    uint8_t epoch;
+    bool seen;
+    uint64_t highest;
+    uint64_t window;
+};
+static std::unordered_map<uint64_t, RecvFloor> g_recv_floors;
+
+static size_t g_session_capacity = 1024;
+static int64_t g_session_ttl = 600;
+static uint64_t g_rekey_messages = 1000000;
+static int64_t g_rekey_seconds = 600;
+
+// Layout of get_crypto_stats(): {sessions, sealed, opened, rejected, rekeys, evicted}
+static std::atomic<unsigned long long> g_sealed{0};
+static std::atomic<unsigned long long> g_opened{0};
+static std::atomic<unsigned long long> g_rejected{0};
+static std::atomic<unsigned long long> g_rekeys{0};
+static std::atomic<unsigned long long> g_evicted{0};
+
+static int64_t now_seconds() {
+    return std::chrono::duration_cast<std::chrono::seconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
+static bool peer_id(const char* ip, int port, uint64_t* out) {
+    struct in_addr addr;
+    if (!ip || inet_pton(AF_INET, ip, &addr) != 1 || port < 0 || port > 0xFFFF) return false;
+    *out = ((uint64_t)ntohl(addr.s_addr) << 16) | (uint64_t)port;
+    return true;
+}
+
+static void direction_key(u8 out[32], const u8 root[32], const u8 owner_public[32], uint32_t stream) {
+    u8 input[16];
+    memcpy(input, owner_public, 12);
+    store32_le(input + 12, stream);
+    hchacha20(out, root, input);
+}
+
+static void save_floor(const Session& s) {
+    const RecvKey& current = s.recv[0];
+    if (!current.valid) return;
+    if (g_recv_floors.size() >= g_session_capacity && !g_recv_floors.count(s.peer)) {
+        g_recv_floors.erase(g_recv_floors.begin());
+    }
+    RecvFloor& floor = g_recv_floors[s.peer];
+    memcpy(floor.peer_public, s.peer_public, 32);
+    floor.stream = current.stream;
+    floor.epoch = current.epoch;
+    floor.seen = current.seen;
+    floor.highest = current.highest;
+    floor.window = current.window;
+}
+
+// Resumes the receive window saved for this peer and key, if any
+static void restore_floor(Session& s) {
+    auto found = g_recv_floors.find(s.peer);
+    if (found == g_recv_floors.end()) return;
+    const RecvFloor& floor = found->second;
+    if (memcmp(floor.peer_public, s.peer_public, 32) == 0) {
+        RecvKey& current = s.recv[0];
+        direction_key(current.key, s.root, s.peer_public, floor.stream);
+        for (int i = 0; i < floor.epoch; ++i) hchacha20(current.key, current.key, REKEY_INPUT);
+        current.stream = floor.stream;
+        current.epoch = floor.epoch;
+        current.seen = floor.seen;
+        current.highest = floor.highest;
+        current.window = floor.window;
+        current.valid = true;
+    }
+    g_recv_floors.erase(found);
+}
+
+// Starts a fresh send stream under ``s.root``
+static void start_send_stream(Session& s, int64_t now) {
+    s.send_stream = g_next_stream.fetch_add(1, std::memory_order_relaxed);
+    direction_key(s.send_key, s.root, g_public, s.send_stream);
+    s.send_epoch = 0;
+    s.send_counter = 0;
+    s.send_epoch_started = now;
+}
+
+static void erase_session(std::list<Session>::iterator it) {
+    save_floor(*it);
+    g_session_index.erase(it->peer);
+    wipe(&*it, sizeof(Session));
+    g_sessions.erase(it);
+}
+
+// The live session for ``peer``, moved to the front; expired ones are dropped
+static Session* find_session(uint64_t peer, int64_t now) {
+    auto found = g_session_index.find(peer);
+    if (found == g_session_index.end()) return nullptr;
+    auto it = found->second;
+    if (now - it->last_used > g_session_ttl) {
+        erase_session(it);
+        g_evicted.fetch_add(1, std::memory_order_relaxed);
+        return nullptr;
+    }
+    if (it != g_sessions.begin()) g_sessions.splice(g_sessions.begin(), g_sessions, it);
+    it->last_used = now;
+    return &*it;
+}
+
+// Tries ``candidate`` on a sealed frame; on success the plaintext is in ``out``
+static bool try_open(RecvKey& candidate, const u8* datagram, size_t length, uint64_t counter, u8* out) {
+    if (!candidate.fresh(counter)) return false;
+    u8 nonce[12] = {0};
+    store64_le(nonce + 4, counter);
+    if (!aead_open(candidate.key, nonce, datagram, SEAL_HEADER_BYTES,
+                   datagram + SEAL_HEADER_BYTES, length - SEAL_HEADER_BYTES, out)) {
+        return false;
+    }
+    candidate.accept(counter);
+    return true;
+}
+
+// Receive key for a frame of (stream, epoch) matching neither known key: a
+// later epoch of the current stream, or a newer stream (the peer reinstalled
+// its session). Older streams and epochs are refused, so their captured
+// frames cannot be replayed against a reset window.
+static bool derive_recv_key(const Session& s, uint32_t stream, uint8_t epoch, RecvKey* out) {
+    const RecvKey& current = s.recv[0];
+    int steps;
+    if (current.valid && current.stream == stream) {
+        uint8_t ahead = (uint8_t)(epoch - current.epoch);
+        if (ahead == 0 || ahead > MAX_EPOCH_SKIP) return false;
+        memcpy(out->key, current.key, 32);
+        steps = ahead;
+    } else {
+        if (current.valid && stream < current.stream) return false;
+        direction_key(out->key, s.root, s.peer_public, stream);
+        steps = epoch;
+    }
+    for (int i = 0; i < steps; ++i) hchacha20(out->key, out->key, REKEY_INPUT);
+    out->stream = stream;
+    out->epoch = epoch;
+    out->valid = true;
+    return true;
+}
+
+extern "C" {
+    int wn_x25519(unsigned char* out, const unsigned char* scalar, const unsigned char* point) {
+        static const u8 base[32] = {9};
+        x25519(out, scalar, point ? point : base);
+        u8 zero = 0;
+        for (int i = 0; i < 32; ++i) zero |= out[i];
+        return zero != 0; // all zero: a low-order point, unusable as a shared secret
+    }
+
+    int wn_aead_seal(const unsigned char* key, const unsigned char* nonce, const unsigned char* aad, int aad_len,
+                     const unsigned char* plaintext, int length, unsigned char* out) {
+        if (length < 0 || aad_len < 0) return -1;
+        aead_seal(key, nonce, aad, (size_t)aad_len, plaintext, (size_t)length, out);
+        return length + SEAL_TAG_BYTES;
+    }
+
+    int wn_aead_open(const unsigned char* key, const unsigned char* nonce, const unsigned char* aad, int aad_len,
+                     const unsigned char* ciphertext, int length, unsigned char* out) {
+        if (length < SEAL_TAG_BYTES || aad_len < 0) return -1;
+        if (!aead_open(key, nonce, aad, (size_t)aad_len, ciphertext, (size_t)length, out)) return -1;
+        return length - SEAL_TAG_BYTES;
+    }
+
+    int wn_crypto_init(const unsigned char* secret, unsigned char* public_out) {
+        std::lock_guard<std::mutex> lock(g_crypto_mutex);
+        memcpy(g_secret, secret, 32);
+        if (!wn_x25519(g_public, g_secret, nullptr)) return 0;
+        memcpy(public_out, g_public, 32);
+        while (!g_sessions.empty()) erase_session(g_sessions.begin());
+        g_recv_floors.clear(); // a new identity means new roots
+        g_identity_set = true;
+        return 1;
+    }
+
+    int wn_crypto_configure(int capacity, int ttl_seconds, int rekey_messages, int rekey_seconds) {
+        if (capacity < 1 || ttl_seconds < 1 || rekey_messages < 1 || rekey_seconds < 1) return 0;
+        std::lock_guard<std::mutex> lock(g_crypto_mutex);
+        g_session_capacity = (size_t)capacity;
+        g_session_ttl = ttl_seconds;
+        g_rekey_messages = (uint64_t)rekey_messages;
+        g_rekey_seconds = rekey_seconds;
+        while (g_sessions.size() > g_session_capacity) {
+            erase_session(std::prev(g_sessions.end()));
+            g_evicted.fetch_add(1, std::memory_order_relaxed);
+        }
+        return 1;
+    }
+
+    int wn_session_install(const char* peer_ip, int peer_port, const unsigned char* peer_public) {
+        uint64_t peer;
+        if (!peer_id(peer_ip, peer_port, &peer)) return -1;
+        std::lock_guard<std::mutex> lock(g_crypto_mutex);
+        if (!g_identity_set) return -1;
+        int64_t now = now_seconds();
+
+        Session* existing = find_session(peer, now);
+        if (existing && memcmp(existing->peer_public, peer_public, 32) == 0) {
+            if (existing->has_pending) {
+                wipe(existing->pending_root, 32);
+                existing->has_pending = false;
+            }
+            return WN_SESSION_UNCHANGED;
+        }
+
+        u8 shared[32];
+        if (!wn_x25519(shared, g_secret, peer_public)) return -1;
+        if (existing) {
+            // Unauthenticated claim of a new key: hold it until a frame proves it
+            memcpy(existing->pending_public, peer_public, 32);
+            hchacha20(existing->pending_root, shared, ZERO_INPUT);
+            wipe(shared, sizeof(shared));
+            existing->has_pending = true;
+            return WN_SESSION_PENDING;
+        }
+        if (g_sessions.size() >= g_session_capacity) {
+            erase_session(std::prev(g_sessions.end()));
+            g_evicted.fetch_add(1, std::memory_order_relaxed);
+        }
+
+        g_sessions.emplace_front();
+        Session& s = g_sessions.front();
+        s.peer = peer;
+        memcpy(s.peer_public, peer_public, 32);
+        hchacha20(s.root, shared, ZERO_INPUT);
+        wipe(shared, sizeof(shared));
+        s.has_pending = false;
+        start_send_stream(s, now);
+        s.last_used = now;
+        restore_floor(s);
+        g_session_index[peer] = g_sessions.begin();
+        return WN_SESSION_INSTALLED;
+    }
+
+    void wn_session_forget(const char* peer_ip, int peer_port) {
+        uint64_t peer;
+        if (!peer_id(peer_ip, peer_port, &peer)) return;
+        std::lock_guard<std::mutex> lock(g_crypto_mutex);
+        auto found = g_session_index.find(peer);
+        if (found != g_session_index.end()) erase_session(found->second);
+    }
+
+    int wn_session_seal(const char* peer_ip, int peer_port, int local_port,
+                        const char* plaintext, int length, char* out, int out_len) {
+        uint64_t peer;
+        if (!peer_id(peer_ip, peer_port, &peer) || length < 0) return WN_CRYPTO_NO_SESSION;
+        if ((long long)out_len < (long long)length + WN_SEAL_OVERHEAD) return WN_CRYPTO_TOO_LARGE;
+
+        u8 key[32];
+        u8* header = (u8*)out;
+        uint64_t counter;
+        {
+            std::lock_guard<std::mutex> lock(g_crypto_mutex);
+            int64_t now = now_seconds();
+            Session* s = find_session(peer, now);
+            if (!s) return WN_CRYPTO_NO_SESSION;
+            if (s->send_counter >= g_rekey_messages || now - s->send_epoch_started >= g_rekey_seconds) {
+                hchacha20(s->send_key, s->send_key, REKEY_INPUT);
+                s->send_epoch++;
+                s->send_counter = 0;
+                s->send_epoch_started = now;
+                g_rekeys.fetch_add(1, std::memory_order_relaxed);
+            }
+            counter = s->send_counter++;
+            header[0] = 'W'; header[1] = 'N'; header[2] = 'E';
+            header[3] = s->send_epoch;
+            header[4] = (u8)(local_port >> 8);
+            header[5] = (u8)local_port;
+            for (int i = 0; i < 4; ++i) header[6 + i] = (u8)(s->send_stream >> (24 - 8 * i));
+            for (int i = 0; i < 8; ++i) header[10 + i] = (u8)(counter >> (56 - 8 * i));
+            memcpy(key, s->send_key, 32);
+        }
+
+        // Encrypt outside the lock so concurrent senders only serialise on the counter
+        u8 nonce[12] = {0};
+        store64_le(nonce + 4, counter);
+        aead_seal(key, nonce, header, SEAL_HEADER_BYTES, (const u8*)plaintext, (size_t)length,
+                  header + SEAL_HEADER_BYTES);
+        wipe(key, sizeof(key));
+        g_sealed.fetch_add(1, std::memory_order_relaxed);
+        return length + WN_SEAL_OVERHEAD;
+    }
+
+    int wn_session_open(const char* sender_ip, const char* datagram, int length,
+                        char* out, int out_len, int* sender_port) {
+        const u8* in = (const u8*)datagram;
+        if (length < WN_SEAL_OVERHEAD || in[0] != 'W' || in[1] != 'N' || in[2] != 'E') return WN_CRYPTO_REJECTED;
+        if (out_len < length - WN_SEAL_OVERHEAD) return WN_CRYPTO_TOO_LARGE;
+
+        uint8_t epoch = in[3];
+        int port = (in[4] << 8) | in[5];
+        uint32_t stream = 0;
+        for (int i = 0; i < 4; ++i) stream = (stream << 8) | in[6 + i];
+        uint64_t counter = 0;
+        for (int i = 0; i < 8; ++i) counter = (counter << 8) | in[10 + i];
+        if (sender_port) *sender_port = port;
+
+        uint64_t peer;
+        if (!peer_id(sender_ip, port, &peer)) return WN_CRYPTO_NO_SESSION;
+        std::lock_guard<std::mutex> lock(g_crypto_mutex);
+        int64_t now = now_seconds();
+        Session* s = find_session(peer, now);
+        if (!s) return WN_CRYPTO_NO_SESSION;
+
+        RecvKey* known = nullptr;
+        for (RecvKey& k : s->recv) {
+            if (k.valid && k.stream == stream && k.epoch == epoch) known = &k;
+        }
+        bool opened = false;
+        if (known) {
+            opened = try_open(*known, in, (size_t)length, counter, (u8*)out);
+        } else {
+            // Adopt the new key only once a frame under it authenticates
+            RecvKey candidate;
+            if (derive_recv_key(*s, stream, epoch, &candidate)
+                && try_open(candidate, in, (size_t)length, counter, (u8*)out)) {
+                wipe(&s->recv[1], sizeof(RecvKey));
+                s->recv[1] = s->recv[0];
+                s->recv[0] = candidate;
+                opened = true;
+            }
+            wipe(&candidate, sizeof(candidate));
+        }
+        if (opened) {
+            if (s->has_pending) {
+                wipe(s->pending_root, 32); // the current key is still in use
+                s->has_pending = false;
+            }
+            g_opened.fetch_add(1, std::memory_order_relaxed);
+            return length - WN_SEAL_OVERHEAD;
+        }
+
+        if (s->has_pending) {
+            // The peer proved the pending key (e.g. it restarted): switch over
+            Session pending;
+            memcpy(pending.root, s->pending_root, 32);
+            memcpy(pending.peer_public, s->pending_public, 32);
+            RecvKey candidate;
+            if (derive_recv_key(pending, stream, epoch, &candidate)
+                && try_open(candidate, in, (size_t)length, counter, (u8*)out)) {
+                memcpy(s->peer_public, s->pending_public, 32);
+                memcpy(s->root, s->pending_root, 32);
+                wipe(s->pending_root, 32);
+                s->has_pending = false;
+                wipe(s->recv, sizeof(s->recv));
+                s->recv[0] = candidate;
+                s->recv[1] = RecvKey();
+                start_send_stream(*s, now);
+                opened = true;
+            }
+            wipe(&candidate, sizeof(candidate));
+            wipe(&pending, sizeof(pending));
+            if (opened) {
+                g_opened.fetch_add(1, std::memory_order_relaxed);
+                return length - WN_SEAL_OVERHEAD;
+            }
+        }
+        g_rejected.fetch_add(1, std::memory_order_relaxed);
+        return WN_CRYPTO_REJECTED;
+    }
+
+    int get_crypto_stats(unsigned long long* out, int max_len) {
+        unsigned long long sessions;
+        {
+            std::lock_guard<std::mutex> lock(g_crypto_mutex);
+            sessions = g_sessions.size();
+        }
+        const unsigned long long values[] = {
+            sessions,
+            g_sealed.load(std::memory_order_relaxed),
+            g_opened.load(std::memory_order_relaxed),
+            g_rejected.load(std::memory_order_relaxed),
+            g_rekeys.load(std::memory_order_relaxed),
+            g_evicted.load(std::memory_order_relaxed),
+        };
+        int written = 0;
+        for (; written < (int)(sizeof(values) / sizeof(values[0])) && written < max_len; ++written) {
+            out[written] = values[written];
+        }
+        return written;
+    }
+}
@@ -3,6 +3,11 @@
 #include <cstring>
 #include <thread>
 #include <string>
+#include <cstddef>
+#include <cstdint>
+#include <memory>
+#include <functional>
+#include <cerrno>
 
 #ifdef _WIN32
     #include <winsock2.h>
@@ -18,12 +23,20 @@
     #include <netinet/in.h>
     #include <arpa/inet.h>
     #include <unistd.h>
+    #if defined(__linux__)
+        // recvmmsg()/sendmmsg(): many datagrams per syscall
+        #define WN_HAVE_MMSG 1
+    #endif
     typedef int socket_t;
     #define CLOSESOCKET(s) close(s)
     #define SETSOCKOPT_CAST
 #endif
 
-#define BUFFER_SIZE 1024
+#define BUFFER_SIZE WN_DATAGRAM_MAX
+// Must stay a power of two so the ring index can be masked.
+#define INGRESS_QUEUE_CAPACITY 1024
+// Upper bound on datagrams moved by a single recvmmsg()/sendmmsg() call.
+#define MMSG_BATCH 64
 
 void initialize_networking() {
 #ifdef _WIN32
@@ -37,205 +50,898 @@ void initialize_networking() {
 
 #include <atomic>
 #include <mutex>
+#include <vector>
+
+#if defined(__linux__)
+    #include <linux/filter.h>
+    #include <linux/if_packet.h>
+    // Several sockets on one port with the kernel hashing unicast flows across
+    // them. Other platforms either lack SO_REUSEPORT or do not balance it.
+    #define WN_HAVE_SHARDING 1
+#endif
+// Upper bound on listener sockets per port
+#define MAX_LISTENER_SHARDS 64
 
-static void (*g_on_message_received)(const char* message, const char* sender_ip, int sender_port) = nullptr;
-static socket_t g_sockfd = -1;
-static std::atomic<bool> g_running{false};
-static std::mutex g_callback_mutex;
-static std::thread g_listen_thread;
+#if defined(__linux__)
+    #include <sys/epoll.h>
+    #include <sys/eventfd.h>
+    #define WN_HAVE_EPOLL 1
+#endif
 
-struct ListenerCleanup {
-    ~ListenerCleanup() {
-        g_running = false;
-        if (g_listen_thread.joinable()) {
-            g_listen_thread.join();
+// Readiness loop that owns a set of sockets and runs a handler whenever one
+// becomes readable. stop() wakes run() immediately through an eventfd
+// (Linux, epoll) or a loopback datagram socket (select elsewhere), so
+// shutting down never waits on a timeout. Sockets are registered before
+// run() starts; new socket types plug in as another add() instead of
+// another thread.
+struct Reactor {
+    typedef std::function<void()> Handler;
+
+    Reactor() = default;
+    Reactor(const Reactor&) = delete;
+    Reactor& operator=(const Reactor&) = delete;
+
+    ~Reactor() {
+#ifdef WN_HAVE_EPOLL
+        if (epoll_fd != -1) close(epoll_fd);
+        if (wake_fd != -1) close(wake_fd);
+#else
+        if (wake_rx != (socket_t)-1) CLOSESOCKET(wake_rx);
+        if (wake_tx != (socket_t)-1) CLOSESOCKET(wake_tx);
+#endif
+    }
+
+    bool open() {
+#ifdef WN_HAVE_EPOLL
+        epoll_fd = epoll_create1(EPOLL_CLOEXEC);
+        wake_fd = eventfd(0, EFD_NONBLOCK | EFD_CLOEXEC);
+        if (epoll_fd == -1 || wake_fd == -1) {
+            perror("reactor: epoll/eventfd setup failed");
+            return false;
+        }
+        struct epoll_event ev;
+        memset(&ev, 0, sizeof(ev));
+        ev.events = EPOLLIN;
+        ev.data.u64 = WAKE_TOKEN;
+        if (epoll_ctl(epoll_fd, EPOLL_CTL_ADD, wake_fd, &ev) < 0) {
+            perror("reactor: epoll_ctl(wake) failed");
+            return false;
         }
-        if (g_sockfd != -1) {
+        return true;
+#else
+        // A datagram socket connected to itself stands in for an eventfd
+        struct sockaddr_in addr;
+        memset(&addr, 0, sizeof(addr));
+        addr.sin_family = AF_INET;
+        addr.sin_addr.s_addr = htonl(INADDR_LOOPBACK);
 #ifdef _WIN32
-            closesocket(g_sockfd);
+        int addr_len = sizeof(addr);
 #else
-            close(g_sockfd);
+        socklen_t addr_len = sizeof(addr);
 #endif
-            g_sockfd = -1;
+        wake_rx = socket(AF_INET, SOCK_DGRAM, 0);
+        wake_tx = socket(AF_INET, SOCK_DGRAM, 0);
+        if (wake_rx == (socket_t)-1 || wake_tx == (socket_t)-1
+            || bind(wake_rx, (struct sockaddr*)&addr, sizeof(addr)) < 0
+            || getsockname(wake_rx, (struct sockaddr*)&addr, &addr_len) < 0
+            || connect(wake_tx, (struct sockaddr*)&addr, sizeof(addr)) < 0) {
+            perror("reactor: wake socket setup failed");
+            return false;
         }
+        return true;
+#endif
     }
-} g_cleanup;
 
-void listen_thread_func(socket_t sockfd) {
-    char buffer[BUFFER_SIZE];
+    bool add(socket_t fd, Handler on_readable) {
+#ifdef WN_HAVE_EPOLL
+        struct epoll_event ev;
+        memset(&ev, 0, sizeof(ev));
+        ev.events = EPOLLIN;
+        ev.data.u64 = handlers.size();
+        if (epoll_ctl(epoll_fd, EPOLL_CTL_ADD, fd, &ev) < 0) {
+            perror("reactor: epoll_ctl(add) failed");
+            return false;
+        }
+#else
+        if (handlers.size() + 1 >= FD_SETSIZE) {
+            std::cerr << "reactor: select() cannot watch more sockets" << std::endl;
+            return false;
+        }
+#endif
+        handlers.push_back(Registration{fd, std::move(on_readable)});
+        return true;
+    }
+
+    // Dispatches readiness until stop() is called
+    void run() {
+        while (!stopping.load(std::memory_order_acquire)) {
+#ifdef WN_HAVE_EPOLL
+            struct epoll_event events[REACTOR_MAX_EVENTS];
+            int n = epoll_wait(epoll_fd, events, REACTOR_MAX_EVENTS, -1);
+            if (n < 0) {
+                if (errno == EINTR) continue;
+                perror("reactor: epoll_wait failed");
+                return;
+            }
+            for (int i = 0; i < n && !stopping.load(std::memory_order_acquire); ++i) {
+                if (events[i].data.u64 != WAKE_TOKEN) handlers[events[i].data.u64].on_readable();
+            }
+#else
+            fd_set readfds;
+            FD_ZERO(&readfds);
+            FD_SET(wake_rx, &readfds);
+            socket_t max_fd = wake_rx;
+            for (const Registration& r : handlers) {
+                FD_SET(r.fd, &readfds);
+                if (r.fd > max_fd) max_fd = r.fd;
+            }
+            int ready = select((int)max_fd + 1, &readfds, nullptr, nullptr, nullptr);
+            if (ready < 0) {
+#ifndef _WIN32
+                if (errno == EINTR) continue;
+#endif
+                perror("reactor: select failed");
+                return;
+            }
+            for (const Registration& r : handlers) {
+                if (stopping.load(std::memory_order_acquire)) break;
+                if (FD_ISSET(r.fd, &readfds)) r.on_readable();
+            }
+#endif
+        }
+    }
+
+    // Safe from any thread, including handlers
+    void stop() {
+        if (stopping.exchange(true)) return;
+#ifdef WN_HAVE_EPOLL
+        uint64_t one = 1;
+        ssize_t written = write(wake_fd, &one, sizeof(one));
+        (void)written; // a full counter still leaves the eventfd readable
+#else
+        char byte = 0;
+        send(wake_tx, &byte, 1, 0);
+#endif
+    }
+
+    // Registered before run(), read-only afterwards
+    struct Registration {
+        socket_t fd;
+        Handler on_readable;
+    };
+
+    static const int REACTOR_MAX_EVENTS = 16;
+    std::vector<Registration> handlers;
+    std::atomic<bool> stopping{false};
+#ifdef WN_HAVE_EPOLL
+    static const uint64_t WAKE_TOKEN = ~(uint64_t)0;
+    int epoll_fd = -1;
+    int wake_fd = -1;
+#else
+    socket_t wake_rx = -1;
+    socket_t wake_tx = -1;
+#endif
+};
+
+// Process-wide receive counters, read in bulk by get_recv_stats()
+static std::atomic<unsigned long long> g_ingress_dropped{0};
+static std::atomic<unsigned long long> g_recv_datagrams{0};
+static std::atomic<unsigned long long> g_recv_bytes{0};
+static std::atomic<unsigned long long> g_recv_syscalls{0};
+
+// Single-producer/single-consumer ring of received datagrams. A shard's
+// listener thread fills slots in place; the host drains them in batches
+// through wn_listener_poll() after being poked once via on_ingress_ready.
+struct IngressSlot {
+    char sender_ip[WN_IP_STR_MAX];
+    int sender_port;
+    int length;
+    char* data;
+};
+
+struct IngressRing {
+    IngressSlot slots[INGRESS_QUEUE_CAPACITY];
+    // Payload storage for every slot, allocated once and left uninitialised so
+    // only the pages that actually receive data become resident.
+    std::unique_ptr<char[]> storage;
+    std::atomic<size_t> head{0};
+    std::atomic<size_t> tail{0};
+
+    void allocate() {
+        storage.reset(new char[(size_t)INGRESS_QUEUE_CAPACITY * BUFFER_SIZE]);
+        for (size_t i = 0; i < INGRESS_QUEUE_CAPACITY; ++i) {
+            slots[i].data = storage.get() + i * BUFFER_SIZE;
+        }
+    }
+
+    IngressSlot* reserve() {
+        size_t t = tail.load(std::memory_order_relaxed);
+        size_t h = head.load(std::memory_order_acquire);
+        if (t - h >= INGRESS_QUEUE_CAPACITY) return nullptr;
+        return &slots[t & (INGRESS_QUEUE_CAPACITY - 1)];
+    }
+
+    size_t free_slots() {
+        size_t t = tail.load(std::memory_order_relaxed);
+        size_t h = head.load(std::memory_order_acquire);
+        return INGRESS_QUEUE_CAPACITY - (t - h);
+    }
+
+    IngressSlot* slot_at(size_t offset) {
+        size_t t = tail.load(std::memory_order_relaxed);
+        return &slots[(t + offset) & (INGRESS_QUEUE_CAPACITY - 1)];
+    }
+};
+
+// One socket on the listener's port, its thread and its own ingress ring
+struct ListenerShard {
+    socket_t fd = -1;
+    std::thread thread;
+    Reactor reactor;
+    IngressRing ring;
+};
+
+struct wn_listener {
+    wn_message_callback on_message_received = nullptr;
+    void (*on_ingress_ready)() = nullptr;
+    std::atomic<bool> running{false};
+    // Shared by all shards: one notification per drain, however many rings filled
+    std::atomic<bool> notify_pending{false};
+    std::mutex callback_mutex;
+    int port = 0;
+    size_t poll_cursor = 0; // shard the next poll starts from, for fairness
+    std::vector<std::unique_ptr<ListenerShard>> shards;
+};
+
+static void ingress_commit(wn_listener* listener, IngressRing& ring, size_t count = 1) {
+    ring.tail.fetch_add(count, std::memory_order_release);
+    // Only the first datagram after a drain pokes the host; everything queued
+    // until the next poll, on any shard, rides along in the same batch.
+    if (!listener->notify_pending.exchange(true) && listener->on_ingress_ready) {
+        listener->on_ingress_ready();
+    }
+}
+
+#ifdef WN_HAVE_MMSG
+// Reads as many pending datagrams as there are free ring slots with a single
+// recvmmsg(). Returns the number queued, 0 when the ring is full (the caller
+// then falls back to its drop path) or -1 on error.
+static int receive_batch(wn_listener* listener, ListenerShard* shard) {
+    IngressRing& ring = shard->ring;
+    size_t free_slots = ring.free_slots();
+    unsigned int vlen = (unsigned int)(free_slots < MMSG_BATCH ? free_slots : MMSG_BATCH);
+    if (vlen == 0) return 0;
+
+    struct mmsghdr msgs[MMSG_BATCH];
+    struct iovec iovecs[MMSG_BATCH];
+    struct sockaddr_in addrs[MMSG_BATCH];
+    memset(msgs, 0, sizeof(msgs[0]) * vlen);
+    for (unsigned int i = 0; i < vlen; ++i) {
+        iovecs[i].iov_base = ring.slot_at(i)->data;
+        iovecs[i].iov_len = BUFFER_SIZE;
+        msgs[i].msg_hdr.msg_iov = &iovecs[i];
+        msgs[i].msg_hdr.msg_iovlen = 1;
+        msgs[i].msg_hdr.msg_name = &addrs[i];
+        msgs[i].msg_hdr.msg_namelen = sizeof(addrs[i]);
+    }
+
+    int n = recvmmsg(shard->fd, msgs, vlen, MSG_DONTWAIT, nullptr);
+    if (n <= 0) return -1;
+
+    unsigned long long bytes = 0;
+    for (int i = 0; i < n; ++i) {
+        IngressSlot* slot = ring.slot_at(i);
+        inet_ntop(AF_INET, &addrs[i].sin_addr, slot->sender_ip, sizeof(slot->sender_ip));
+        slot->sender_port = ntohs(addrs[i].sin_port);
+        slot->length = (int)msgs[i].msg_len;
+        bytes += msgs[i].msg_len;
+    }
+    g_recv_datagrams.fetch_add((unsigned long long)n, std::memory_order_relaxed);
+    g_recv_bytes.fetch_add(bytes, std::memory_order_relaxed);
+    g_recv_syscalls.fetch_add(1, std::memory_order_relaxed);
+    ingress_commit(listener, ring, n);
+    return n;
+}
+#endif
+
+// Runs on the shard's reactor whenever its socket is readable
+static void read_shard(wn_listener* listener, ListenerShard* shard) {
+#ifdef WN_HAVE_MMSG
+    if (!listener->on_message_received) {
+        // Queued a batch, or nothing was pending after all
+        if (receive_batch(listener, shard) != 0) return;
+    }
+#endif
+
+    // In queued mode receive straight into the next ring slot; when the
+    // ring is full the datagram is read into scratch space and dropped.
+    char scratch[BUFFER_SIZE];
+    IngressSlot* slot = listener->on_message_received ? nullptr : shard->ring.reserve();
+    char* buffer = slot ? slot->data : scratch;
+
     struct sockaddr_in cliaddr;
 #ifdef _WIN32
     int len = sizeof(cliaddr);
 #else
     socklen_t len = sizeof(cliaddr);
 #endif
+    ssize_t n = recvfrom(shard->fd, buffer, BUFFER_SIZE, 0, (struct sockaddr *)&cliaddr, &len);
+    if (n > 0 && listener->running) {
+        g_recv_datagrams.fetch_add(1, std::memory_order_relaxed);
+        g_recv_bytes.fetch_add((unsigned long long)n, std::memory_order_relaxed);
+        g_recv_syscalls.fetch_add(1, std::memory_order_relaxed);
+        char sender_ip[INET_ADDRSTRLEN];
+        inet_ntop(AF_INET, &cliaddr.sin_addr, sender_ip, INET_ADDRSTRLEN);
+        int sender_port = ntohs(cliaddr.sin_port);
+
+        if (slot) {
+            memcpy(slot->sender_ip, sender_ip, sizeof(slot->sender_ip));
+            slot->sender_port = sender_port;
+            slot->length = (int)n;
+            ingress_commit(listener, shard->ring);
+        } else if (listener->on_message_received) {
+            std::lock_guard<std::mutex> lock(listener->callback_mutex);
+            listener->on_message_received(buffer, (int)n, sender_ip, sender_port);
+        } else {
+            g_ingress_dropped.fetch_add(1, std::memory_order_relaxed);
+        }
+    }
+#ifndef _WIN32
+    else if (n < 0 && errno != EINTR && errno != EAGAIN && errno != EWOULDBLOCK) {
+        perror("listen: recvfrom failed");
+        shard->reactor.stop();
+    }
+#endif
+}
 
-    while (g_running) {
-        fd_set readfds;
-        FD_ZERO(&readfds);
-        FD_SET(sockfd, &readfds);
-        struct timeval tv;
-        tv.tv_sec = 0;
-        tv.tv_usec = 200000; // 200ms
-
-        int ready = select((int)sockfd + 1, &readfds, nullptr, nullptr, &tv);
-        if (!g_running) break;          // check again right after waking up
-        if (ready <= 0) continue;       // timeout or interrupted signal, loop again
-
-        ssize_t n = recvfrom(sockfd, buffer, BUFFER_SIZE - 1, 0, (struct sockaddr *)&cliaddr, &len);
-        if (n > 0 && g_running) {
-            buffer[n] = '\0';
-            char sender_ip[INET_ADDRSTRLEN];
-            inet_ntop(AF_INET, &cliaddr.sin_addr, sender_ip, INET_ADDRSTRLEN);
-
-            std::lock_guard<std::mutex> lock(g_callback_mutex);
-            if (g_on_message_received) {
-                int sender_port = ntohs(cliaddr.sin_port);
-                g_on_message_received(buffer, sender_ip, sender_port);
+static bool fill_sockaddr(struct sockaddr_in* addr, const char* ip, int port) {
+    memset(addr, 0, sizeof(*addr));
+    addr->sin_family = AF_INET;
+    addr->sin_port = htons(port);
+    return inet_pton(AF_INET, ip, &addr->sin_addr) == 1;
+}
+
+// Long-lived sender sockets, one per destination class. Sockets are created
+// lazily on first use and then shared by every sending thread; the kernel
+// serialises concurrent sendto() calls on a datagram socket.
+enum SenderKind {
+    SENDER_UNICAST = 0,
+    SENDER_BROADCAST = 1,
+    SENDER_MULTICAST = 2,
+    SENDER_KIND_COUNT
+};
+
+#define MULTICAST_TTL 1 // keep multicast on the local segment
+#define INVALID_SOCKFD ((socket_t)-1)
+
+struct SenderSocket {
+    std::atomic<socket_t> fd{INVALID_SOCKFD};
+    std::atomic<unsigned long long> sent{0};
+    std::atomic<unsigned long long> errors{0};
+};
+
+static SenderSocket g_senders[SENDER_KIND_COUNT];
+static std::mutex g_sender_mutex;
+
+struct SenderPoolCleanup {
+    ~SenderPoolCleanup() {
+        for (auto& sender : g_senders) {
+            socket_t fd = sender.fd.exchange(INVALID_SOCKFD);
+            if (fd != INVALID_SOCKFD) CLOSESOCKET(fd);
+        }
+    }
+} g_sender_cleanup;
+
+// Directed broadcast addresses of the local interfaces (host order), set by
+// the backend whenever its interface table changes. Slots are individually
+// atomic: a send racing an update may classify one datagram against the old
+// table, which costs at most that datagram.
+#define MAX_DIRECTED_BROADCASTS 16
+static std::atomic<uint32_t> g_directed_broadcasts[MAX_DIRECTED_BROADCASTS];
+static std::atomic<int> g_directed_broadcast_count{0};
+
+static SenderKind classify_destination(const struct in_addr& addr) {
+    uint32_t host = ntohl(addr.s_addr);
+    if ((host >> 28) == 0xE) return SENDER_MULTICAST;            // 224.0.0.0/4
+    if ((host & 0xFF) == 0xFF) return SENDER_BROADCAST;          // limited or x.y.z.255
+    int count = g_directed_broadcast_count.load(std::memory_order_acquire);
+    for (int i = 0; i < count; ++i) {
+        if (g_directed_broadcasts[i].load(std::memory_order_relaxed) == host) return SENDER_BROADCAST;
+    }
+    return SENDER_UNICAST;
+}
+
+static socket_t acquire_sender(SenderKind kind) {
+    SenderSocket& sender = g_senders[kind];
+    socket_t fd = sender.fd.load(std::memory_order_acquire);
+    if (fd != INVALID_SOCKFD) return fd;
+
+    std::lock_guard<std::mutex> lock(g_sender_mutex);
+    fd = sender.fd.load(std::memory_order_relaxed);
+    if (fd != INVALID_SOCKFD) return fd;
+
+    initialize_networking();
+    if ((fd = socket(AF_INET, SOCK_DGRAM, 0)) == INVALID_SOCKFD) {
+        perror("sender: socket creation failed");
+        sender.errors.fetch_add(1, std::memory_order_relaxed);
+        return INVALID_SOCKFD;
+    }
+
+    int enable = 1;
+    if (kind == SENDER_BROADCAST &&
+        setsockopt(fd, SOL_SOCKET, SO_BROADCAST, SETSOCKOPT_CAST &enable, sizeof(enable)) < 0) {
+        perror("sender: setsockopt(SO_BROADCAST) failed");
+        sender.errors.fetch_add(1, std::memory_order_relaxed);
+        CLOSESOCKET(fd);
+        return INVALID_SOCKFD;
+    }
+    if (kind == SENDER_MULTICAST) {
+        unsigned char ttl = MULTICAST_TTL;
+        unsigned char loop = 1; // local instances on this host must hear each other
+        if (setsockopt(fd, IPPROTO_IP, IP_MULTICAST_TTL, SETSOCKOPT_CAST &ttl, sizeof(ttl)) < 0) {
+            perror("sender: setsockopt(IP_MULTICAST_TTL) failed");
+        }
+        setsockopt(fd, IPPROTO_IP, IP_MULTICAST_LOOP, SETSOCKOPT_CAST &loop, sizeof(loop));
+    }
+
+    sender.fd.store(fd, std::memory_order_release);
+    return fd;
+}
+
+static bool send_to(const char* message, int length, const struct sockaddr_in& servaddr) {
+    SenderKind kind = classify_destination(servaddr.sin_addr);
+    SenderSocket& sender = g_senders[kind];
+    socket_t sockfd = acquire_sender(kind);
+    if (sockfd == INVALID_SOCKFD) return false;
+
+    ssize_t bytes_sent = sendto(sockfd, message, length, 0,
+                                (const struct sockaddr *)&servaddr, sizeof(servaddr));
+    if (bytes_sent < 0) {
+        perror("send_udp: sendto failed");
+        sender.errors.fetch_add(1, std::memory_order_relaxed);
+        return false;
+    }
+    sender.sent.fetch_add(1, std::memory_order_relaxed);
+    return true;
+}
+
+bool send_udp_message_internal(const char* data, int length, const char* recipient_ip, int port) {
+    struct sockaddr_in servaddr;
+    if (!fill_sockaddr(&servaddr, recipient_ip, port)) {
+        std::cerr << "send_udp: invalid recipient IP: " << recipient_ip << std::endl;
+        return false;
+    }
+    return send_to(data, length, servaddr);
+}
+
+static int send_batch_internal(const char* const* messages, const int* lengths,
+                               const char* const* recipient_ips, const int* ports, int count) {
+    int sent = 0;
+#ifdef WN_HAVE_MMSG
+    // Destinations are grouped per sender socket; each group is flushed with
+    // one sendmmsg() whenever it fills up and once more at the end.
+    struct mmsghdr group_msgs[SENDER_KIND_COUNT][MMSG_BATCH];
+    struct iovec group_iovecs[SENDER_KIND_COUNT][MMSG_BATCH];
+    struct sockaddr_in group_addrs[SENDER_KIND_COUNT][MMSG_BATCH];
+    unsigned int vlens[SENDER_KIND_COUNT] = {0};
+
+    auto flush = [&](int kind) {
+        SenderSocket& sender = g_senders[kind];
+        socket_t sockfd = acquire_sender((SenderKind)kind);
+        unsigned int vlen = vlens[kind];
+        vlens[kind] = 0;
+        if (sockfd == INVALID_SOCKFD) return;
+
+        // sendmmsg() stops at the first failing datagram; count it and
+        // resume with the rest of the group.
+        unsigned int offset = 0;
+        while (offset < vlen) {
+            int n = sendmmsg(sockfd, group_msgs[kind] + offset, vlen - offset, 0);
+            if (n < 0) {
+                perror("send_batch: sendmmsg failed");
+                sender.errors.fetch_add(1, std::memory_order_relaxed);
+                ++offset;
+                continue;
             }
-        } else if (n < 0 || !g_running) {
-            break;
+            sender.sent.fetch_add((unsigned long long)n, std::memory_order_relaxed);
+            sent += n;
+            offset += (unsigned int)n;
+        }
+    };
+
+    for (int i = 0; i < count; ++i) {
+        struct sockaddr_in addr;
+        if (!fill_sockaddr(&addr, recipient_ips[i], ports[i])) {
+            std::cerr << "send_batch: invalid recipient IP: " << recipient_ips[i] << std::endl;
+            continue;
+        }
+        int kind = classify_destination(addr.sin_addr);
+        unsigned int slot = vlens[kind]++;
+        group_addrs[kind][slot] = addr;
+        group_iovecs[kind][slot].iov_base = (void*)messages[i];
+        group_iovecs[kind][slot].iov_len = (lengths && lengths[i] >= 0) ? (size_t)lengths[i] : strlen(messages[i]);
+        struct mmsghdr& msg = group_msgs[kind][slot];
+        memset(&msg, 0, sizeof(msg));
+        msg.msg_hdr.msg_iov = &group_iovecs[kind][slot];
+        msg.msg_hdr.msg_iovlen = 1;
+        msg.msg_hdr.msg_name = &group_addrs[kind][slot];
+        msg.msg_hdr.msg_namelen = sizeof(group_addrs[kind][slot]);
+        if (vlens[kind] == MMSG_BATCH) flush(kind);
+    }
+    for (int kind = 0; kind < SENDER_KIND_COUNT; ++kind) {
+        if (vlens[kind] > 0) flush(kind);
+    }
+#else
+    for (int i = 0; i < count; ++i) {
+        struct sockaddr_in servaddr;
+        if (!fill_sockaddr(&servaddr, recipient_ips[i], ports[i])) {
+            std::cerr << "send_batch: invalid recipient IP: " << recipient_ips[i] << std::endl;
+            continue;
         }
+        int length = (lengths && lengths[i] >= 0) ? lengths[i] : (int)strlen(messages[i]);
+        if (send_to(messages[i], length, servaddr)) ++sent;
     }
+#endif
+    return sent;
 }
 
-void send_udp_message_internal(const char* message, const char* recipient_ip, int port, bool is_broadcast) {
+#ifdef WN_HAVE_SHARDING
+// Broadcast and multicast datagrams reach every socket of a SO_REUSEPORT
+// group, not just one, so secondary shards accept only packets addressed to
+// this host (PACKET_HOST) and leave the rest to shard 0. Looped-back copies
+// of our own broadcasts arrive as PACKET_LOOPBACK and are filtered the same way.
+static bool attach_unicast_filter(socket_t fd) {
+    struct sock_filter code[] = {
+        BPF_STMT(BPF_LD | BPF_W | BPF_ABS, (uint32_t)(SKF_AD_OFF + SKF_AD_PKTTYPE)),
+        BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, PACKET_HOST, 0, 1),
+        BPF_STMT(BPF_RET | BPF_K, 0xFFFFFFFF),
+        BPF_STMT(BPF_RET | BPF_K, 0),
+    };
+    struct sock_fprog program = { (unsigned short)(sizeof(code) / sizeof(code[0])), code };
+    return setsockopt(fd, SOL_SOCKET, SO_ATTACH_FILTER, &program, sizeof(program)) == 0;
+}
+#endif
+
+static socket_t open_shard_socket(int port, bool reuseport, int* bound_port) {
     socket_t sockfd;
     if ((sockfd = socket(AF_INET, SOCK_DGRAM, 0)) < 0) {
-        perror("send_udp: socket creation failed");
-        return;
+        perror("listen: socket creation failed");
+        return -1;
     }
-
-    if (is_broadcast) {
-        int broadcast_enable = 1;
-        if (setsockopt(sockfd, SOL_SOCKET, SO_BROADCAST,
-                       SETSOCKOPT_CAST &broadcast_enable, sizeof(broadcast_enable)) < 0) {
-            perror("send_udp: setsockopt(SO_BROADCAST) failed");
-            CLOSESOCKET(sockfd);
-            return;
-        }
+#ifdef WN_HAVE_SHARDING
+    int enable = 1;
+    if (reuseport && setsockopt(sockfd, SOL_SOCKET, SO_REUSEPORT, &enable, sizeof(enable)) < 0) {
+        perror("listen: setsockopt(SO_REUSEPORT) failed");
+        CLOSESOCKET(sockfd);
+        return -1;
     }
+#else
+    (void)reuseport;
+#endif
 
     struct sockaddr_in servaddr;
     memset(&servaddr, 0, sizeof(servaddr));
     servaddr.sin_family = AF_INET;
+    servaddr.sin_addr.s_addr = INADDR_ANY;
     servaddr.sin_port = htons(port);
-    if (inet_pton(AF_INET, recipient_ip, &servaddr.sin_addr) != 1) {
-        std::cerr << "send_udp: invalid recipient IP: " << recipient_ip << std::endl;
+    if (bind(sockfd, (struct sockaddr *)&servaddr, sizeof(servaddr)) < 0) {
         CLOSESOCKET(sockfd);
-        return;
+        return -1;
     }
 
-    ssize_t bytes_sent = sendto(sockfd, message, (int)strlen(message), 0,
-                                (const struct sockaddr *)&servaddr, sizeof(servaddr));
-    if (bytes_sent < 0) {
-        perror("send_udp: sendto failed");
+    struct sockaddr_in bound_addr;
+#ifdef _WIN32
+    int addr_len = sizeof(bound_addr);
+#else
+    socklen_t addr_len = sizeof(bound_addr);
+#endif
+    *bound_port = port;
+    if (getsockname(sockfd, (struct sockaddr *)&bound_addr, &addr_len) == 0) {
+        *bound_port = ntohs(bound_addr.sin_port);
     }
+    return sockfd;
+}
 
-    CLOSESOCKET(sockfd);
+// Whether ``port`` is free for a new SO_REUSEPORT group. Binding with
+// SO_REUSEPORT alone would silently join another instance's group on the
+// same port and split its traffic with it; a plain bind fails instead.
+static bool port_is_free(int port) {
+    if (port == 0) return true;
+    int ignored;
+    socket_t probe = open_shard_socket(port, false, &ignored);
+    if (probe == (socket_t)-1) return false;
+    CLOSESOCKET(probe);
+    return true;
 }
 
-extern "C" {
-    int start_udp_listener(int port, void (*on_message_received)(const char* message, const char* sender_ip, int sender_port)) {
-        if (g_running) {
-            std::cerr << "listen: a listener is already running; call stop_udp_listener() first" << std::endl;
-            return -1;
-        }
+static void close_listener(wn_listener* listener) {
+    listener->running = false;
+    for (auto& shard : listener->shards) shard->reactor.stop();
+    for (auto& shard : listener->shards) {
+        if (shard->thread.joinable()) shard->thread.join();
+    }
+    for (auto& shard : listener->shards) {
+        if (shard->fd != (socket_t)-1) CLOSESOCKET(shard->fd);
+    }
+    delete listener;
+}
 
-        initialize_networking();
-        {
-            std::lock_guard<std::mutex> lock(g_callback_mutex);
-            g_on_message_received = on_message_received;
-        }
+static wn_listener* open_listener(int port, int shards, wn_message_callback on_message_received,
+                                  void (*on_ingress_ready)()) {
+    initialize_networking();
+#ifdef WN_HAVE_SHARDING
+    if (shards < 1) shards = 1;
+    if (shards > MAX_LISTENER_SHARDS) shards = MAX_LISTENER_SHARDS;
+#else
+    if (shards > 1) std::cerr << "listen: sharding needs Linux SO_REUSEPORT; using one socket" << std::endl;
+    shards = 1;
+#endif
+    bool reuseport = shards > 1;
+
+    std::unique_ptr<wn_listener> listener(new wn_listener());
+    listener->on_message_received = on_message_received;
+    listener->on_ingress_ready = on_ingress_ready;
 
-        socket_t sockfd;
-        if ((sockfd = socket(AF_INET, SOCK_DGRAM, 0)) < 0) {
-            perror("listen: socket creation failed");
-            return -1;
+    // The requested port if it is free, otherwise an ephemeral one
+    int bound_port = -1;
+    socket_t first = -1;
+    if (!reuseport || port_is_free(port)) {
+        first = open_shard_socket(port, reuseport, &bound_port);
+    }
+    if (first == (socket_t)-1) {
+        first = open_shard_socket(0, reuseport, &bound_port);
+        if (first == (socket_t)-1) {
+            perror("listen: fallback bind failed");
+            return nullptr;
+        }
+    }
+    listener->port = bound_port;
+    listener->shards.emplace_back(new ListenerShard());
+    listener->shards[0]->fd = first;
+
+    for (int i = 1; i < shards; ++i) {
+        int ignored;
+        socket_t fd = open_shard_socket(bound_port, true, &ignored);
+#ifdef WN_HAVE_SHARDING
+        if (fd != (socket_t)-1 && !attach_unicast_filter(fd)) {
+            perror("listen: attaching the shard filter failed");
+            CLOSESOCKET(fd);
+            fd = -1;
         }
+#endif
+        if (fd == (socket_t)-1) {
+            std::cerr << "listen: only " << i << " of " << shards << " shards could bind" << std::endl;
+            break;
+        }
+        listener->shards.emplace_back(new ListenerShard());
+        listener->shards.back()->fd = fd;
+    }
 
-        // Apply reuse rules so multiple local instances can grab the broadcast
-//         int reuse = 1;
-//         setsockopt(sockfd, SOL_SOCKET, SO_REUSEADDR, SETSOCKOPT_CAST &reuse, sizeof(reuse));
-// #ifdef SO_REUSEPORT
-//         setsockopt(sockfd, SOL_SOCKET, SO_REUSEPORT, SETSOCKOPT_CAST &reuse, sizeof(reuse));
-// #endif
+    if (on_ingress_ready) {
+        for (auto& shard : listener->shards) shard->ring.allocate();
+    }
+    for (auto& shard : listener->shards) {
+        wn_listener* owner = listener.get();
+        ListenerShard* target = shard.get();
+        if (!shard->reactor.open() || !shard->reactor.add(shard->fd, [owner, target] { read_shard(owner, target); })) {
+            for (auto& opened : listener->shards) CLOSESOCKET(opened->fd);
+            return nullptr;
+        }
+    }
+    listener->running = true;
+    for (auto& shard : listener->shards) {
+        Reactor* reactor = &shard->reactor;
+        shard->thread = std::thread([reactor] { reactor->run(); });
+    }
+    return listener.release();
+}
 
-        struct sockaddr_in servaddr;
-        memset(&servaddr, 0, sizeof(servaddr));
-        servaddr.sin_family = AF_INET;
-        servaddr.sin_addr.s_addr = INADDR_ANY;
-        servaddr.sin_port = htons(port);
-
-        if (bind(sockfd, (struct sockaddr *)&servaddr, sizeof(servaddr)) < 0) {
-            servaddr.sin_port = htons(0);
-            if (bind(sockfd, (struct sockaddr *)&servaddr, sizeof(servaddr)) < 0) {
-                perror("listen: fallback bind failed");
-                CLOSESOCKET(sockfd);
-                return -1;
+static int poll_listener(wn_listener* listener, wn_datagram* out, int max_count, char* arena, int arena_len) {
+    if (!listener || !out || max_count <= 0 || !arena || arena_len <= 0) return 0;
+
+    // Clear before draining: anything committed after this point either
+    // shows up below or triggers a fresh notification.
+    listener->notify_pending.store(false);
+
+    int count = 0;
+    int used = 0;
+    size_t shard_count = listener->shards.size();
+    size_t start = listener->poll_cursor;
+    for (size_t k = 0; k < shard_count && count < max_count; ++k) {
+        IngressRing& ring = listener->shards[(start + k) % shard_count]->ring;
+        size_t head = ring.head.load(std::memory_order_relaxed);
+        size_t tail = ring.tail.load(std::memory_order_acquire);
+        bool arena_full = false;
+        while (head != tail && count < max_count) {
+            const IngressSlot& slot = ring.slots[head & (INGRESS_QUEUE_CAPACITY - 1)];
+            if (slot.length > arena_len - used) { // picked up by the next poll
+                arena_full = true;
+                break;
             }
-        }
 
-        struct sockaddr_in bound_addr;
-#ifdef _WIN32
-        int addr_len = sizeof(bound_addr);
-#else
-        socklen_t addr_len = sizeof(bound_addr);
-#endif
-        int bound_port = port;
-        if (getsockname(sockfd, (struct sockaddr *)&bound_addr, &addr_len) == 0) {
-            bound_port = ntohs(bound_addr.sin_port);
+            wn_datagram& record = out[count];
+            memcpy(record.sender_ip, slot.sender_ip, sizeof(record.sender_ip));
+            record.sender_port = slot.sender_port;
+            record.length = slot.length;
+            record.offset = used;
+            memcpy(arena + used, slot.data, (size_t)slot.length);
+            used += slot.length;
+            ++head;
+            ++count;
         }
+        ring.head.store(head, std::memory_order_release);
+        if (arena_full) break;
+    }
+    listener->poll_cursor = (start + 1) % shard_count;
+    return count;
+}
 
-        g_sockfd = sockfd;
-        g_running = true;
-        g_listen_thread = std::thread(listen_thread_func, sockfd);
-        return bound_port;
+static int set_membership(wn_listener* listener, const char* multicast_ip, int option) {
+    if (!listener) return 0;
+    struct ip_mreq mreq;
+    if (inet_pton(AF_INET, multicast_ip, &mreq.imr_multiaddr.s_addr) != 1) {
+        return 0; // Invalid IP
+    }
+    mreq.imr_interface.s_addr = htonl(INADDR_ANY);
+    // Shard 0 alone holds memberships; the other shards filter multicast out
+    if (setsockopt(listener->shards[0]->fd, IPPROTO_IP, option, SETSOCKOPT_CAST &mreq, sizeof(mreq)) < 0) {
+        perror(option == IP_ADD_MEMBERSHIP ? "join_multicast: setsockopt failed" : "leave_multicast: setsockopt failed");
+        return 0;
     }
+    return 1;
+}
 
-    void stop_udp_listener() {
-        if (!g_running) return;
-        g_running = false;
+// The listener behind the start_udp_listener*/poll_messages/stop_udp_listener
+// calls, for hosts that run one listener per process.
+static wn_listener* g_default_listener = nullptr;
+static std::mutex g_default_listener_mutex;
 
-        if (g_listen_thread.joinable()) {
-            g_listen_thread.join();
+struct ListenerCleanup {
+    ~ListenerCleanup() {
+        std::lock_guard<std::mutex> lock(g_default_listener_mutex);
+        if (g_default_listener) {
+            close_listener(g_default_listener);
+            g_default_listener = nullptr;
         }
+    }
+} g_cleanup;
+
+static int start_default_listener(int port, int shards, wn_message_callback on_message_received,
+                                  void (*on_ingress_ready)()) {
+    std::lock_guard<std::mutex> lock(g_default_listener_mutex);
+    if (g_default_listener) {
+        std::cerr << "listen: a listener is already running; call stop_udp_listener() first" << std::endl;
+        return -1;
+    }
+    g_default_listener = open_listener(port, shards, on_message_received, on_ingress_ready);
+    return g_default_listener ? g_default_listener->port : -1;
+}
+
+extern "C" {
+    wn_listener* wn_listener_open(int port, int shards, wn_message_callback on_message_received,
+                                  void (*on_ingress_ready)(), int* bound_port) {
+        wn_listener* listener = open_listener(port, shards, on_message_received, on_ingress_ready);
+        if (bound_port) *bound_port = listener ? listener->port : -1;
+        return listener;
+    }
+
+    int wn_listener_shards(wn_listener* listener) {
+        return listener ? (int)listener->shards.size() : 0;
+    }
+
+    int wn_listener_poll(wn_listener* listener, wn_datagram* out, int max_count, char* arena, int arena_len) {
+        return poll_listener(listener, out, max_count, arena, arena_len);
+    }
+
+    int wn_listener_join_multicast(wn_listener* listener, const char* multicast_ip) {
+        return set_membership(listener, multicast_ip, IP_ADD_MEMBERSHIP);
+    }
+
+    int wn_listener_leave_multicast(wn_listener* listener, const char* multicast_ip) {
+        return set_membership(listener, multicast_ip, IP_DROP_MEMBERSHIP);
+    }
+
+    void wn_listener_close(wn_listener* listener) {
+        if (listener) close_listener(listener);
+    }
+
+    int start_udp_listener(int port, wn_message_callback on_message_received) {
+        return start_default_listener(port, 1, on_message_received, nullptr);
+    }
+
+    int start_udp_listener_queued(int port, void (*on_ingress_ready)()) {
+        return start_default_listener(port, 1, nullptr, on_ingress_ready);
+    }
 
-        if (g_sockfd != -1) {
-            CLOSESOCKET(g_sockfd);
-            g_sockfd = -1;
+    int start_udp_listener_queued_sharded(int port, int shards, void (*on_ingress_ready)()) {
+        return start_default_listener(port, shards, nullptr, on_ingress_ready);
+    }
+
+    int poll_messages(wn_datagram* out, int max_count, char* arena, int arena_len) {
+        // Only the host's ingress thread polls, and never concurrently with stop
+        return poll_listener(g_default_listener, out, max_count, arena, arena_len);
+    }
+
+    unsigned long long get_ingress_dropped() {
+        return g_ingress_dropped.load(std::memory_order_relaxed);
+    }
+
+    int get_recv_stats(unsigned long long* out, int max_len) {
+        // Layout: {datagrams, bytes, syscalls, dropped}
+        const unsigned long long values[] = {
+            g_recv_datagrams.load(std::memory_order_relaxed),
+            g_recv_bytes.load(std::memory_order_relaxed),
+            g_recv_syscalls.load(std::memory_order_relaxed),
+            g_ingress_dropped.load(std::memory_order_relaxed),
+        };
+        int written = 0;
+        for (; written < (int)(sizeof(values) / sizeof(values[0])) && written < max_len; ++written) {
+            out[written] = values[written];
         }
+        return written;
+    }
+
+    void stop_udp_listener() {
+        std::lock_guard<std::mutex> lock(g_default_listener_mutex);
+        if (!g_default_listener) return;
+        close_listener(g_default_listener);
+        g_default_listener = nullptr;
     }
 
     void send_udp_message(const char* message, const char* recipient_ip, int port) {
         initialize_networking();
-        std::string ip_str(recipient_ip);
-        bool is_broadcast = ip_str.length() > 4 && ip_str.substr(ip_str.length() - 4) == ".255";
-        send_udp_message_internal(message, recipient_ip, port, is_broadcast);
+        send_udp_message_internal(message, (int)strlen(message), recipient_ip, port);
+    }
+
+    int send_udp_datagram(const char* data, int length, const char* recipient_ip, int port) {
+        if (!data || length < 0 || length > WN_DATAGRAM_MAX) return 0;
+        initialize_networking();
+        return send_udp_message_internal(data, length, recipient_ip, port) ? 1 : 0;
+    }
+
+    int send_udp_batch(const char* const* messages, const int* lengths,
+                       const char* const* recipient_ips, const int* ports, int count) {
+        if (!messages || !recipient_ips || !ports || count <= 0) return 0;
+        initialize_networking();
+        return send_batch_internal(messages, lengths, recipient_ips, ports, count);
     }
 
     void send_broadcast_message(const char* message, int port) {
         initialize_networking();
-        send_udp_message_internal(message, "255.255.255.255", port, true);
+        send_udp_message_internal(message, (int)strlen(message), "255.255.255.255", port);
     }
 
-    int join_multicast_group(const char* multicast_ip) {
-        if (g_sockfd == -1) {
-            std::cerr << "Cannot join multicast: listener not started." << std::endl;
-            return 0;
+    int get_send_stats(unsigned long long* out, int max_len) {
+        // Layout: {sent, errors} for unicast, broadcast, multicast in order
+        int written = 0;
+        for (int kind = 0; kind < SENDER_KIND_COUNT && written + 2 <= max_len; ++kind) {
+            out[written++] = g_senders[kind].sent.load(std::memory_order_relaxed);
+            out[written++] = g_senders[kind].errors.load(std::memory_order_relaxed);
         }
+        return written;
+    }
 
-        struct ip_mreq mreq;
-        if (inet_pton(AF_INET, multicast_ip, &mreq.imr_multiaddr.s_addr) != 1) {
-            return 0; // Invalid IP
+    int set_broadcast_addresses(const char* const* ips, int count) {
+        int stored = 0;
+        for (int i = 0; i < count && stored < MAX_DIRECTED_BROADCASTS; ++i) {
+            struct in_addr addr;
+            if (inet_pton(AF_INET, ips[i], &addr) != 1) continue;
+            g_directed_broadcasts[stored++].store(ntohl(addr.s_addr), std::memory_order_relaxed);
         }
-        mreq.imr_interface.s_addr = htonl(INADDR_ANY);
+        g_directed_broadcast_count.store(stored, std::memory_order_release);
+        return stored;
+    }
 
-        if (setsockopt(g_sockfd, IPPROTO_IP, IP_ADD_MEMBERSHIP, SETSOCKOPT_CAST &mreq, sizeof(mreq)) < 0) {
-            perror("join_multicast: setsockopt failed");
+    int join_multicast_group(const char* multicast_ip) {
+        if (!g_default_listener) {
+            std::cerr << "Cannot join multicast: listener not started." << std::endl;
             return 0;
         }
-        return 1;
+        return set_membership(g_default_listener, multicast_ip, IP_ADD_MEMBERSHIP);
+    }
+
+    int leave_multicast_group(const char* multicast_ip) {
+        return set_membership(g_default_listener, multicast_ip, IP_DROP_MEMBERSHIP);
     }
 
     int get_local_ip(char* out_buffer, int max_len) {
@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 import shutil
@@ -15,6 +16,13 @@ def get_hash(file_path):
     return hasher.hexdigest()
 
 def main():
+    parser = argparse.ArgumentParser(description="Build the standalone WhisperNet release.")
+    parser.add_argument(
+        "--onedir", action="store_true",
+        help="build a folder instead of a single file; it starts faster because nothing is unpacked on launch",
+    )
+    args = parser.parse_args()
+
     root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     os.chdir(root_dir)
 
@@ -118,7 +126,9 @@ def main():
     # Bundle both the static folder and the C++ binary folder
     pyinstaller_cmd = [
         venv_pyinstaller,
-        "--onefile",
+        # --onefile unpacks the whole bundle to a temp dir on every launch;
+        # --onedir ships it unpacked
+        "--onedir" if args.onedir else "--onefile",
         "--clean",
         "--name", "whispernet",
         "--add-data", f"backend/static{path_sep}static",
@@ -139,15 +149,23 @@ def main():
 
     subprocess.run(pyinstaller_cmd, check=True)
 
-    # 5. Stage the final binary in the root directory
+    # 5. Stage the final binary (or folder) in the root directory
     print("=== Packaging complete ===")
     ext = ".exe" if is_windows else ""
-    src_bin = os.path.join("dist", f"whispernet{ext}")
-    dest_bin = os.path.join(root_dir, f"whispernet{ext}")
-    
-    if os.path.exists(dest_bin):
-        os.remove(dest_bin)
-    shutil.copy2(src_bin, dest_bin)
+    if args.onedir:
+        src_dir = os.path.join("dist", "whispernet")
+        dest_dir = os.path.join(root_dir, "whispernet-onedir")
+        if os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        shutil.copytree(src_dir, dest_dir)
+        dest_bin = os.path.join(dest_dir, f"whispernet{ext}")
+    else:
+        src_bin = os.path.join("dist", f"whispernet{ext}")
+        dest_bin = os.path.join(root_dir, f"whispernet{ext}")
+
+        if os.path.exists(dest_bin):
+            os.remove(dest_bin)
+        shutil.copy2(src_bin, dest_bin)
     
     # Clean up temporary PyInstaller folders
     print("Cleaning up build workspace...")
@@ -162,7 +180,9 @@ def main():
             pass
 
     print(f"\nSUCCESS! Created standalone executable at: {dest_bin}")
-    if is_windows:
+    if args.onedir:
+        print("Ship the whole 'whispernet-onedir' folder; the executable must stay next to its '_internal' folder.")
+    elif is_windows:
         print("You can now double-click 'whispernet.exe' to launch the app!")
     else:
         print("You can run './whispernet' to launch the app!")
@@ -0,0 +1,26 @@
+"""
+Shared helpers for tests that drive asyncio code without sockets.
+"""
+import asyncio
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class LossyLink:
+    """An in-memory network between two endpoints.
+
+    ``send(item, deliver, *args)`` records ``item`` and hands it to
+    ``deliver(*args, item)`` on the next loop iteration, unless
+    ``drop(item)`` says it is lost on the way.
+    """
+
+    def __init__(self, drop=lambda item: False):
+        self.drop = drop
+        self.sent = []
+
+    def send(self, item, deliver, *args):
+        self.sent.append(item)
+        if not self.drop(item):
+            asyncio.get_running_loop().call_soon(deliver, *args, item)
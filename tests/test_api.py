@@ -15,7 +15,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 # Mock the C++ bindings BEFORE importing anything that uses them
 # This prevents the test from trying to load the actual .so/.dll/.dylib file
 mock_core_lib = MagicMock()
-mock_core_lib.send_udp_message = MagicMock()
+mock_core_lib.send_udp_datagram = MagicMock()
 mock_core_lib.start_udp_listener = MagicMock()
 
 bindings_mock = MagicMock(
@@ -37,6 +37,12 @@ if 'backend.bindings' in sys.modules:
 client = TestClient(app)
 
 
+def _drain_io():
+    """Waits for sends already queued on the (single-thread) I/O executor."""
+    from backend import io_pool
+    io_pool.executor().submit(lambda: None).result()
+
+
 def test_get_peers_returns_ok_and_list():
     """
     Test that GET /api/peers returns a 200 status code
@@ -53,7 +59,7 @@ def test_send_message_calls_core_lib():
     with the appropriate parameters.
     """
     # Reset the mock call count
-    mock_core_lib.send_udp_message.reset_mock()
+    mock_core_lib.send_udp_datagram.reset_mock()
     
     payload = {"recipient_ip": "192.168.1.100", "content": "test message"}
     
@@ -63,17 +69,19 @@ def test_send_message_calls_core_lib():
     assert response.json() == {"status": "message sent"}
 
     # Verify the C++ library function was called exactly once
-    mock_core_lib.send_udp_message.assert_called_once()
+    mock_core_lib.send_udp_datagram.assert_called_once()
     
     # Verify it was called with the correct arguments
-    call_args = mock_core_lib.send_udp_message.call_args[0]
+    call_args = mock_core_lib.send_udp_datagram.call_args[0]
     # First arg should be the message as bytes
     assert b'"type": "MESSAGE"' in call_args[0]
     assert b'"content": "test message"' in call_args[0]
-    # Second arg should be recipient IP as bytes
-    assert call_args[1] == b'192.168.1.100'
-    # Third arg should be the UDP port
-    assert call_args[2] == 8888
+    # Second arg should be the payload length
+    assert call_args[1] == len(call_args[0])
+    # Third arg should be recipient IP as bytes
+    assert call_args[2] == b'192.168.1.100'
+    # Fourth arg should be the UDP port
+    assert call_args[3] == 8888
 
 
 def test_send_message_with_missing_recipient():
@@ -81,7 +89,7 @@ def test_send_message_with_missing_recipient():
     Test that POST /api/send returns an error when recipient_ip is missing.
     """
     # Reset the mock call count
-    mock_core_lib.send_udp_message.reset_mock()
+    mock_core_lib.send_udp_datagram.reset_mock()
     
     payload = {"content": "test message"}
     
@@ -92,7 +100,7 @@ def test_send_message_with_missing_recipient():
     assert "recipient_ip" in response.json()["detail"]
     
     # Should not call C++ library if validation fails
-    mock_core_lib.send_udp_message.assert_not_called()
+    mock_core_lib.send_udp_datagram.assert_not_called()
 
 
 def test_send_message_with_missing_content():
@@ -100,7 +108,7 @@ def test_send_message_with_missing_content():
     Test that POST /api/send returns an error when content is missing.
     """
     # Reset the mock call count
-    mock_core_lib.send_udp_message.reset_mock()
+    mock_core_lib.send_udp_datagram.reset_mock()
     
     payload = {"recipient_ip": "192.168.1.100"}
     
@@ -111,7 +119,7 @@ def test_send_message_with_missing_content():
     assert "content" in response.json()["detail"]
     
     # Should not call C++ library if validation fails
-    mock_core_lib.send_udp_message.assert_not_called()
+    mock_core_lib.send_udp_datagram.assert_not_called()
 
 
 def test_health_check_endpoint():
@@ -123,3 +131,212 @@ def test_health_check_endpoint():
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
     assert response.headers["content-type"].startswith("application/json")
+
+
+def test_websocket_handshake_sends_versioned_snapshot():
+    """
+    Test that /api/ws opens with a PEER_SNAPSHOT carrying a version and
+    answers PEER_RESYNC with a fresh one.
+    """
+    with client.websocket_connect("/api/ws") as websocket:
+        snapshot = websocket.receive_json()
+        assert snapshot["type"] == "PEER_SNAPSHOT"
+        assert isinstance(snapshot["version"], int)
+        assert isinstance(snapshot["payload"], list)
+
+        websocket.send_json({"type": "PEER_RESYNC"})
+        again = websocket.receive_json()
+        assert again["type"] == "PEER_SNAPSHOT"
+        assert again["version"] == snapshot["version"]
+
+
+def test_discovery_replies_once_per_requester_session():
+    """
+    Test that repeated DISCOVERY_REQUESTs from one session get a single
+    reply, a restarted peer (new sid) is answered again, and requests
+    without a sid (older peers) are always answered.
+    """
+    import asyncio
+    import json
+    from backend import api
+
+    def request(sid=None):
+        frame = {"type": "DISCOVERY_REQUEST", "nickname": "carol", "version": 1, "port": 9555}
+        if sid is not None:
+            frame["sid"] = sid
+        api.handle_incoming_message(json.dumps(frame).encode(), b"10.9.8.7", 9555)
+
+    async def scenario():
+        mock_core_lib.send_udp_datagram.reset_mock()
+        request(sid=41)
+        request(sid=41)
+        request(sid=41)
+        _drain_io()
+        replies_same_session = mock_core_lib.send_udp_datagram.call_count
+        request(sid=42)
+        request()
+        request()
+        api.discovered_peers.remove("10.9.8.7:9555")
+        _drain_io()
+        return replies_same_session, mock_core_lib.send_udp_datagram.call_count
+
+    replies_same_session, replies_total = asyncio.run(scenario())
+
+    assert replies_same_session == 1
+    assert replies_total == 4
+
+
+def test_bulk_send_batches_all_recipients_into_one_call():
+    """
+    Test that /api/send/bulk de-duplicates recipients, sends every datagram
+    in a single batched core call and reports a result per peer.
+    """
+    bindings_mock.send_batch.reset_mock()
+    response = client.post("/api/send/bulk", json={
+        "recipients": ["10.0.0.5:9000", "10.0.0.6", "10.0.0.5:9000"],
+        "content": "hello all",
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ok"
+    assert body["results"] == {
+        "10.0.0.5:9000": {"status": "message sent"},
+        "10.0.0.6:8888": {"status": "message sent"},
+    }
+    bindings_mock.send_batch.assert_called_once()
+    datagrams = bindings_mock.send_batch.call_args[0][0]
+    assert [(ip, port) for _, ip, port in datagrams] == [(b"10.0.0.5", 9000), (b"10.0.0.6", 8888)]
+
+
+def test_bulk_send_requires_recipients():
+    """
+    Test that /api/send/bulk rejects a request without a recipient list.
+    """
+    response = client.post("/api/send/bulk", json={"recipients": "10.0.0.5", "content": "hi"})
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "error"
+
+
+def test_metrics_endpoint_serves_text_exposition():
+    """
+    Test that GET /api/metrics returns the Prometheus text format and
+    counts a handled discovery frame and an undecodable datagram.
+    """
+    from backend import api
+
+    api.handle_incoming_message(b'{"type": "HEARTBEAT", "version": 1, "port": 9100}', b"10.0.0.9", 9100)
+    api.handle_incoming_message(b'{not json', b"10.0.0.9", 9100)
+
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE whispernet_frames_received_total counter" in lines
+    assert any(line.startswith('whispernet_frames_received_total{type="HEARTBEAT"}') for line in lines)
+    assert any(line.startswith('whispernet_decode_errors_total{encoding="json"}') for line in lines)
+    assert any(line.startswith("whispernet_peers ") for line in lines)
+    assert "whispernet_peers_lock_held_seconds_count 0" not in lines
+
+
+def test_bad_datagram_does_not_drop_the_rest_of_its_ingress_batch():
+    """
+    Test that malformed or wrongly typed frames in a drained batch are
+    dropped on their own while the datagrams after them are still handled.
+    """
+    import json
+    from backend import api
+
+    def frame(**fields):
+        return json.dumps(dict({"version": 1, "port": 9301}, **fields)).encode()
+
+    class FakeBatch:
+        may_have_more = False
+
+        def poll(self):
+            return [
+                (frame(type="MESSAGE", content="x", seq="a", sid=1), b"10.9.3.1", 9301),
+                (frame(type="GROUP_MESSAGE", group=["x"], content="x"), b"10.9.3.1", 9301),
+                (frame(type="FILE_OFFER", id=[1], name="a", size=1, chunk_size=1), b"10.9.3.1", 9301),
+                (None, b"10.9.3.1", 9301),
+                (frame(type="HEARTBEAT", nickname="dave"), b"10.9.3.1", 9301),
+            ]
+
+    api._ingress_batch = FakeBatch()
+    try:
+        api.drain_ingress()
+    finally:
+        api._ingress_batch = None
+
+    assert api.discovered_peers.get("10.9.3.1:9301") is not None
+    api.discovered_peers.remove("10.9.3.1:9301")
+
+
+def test_discovery_with_a_non_integer_port_is_ignored():
+    """
+    Test that a discovery frame whose port is not a valid port number is
+    dropped before the peer is stored (it would poison heartbeat sends).
+    """
+    import json
+    from backend import api
+
+    for port in ("x", 0, 70000, True):
+        frame = {"type": "DISCOVERY_REQUEST", "version": 1, "max_version": 2, "port": port}
+        api.handle_incoming_message(json.dumps(frame).encode(), b"10.9.9.9", 9999)
+
+    assert not [p for p in api.discovered_peers.snapshot() if p.ip == "10.9.9.9"]
+
+
+def test_discovery_task_survives_a_failing_round():
+    """
+    Test that an exception while sending one discovery round is logged and
+    the task keeps announcing.
+    """
+    import asyncio
+    import main
+    from backend import api
+
+    bindings_mock.send_batch.reset_mock()
+    bindings_mock.send_batch.side_effect = [TypeError("bad peer"), None, None]
+    api.discovery_scheduler.next_wakeup = lambda: 0
+    api.discovery_scheduler.due = lambda now: "announce"
+
+    async def scenario():
+        ready = asyncio.get_running_loop().create_future()
+        ready.set_result(True)
+        task = asyncio.ensure_future(main.discover_peers_task(ready))
+        while bindings_mock.send_batch.call_count < 3:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    try:
+        asyncio.run(asyncio.wait_for(scenario(), 5))
+    finally:
+        del api.discovery_scheduler.next_wakeup, api.discovery_scheduler.due
+        bindings_mock.send_batch.side_effect = None
+
+    assert bindings_mock.send_batch.call_count >= 3
+
+
+def test_changed_peer_key_is_confirmed_before_use():
+    """
+    Test that a discovery frame announcing a different key for a peer we
+    hold a session with triggers a cleartext HEARTBEAT asking it to confirm.
+    """
+    import json
+    from unittest.mock import patch
+    from backend import api, crypto
+
+    frame = {"type": "HEARTBEAT", "version": 1, "port": 9411, "pub": "ab" * 32}
+    mock_core_lib.send_udp_datagram.reset_mock()
+    with patch.object(api.session_keys, "on_peer_key", return_value=crypto.SESSION_PENDING):
+        api.handle_incoming_message(json.dumps(frame).encode(), b"10.9.4.1", 9411)
+    api.discovered_peers.remove("10.9.4.1:9411")
+    _drain_io()
+
+    mock_core_lib.send_udp_datagram.assert_called_once()
+    data, length, ip, port = mock_core_lib.send_udp_datagram.call_args[0]
+    assert json.loads(data)["confirm"] == 1
+    assert (ip, port) == (b"10.9.4.1", 9411)
@@ -0,0 +1,144 @@
+"""
+Unit tests for the WebSocket fan-out, using fake sockets that record,
+stall or fail on demand.
+"""
+import asyncio
+
+from backend.connections import ConnectionManager
+from tests.support import run
+
+
+class _FakeSocket:
+    def __init__(self, stalled=False, broken=False):
+        self.frames = []
+        self.closed_with = None
+        self.broken = broken
+        self.unblock = asyncio.Event()
+        if not stalled:
+            self.unblock.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        await self.unblock.wait()
+        if self.broken:
+            raise RuntimeError("connection reset")
+        self.frames.append(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_stalled_client_does_not_delay_others():
+    """
+    Test that frames reach healthy clients while another client is stuck,
+    and that every client receives the very same serialized string.
+    """
+    async def scenario():
+        manager = ConnectionManager(queue_size=16)
+        fast, stuck = _FakeSocket(), _FakeSocket(stalled=True)
+        await manager.connect(fast)
+        await manager.connect(stuck)
+        message = '{"type": "NEW_MESSAGE"}'
+        for _ in range(3):
+            manager.publish(message)
+        await asyncio.sleep(0.01)
+        stats = manager.stats()["clients"]
+        stuck.unblock.set()
+        await asyncio.sleep(0.01)
+        return fast, stuck, message, stats
+
+    fast, stuck, message, stats = run(scenario())
+
+    assert len(fast.frames) == 3
+    assert all(frame is message for frame in fast.frames)
+    assert [c["queued"] for c in stats] == [0, 2]  # one frame is mid-send
+    assert len(stuck.frames) == 3
+
+
+def test_drop_oldest_keeps_the_newest_frames():
+    """
+    Test that a full queue discards its oldest frames and counts them.
+    """
+    async def scenario():
+        manager = ConnectionManager(queue_size=4, slow_policy="drop-oldest")
+        slow = _FakeSocket(stalled=True)
+        await manager.connect(slow)
+        await asyncio.sleep(0)
+        for i in range(10):
+            manager.publish(str(i))
+        stats = manager.stats()["clients"][0]
+        slow.unblock.set()
+        await asyncio.sleep(0.01)
+        return slow, stats
+
+    slow, stats = run(scenario())
+
+    assert stats["dropped"] == 6
+    assert stats["high_water"] == 4
+    assert slow.frames == ["6", "7", "8", "9"]
+
+
+def test_disconnect_policy_closes_slow_clients():
+    """
+    Test that under the disconnect policy a client that falls a full queue
+    behind is closed with 1013 and removed.
+    """
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, slow_policy="disconnect")
+        slow, healthy = _FakeSocket(stalled=True), _FakeSocket()
+        await manager.connect(slow)
+        await manager.connect(healthy)
+        await asyncio.sleep(0)
+        for i in range(5):
+            manager.publish(str(i))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        return manager, slow, healthy
+
+    manager, slow, healthy = run(scenario())
+
+    assert slow.closed_with == 1013
+    assert manager.active_connections == [healthy]
+    assert manager.stats()["disconnected_slow"] == 1
+    assert healthy.frames == ["0", "1", "2", "3", "4"]
+
+
+def test_failing_socket_is_removed_without_affecting_others():
+    """
+    Test that a send error drops only the broken client.
+    """
+    async def scenario():
+        manager = ConnectionManager()
+        broken, healthy = _FakeSocket(broken=True), _FakeSocket()
+        await manager.connect(broken)
+        await manager.connect(healthy)
+        manager.publish("a")
+        await asyncio.sleep(0.01)
+        manager.publish("b")
+        await asyncio.sleep(0.01)
+        return manager, healthy
+
+    manager, healthy = run(scenario())
+
+    assert manager.active_connections == [healthy]
+    assert healthy.frames == ["a", "b"]
+
+
+def test_initial_frames_precede_broadcasts():
+    """
+    Test that frames queued at connect time are delivered first.
+    """
+    async def scenario():
+        manager = ConnectionManager()
+        socket = _FakeSocket()
+        await manager.connect(socket, initial=["snapshot"])
+        manager.publish("delta")
+        manager.send(socket, "resync")
+        await asyncio.sleep(0.01)
+        return socket
+
+    socket = run(scenario())
+
+    assert socket.frames == ["snapshot", "delta", "resync"]
@@ -0,0 +1,192 @@
+"""
+Tests for the core's AEAD primitives and per-peer sessions. A process has
+one key pair, so sessions here are installed with our own public key: the
+node then talks to itself, which exercises both directions of the stream.
+"""
+import ctypes
+
+import pytest
+
+from backend import crypto
+from backend.bindings import core_lib
+
+pytestmark = pytest.mark.skipif(not hasattr(core_lib, "wn_crypto_init"), reason="core built without AEAD support")
+
+PEER_IP = "127.0.0.1"
+PEER_PORT = 9400
+
+
+@pytest.fixture
+def keys():
+    session_keys = crypto.SessionKeys(core_lib, mode="prefer")
+    assert session_keys.start()
+    yield session_keys
+    core_lib.wn_crypto_configure(
+        crypto.SESSION_CAPACITY, crypto.SESSION_TTL, crypto.REKEY_MESSAGES, crypto.REKEY_SECONDS
+    )
+
+
+def x25519(scalar, point=None):
+    out = ctypes.create_string_buffer(32)
+    assert core_lib.wn_x25519(out, bytes.fromhex(scalar), bytes.fromhex(point) if point else None)
+    return out.raw.hex()
+
+
+def test_x25519_matches_rfc7748():
+    """
+    Test that public keys and the shared secret match the Diffie-Hellman
+    example of RFC 7748 section 6.1.
+    """
+    alice = "77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a"
+    bob = "5dab087e624a8a4b79e17f8b83800ee66f3bb1292618b6fd1c2f8b27ff88e0eb"
+    alice_public = x25519(alice)
+    bob_public = x25519(bob)
+    shared = "4a5d9d5ba4ce2de1728e3bf480350f25e07e21c947d19e3376f09b3c1e161742"
+
+    assert alice_public == "8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a"
+    assert bob_public == "de9edb7d7b7dc1b4d35b61c2ece435373f8343c85b78674dadfc7e146f882b4f"
+    assert x25519(alice, bob_public) == shared
+    assert x25519(bob, alice_public) == shared
+
+
+def test_aead_matches_rfc8439_and_rejects_tampering():
+    """
+    Test that ChaCha20-Poly1305 reproduces the tag of RFC 8439 section
+    2.8.2 and that flipping a ciphertext bit fails authentication.
+    """
+    key = bytes(range(0x80, 0xA0))
+    nonce = bytes.fromhex("070000004041424344454647")
+    aad = bytes.fromhex("50515253c0c1c2c3c4c5c6c7")
+    plaintext = (
+        b"Ladies and Gentlemen of the class of '99: If I could offer you only one tip "
+        b"for the future, sunscreen would be it."
+    )
+    sealed = ctypes.create_string_buffer(len(plaintext) + crypto.TAG_SIZE)
+    assert core_lib.wn_aead_seal(key, nonce, aad, len(aad), plaintext, len(plaintext), sealed) == len(sealed)
+    assert sealed.raw[:16].hex() == "d31a8d34648e60db7b86afbc53ef7ec2"
+    assert sealed.raw[-16:].hex() == "1ae10b594f09e26a7e902ecbd0600691"
+
+    opened = ctypes.create_string_buffer(len(plaintext))
+    assert core_lib.wn_aead_open(key, nonce, aad, len(aad), sealed.raw, len(sealed), opened) == len(plaintext)
+    assert opened.raw == plaintext
+
+    tampered = bytearray(sealed.raw)
+    tampered[5] ^= 1
+    assert core_lib.wn_aead_open(key, nonce, aad, len(aad), bytes(tampered), len(tampered), opened) == -1
+
+
+def test_session_round_trip_rejects_replays_and_tampering(keys):
+    """
+    Test that a sealed frame opens once with the sender's listening port,
+    that replaying or modifying it is rejected and that peers without a
+    session get no sealed frames.
+    """
+    assert keys.on_peer_key(PEER_IP, PEER_PORT, keys.public_key)
+    assert not keys.on_peer_key(PEER_IP, PEER_PORT, keys.public_key)
+
+    sealed = keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b'{"type":"MESSAGE"}')
+    assert crypto.is_sealed(sealed)
+    assert len(sealed) == len(b'{"type":"MESSAGE"}') + crypto.OVERHEAD
+    assert b"MESSAGE" not in sealed
+
+    assert bytes(keys.open(PEER_IP.encode(), sealed)) == b'{"type":"MESSAGE"}'
+    assert keys.sender_port == PEER_PORT
+    assert keys.open(PEER_IP.encode(), sealed) is None
+
+    tampered = bytearray(keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b"hello"))
+    tampered[-1] ^= 0x80
+    assert keys.open(PEER_IP.encode(), bytes(tampered)) is None
+
+    assert keys.seal(PEER_IP, PEER_PORT + 1, PEER_PORT, b"hello") is None
+    assert keys.on_peer_key(PEER_IP, PEER_PORT, "not hex") == crypto.SESSION_UNCHANGED
+
+
+def test_out_of_order_frames_and_rekeying(keys):
+    """
+    Test that frames reordered within the replay window still open and
+    that the receiver follows the sender across rekeyed epochs.
+    """
+    core_lib.wn_crypto_configure(crypto.SESSION_CAPACITY, crypto.SESSION_TTL, 2, crypto.REKEY_SECONDS)
+    keys.on_peer_key(PEER_IP, PEER_PORT, keys.public_key)
+    rekeys = keys.stats()["rekeys"]
+
+    frames = [keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b"frame %d" % i) for i in range(6)]
+    assert keys.stats()["rekeys"] - rekeys == 2
+    assert len({frame[3] for frame in frames}) == 3  # epoch byte
+
+    assert bytes(keys.open(PEER_IP.encode(), frames[1])) == b"frame 1"
+    assert bytes(keys.open(PEER_IP.encode(), frames[0])) == b"frame 0"
+    for i in range(2, 6):
+        assert bytes(keys.open(PEER_IP.encode(), frames[i])) == b"frame %d" % i
+    assert keys.open(PEER_IP.encode(), frames[3]) is None
+
+
+def test_sessions_are_bounded_and_forgettable(keys):
+    """
+    Test that the least recently used session is evicted at capacity and
+    that a forgotten peer no longer gets sealed frames.
+    """
+    core_lib.wn_crypto_configure(2, crypto.SESSION_TTL, crypto.REKEY_MESSAGES, crypto.REKEY_SECONDS)
+    evicted = keys.stats()["evicted"]
+    for port in (PEER_PORT, PEER_PORT + 1, PEER_PORT + 2):
+        assert keys.on_peer_key(PEER_IP, port, keys.public_key)
+
+    stats = keys.stats()
+    assert stats["sessions"] == 2
+    assert stats["evicted"] - evicted == 1
+    assert keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b"hello") is None
+
+    keys.forget(PEER_IP, PEER_PORT + 2)
+    assert keys.seal(PEER_IP, PEER_PORT + 2, PEER_PORT, b"hello") is None
+    assert keys.stats()["sessions"] == 1
+
+
+def test_new_key_for_a_live_session_needs_a_frame_sealed_under_it(keys):
+    """
+    Test that a different key advertised for a peer with a session is only
+    held as pending, and that the session switches once a frame sealed
+    under that key authenticates.
+    """
+    other = x25519("11" * 32)
+    assert keys.on_peer_key(PEER_IP, PEER_PORT, other) == crypto.SESSION_INSTALLED
+    assert keys.on_peer_key(PEER_IP, PEER_PORT, keys.public_key) == crypto.SESSION_PENDING
+    assert keys.open(PEER_IP.encode(), keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b"old key")) is None
+
+    # A frame sealed under the pending key, claiming to come from PEER_PORT
+    keys.on_peer_key(PEER_IP, PEER_PORT + 1, keys.public_key)
+    proof = keys.seal(PEER_IP, PEER_PORT + 1, PEER_PORT, b"proof")
+    assert bytes(keys.open(PEER_IP.encode(), proof)) == b"proof"
+
+    sealed = keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b"new key")
+    assert bytes(keys.open(PEER_IP.encode(), sealed)) == b"new key"
+
+
+def test_spoofed_key_does_not_interrupt_a_live_session(keys):
+    """
+    Test that the established key keeps sealing and opening after another
+    key is advertised for the peer, and that traffic under it drops the
+    pending key.
+    """
+    assert keys.on_peer_key(PEER_IP, PEER_PORT, keys.public_key) == crypto.SESSION_INSTALLED
+    assert keys.on_peer_key(PEER_IP, PEER_PORT, x25519("22" * 32)) == crypto.SESSION_PENDING
+
+    sealed = keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b"still here")
+    assert bytes(keys.open(PEER_IP.encode(), sealed)) == b"still here"
+    assert keys.on_peer_key(PEER_IP, PEER_PORT, keys.public_key) == crypto.SESSION_UNCHANGED
+
+
+def test_replay_window_survives_forget_and_reinstall(keys):
+    """
+    Test that frames accepted before a session was forgotten are still
+    rejected after it is reinstalled with the same peer key.
+    """
+    keys.on_peer_key(PEER_IP, PEER_PORT, keys.public_key)
+    captured = keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b"captured")
+    assert bytes(keys.open(PEER_IP.encode(), captured)) == b"captured"
+
+    keys.forget(PEER_IP, PEER_PORT)
+    assert keys.on_peer_key(PEER_IP, PEER_PORT, keys.public_key) == crypto.SESSION_INSTALLED
+    assert keys.open(PEER_IP.encode(), captured) is None
+
+    fresh = keys.seal(PEER_IP, PEER_PORT, PEER_PORT, b"fresh")
+    assert bytes(keys.open(PEER_IP.encode(), fresh)) == b"fresh"
@@ -0,0 +1,108 @@
+"""
+Unit tests for the adaptive discovery scheduler.
+
+DiscoveryScheduler is driven with explicit timestamps and a seeded RNG;
+sending is not involved.
+"""
+import random
+
+from backend import discovery
+from backend.peers import Peer
+
+
+def _scheduler(**kwargs):
+    options = dict(min_interval=1, max_interval=60, heartbeat_interval=5, rng=random.Random(7))
+    options.update(kwargs)
+    return discovery.DiscoveryScheduler(**options)
+
+
+def _run_until(scheduler, end, step=0.05):
+    """Returns (time, action) for everything due between now and ``end``."""
+    actions, now = [], 0.0
+    while now <= end:
+        action = scheduler.due(now)
+        if action is not None:
+            actions.append((now, action))
+        now = round(now + step, 2)
+    return actions
+
+
+def test_announces_back_off_exponentially_while_stable():
+    """
+    Test that announce intervals double up to the maximum while nothing
+    changes, always within the jitter bounds.
+    """
+    scheduler = _scheduler(jitter=0)
+    scheduler.start(0)
+    announces = [t for t, action in _run_until(scheduler, 200) if action == discovery.ANNOUNCE]
+
+    gaps = [round(b - a, 2) for a, b in zip(announces, announces[1:])]
+    assert gaps[:5] == [2, 4, 8, 16, 32]
+    assert set(gaps[5:]) == {60}
+
+
+def test_peer_changes_reset_the_interval():
+    """
+    Test that a change to the peer set brings announces back to the minimum
+    interval, after which they back off again.
+    """
+    scheduler = _scheduler(jitter=0)
+    scheduler.start(0)
+    for now in range(0, 100):
+        scheduler.due(now)
+    assert scheduler.interval == 60
+
+    scheduler.peers_changed()
+    assert scheduler.next_wakeup() <= 100
+    assert scheduler.due(100) == discovery.ANNOUNCE
+    assert scheduler.interval == 1
+    assert scheduler.next_wakeup() == 101
+
+
+def test_heartbeats_fill_gaps_between_announces():
+    """
+    Test that no liveness gap exceeds the jittered heartbeat interval, that
+    an announce stands in for a heartbeat, and that jitter varies the timing.
+    """
+    scheduler = _scheduler(jitter=0.2)
+    scheduler.start(0)
+    actions = _run_until(scheduler, 300)
+    times = [t for t, _ in actions]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+
+    assert max(gaps) <= 5 * 1.2 + 0.05
+    assert len(set(round(g, 2) for g in gaps)) > 10
+    heartbeats = sum(1 for _, action in actions if action == discovery.HEARTBEAT)
+    assert scheduler.stats()["heartbeats"] == heartbeats
+    assert heartbeats > scheduler.stats()["announces"]
+
+
+def test_replies_are_suppressed_per_session():
+    """
+    Test that a requester is answered once per session id, again after a
+    restart or once forgotten, and always when it sends no session id.
+    """
+    scheduler = _scheduler()
+
+    assert scheduler.should_reply("10.0.0.1:8888", 5) is True
+    assert scheduler.should_reply("10.0.0.1:8888", 5) is False
+    assert scheduler.should_reply("10.0.0.1:8888", 6) is True
+    assert scheduler.should_reply("10.0.0.2:8888", None) is True
+    assert scheduler.should_reply("10.0.0.2:8888", None) is True
+    scheduler.forget("10.0.0.1:8888")
+    assert scheduler.should_reply("10.0.0.1:8888", 6) is True
+    assert scheduler.stats()["replies_suppressed"] == 1
+
+
+def test_unicast_heartbeats_only_for_unreachable_peers_and_rate_limited():
+    """
+    Test that only peers off the discovery port get unicast heartbeats, at
+    most once per heartbeat interval.
+    """
+    scheduler = _scheduler(jitter=0)
+    on_port = Peer("10.0.0.1", discovery.DISCOVERY_PORT, "a", 2, 0)
+    off_port = Peer("10.0.0.2", 54321, "b", 2, 0)
+
+    assert scheduler.unicast_heartbeat_targets([on_port, off_port], 0) == [off_port]
+    assert scheduler.unicast_heartbeat_targets([on_port, off_port], 3) == []
+    assert scheduler.unicast_heartbeat_targets([on_port, off_port], 5) == [off_port]
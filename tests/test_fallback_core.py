@@ -0,0 +1,121 @@
+"""
+Unit tests for the pure-Python core used when the native library is missing.
+
+Each test drives its own PythonCore instance on loopback, independent of
+whichever core backend.bindings loaded.
+"""
+import asyncio
+import ctypes
+import threading
+import time
+
+from backend.bindings import SEND_SOCKET_KINDS, WnDatagram
+from backend.fallback_core import PythonCore
+
+
+def _drain(core, max_count=16):
+    records = (WnDatagram * max_count)()
+    arena = ctypes.create_string_buffer(1 << 16)
+    count = core.poll_messages(records, max_count, arena, len(arena))
+    return [
+        (arena.raw[r.offset:r.offset + r.length], r.sender_ip, r.sender_port)
+        for r in records[:count]
+    ]
+
+
+def test_queued_listener_dispatches_on_the_event_loop():
+    """
+    Test that, started inside a running loop, the listener needs no reader
+    thread, notifies once per batch on the loop thread and hands every
+    datagram to poll_messages in order.
+    """
+    core = PythonCore(SEND_SOCKET_KINDS)
+
+    async def scenario():
+        ready = asyncio.Event()
+        notified_on = []
+
+        def on_ready():
+            notified_on.append(threading.get_ident())
+            ready.set()
+
+        port = core.start_udp_listener_queued(0, on_ready)
+        assert port > 0
+        await asyncio.sleep(0.05)  # endpoint creation is scheduled on the loop
+        for i in range(5):
+            core.send_udp_datagram(f"batched_{i}".encode(), 10, b"127.0.0.1", port)
+        await asyncio.wait_for(ready.wait(), 2)
+        await asyncio.sleep(0.05)
+        try:
+            datagrams = _drain(core)
+        finally:
+            core.stop_udp_listener()
+        return notified_on, datagrams
+
+    notified_on, datagrams = asyncio.run(scenario())
+
+    assert notified_on == [threading.get_ident()]
+    assert [payload for payload, _, _ in datagrams] == [f"batched_{i}".encode() for i in range(5)]
+    assert datagrams[0][1] == b"127.0.0.1"
+    assert core._reader is None
+
+
+def test_listener_outside_a_loop_uses_a_reader_thread():
+    """
+    Test that the listener still works when no event loop is running,
+    e.g. from a script.
+    """
+    core = PythonCore(SEND_SOCKET_KINDS)
+    notifications = []
+    port = core.start_udp_listener_queued(0, lambda: notifications.append(1))
+    try:
+        core.send_udp_message(b"hello_world", b"127.0.0.1", port)
+        deadline = time.monotonic() + 2
+        while not notifications and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [payload for payload, _, _ in _drain(core)] == [b"hello_world"]
+    finally:
+        core.stop_udp_listener()
+
+
+def test_batch_sends_reuse_one_socket_per_kind_and_count_them():
+    """
+    Test that send_udp_batch delivers every datagram through the
+    long-lived unicast sender and counts it.
+    """
+    core = PythonCore(SEND_SOCKET_KINDS)
+    receiver = PythonCore(SEND_SOCKET_KINDS)
+    port = receiver.start_udp_listener_queued(0, lambda: None)
+    try:
+        datagrams = [(f"item_{i}".encode(), b"127.0.0.1", port) for i in range(3)]
+        messages = (ctypes.c_char_p * 3)(*[d[0] for d in datagrams])
+        lengths = (ctypes.c_int * 3)(*[len(d[0]) for d in datagrams])
+        ips = (ctypes.c_char_p * 3)(*[d[1] for d in datagrams])
+        ports = (ctypes.c_int * 3)(*[d[2] for d in datagrams])
+
+        assert core.send_udp_batch(messages, lengths, ips, ports, 3) == 3
+        assert core.send_udp_batch(messages, lengths, ips, ports, 3) == 3
+        assert list(core._senders) == ["unicast"]
+
+        stats = (ctypes.c_ulonglong * 6)()
+        assert core.get_send_stats(stats, 6) == 6
+        assert list(stats) == [6, 0, 0, 0, 0, 0]
+    finally:
+        receiver.stop_udp_listener()
+
+
+def test_multicast_membership_needs_a_listener():
+    """
+    Test that joining a group fails before the listener exists and that
+    join and leave succeed on the listener socket afterwards.
+    """
+    core = PythonCore(SEND_SOCKET_KINDS)
+    assert core.join_multicast_group(b"239.192.7.7") == 0
+
+    core.start_udp_listener_queued(0, lambda: None)
+    try:
+        assert core.join_multicast_group(b"239.192.7.7") == 1
+        assert core.leave_multicast_group(b"239.192.7.7") == 1
+        assert core.join_multicast_group(b"not-an-ip") == 0
+    finally:
+        core.stop_udp_listener()
@@ -0,0 +1,109 @@
+"""
+Unit tests for the fragmentation/reassembly layer.
+
+These exercise backend/fragment.py directly; no sockets are involved.
+"""
+import random
+
+from backend import fragment
+
+SENDER = ("192.168.1.50", 40000)
+
+
+def test_small_payload_is_not_fragmented():
+    """
+    Test that payloads that fit one datagram are sent as-is.
+    """
+    assert not fragment.needs_fragmenting(b"x" * fragment.FRAGMENT_PAYLOAD)
+    assert fragment.needs_fragmenting(b"x" * (fragment.FRAGMENT_PAYLOAD + 1))
+
+
+def test_split_and_reassemble_out_of_order():
+    """
+    Test that a large payload survives splitting, shuffling and reassembly,
+    and that every fragment stays within the MTU budget.
+    """
+    payload = bytes(random.getrandbits(8) for _ in range(10 * fragment.FRAGMENT_PAYLOAD + 17))
+    fragments = fragment.split(payload)
+
+    assert len(fragments) == 11
+    assert all(fragment.is_fragment(f) for f in fragments)
+    assert all(len(f) <= fragment.FRAGMENT_PAYLOAD + fragment.HEADER.size for f in fragments)
+
+    random.shuffle(fragments)
+    reassembler = fragment.Reassembler()
+    results = [reassembler.add(SENDER, f) for f in fragments]
+
+    assert results[:-1] == [None] * 10
+    assert results[-1] == payload
+    assert len(reassembler) == 0
+    assert reassembler.buffered_bytes == 0
+
+
+def test_json_is_never_mistaken_for_a_fragment():
+    """
+    Test that ordinary JSON datagrams bypass the reassembler.
+    """
+    assert not fragment.is_fragment(b'{"type": "MESSAGE", "content": "hi"}')
+
+
+def test_duplicate_fragments_are_ignored():
+    """
+    Test that retransmitted fragments are not counted twice.
+    """
+    fragments = fragment.split(b"a" * (3 * fragment.FRAGMENT_PAYLOAD))
+    reassembler = fragment.Reassembler()
+
+    assert reassembler.add(SENDER, fragments[0]) is None
+    assert reassembler.add(SENDER, fragments[0]) is None
+    assert reassembler.add(SENDER, fragments[1]) is None
+    assert reassembler.add(SENDER, fragments[2]) == b"a" * (3 * fragment.FRAGMENT_PAYLOAD)
+
+
+def test_incomplete_messages_expire():
+    """
+    Test that partial messages are evicted once the timeout passes.
+    """
+    fragments = fragment.split(b"b" * (2 * fragment.FRAGMENT_PAYLOAD + 1))
+    reassembler = fragment.Reassembler(timeout=5)
+
+    reassembler.add(SENDER, fragments[0], now=100.0)
+    assert len(reassembler) == 1
+
+    reassembler.expire(now=104.0)
+    assert len(reassembler) == 1
+
+    reassembler.expire(now=106.0)
+    assert len(reassembler) == 0
+    assert reassembler.buffered_bytes == 0
+    assert reassembler.evicted == 1
+
+
+def test_per_sender_limit_evicts_oldest_partial():
+    """
+    Test that one sender cannot hold more than its share of partial messages,
+    while other senders are unaffected.
+    """
+    reassembler = fragment.Reassembler(max_sender_messages=2)
+    other_sender = ("192.168.1.51", 40000)
+
+    reassembler.add(other_sender, fragment.split(b"o" * (2 * fragment.FRAGMENT_PAYLOAD))[0])
+    for _ in range(5):
+        reassembler.add(SENDER, fragment.split(b"c" * (2 * fragment.FRAGMENT_PAYLOAD))[0])
+
+    assert len(reassembler) == 3
+    assert reassembler.evicted == 3
+
+
+def test_global_byte_limit_is_enforced():
+    """
+    Test that total buffered bytes never exceed the global cap.
+    """
+    limit = 4 * fragment.FRAGMENT_PAYLOAD
+    reassembler = fragment.Reassembler(max_total_bytes=limit)
+
+    for port in range(10):
+        fragments = fragment.split(b"d" * (3 * fragment.FRAGMENT_PAYLOAD))
+        reassembler.add(("10.0.0.1", port), fragments[0])
+        reassembler.add(("10.0.0.1", port), fragments[1])
+        assert reassembler.buffered_bytes <= limit
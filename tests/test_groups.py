@@ -0,0 +1,79 @@
+"""
+Unit tests for group addressing and membership routing.
+
+These exercise backend/groups.py directly; no sockets are involved.
+"""
+import ipaddress
+
+import pytest
+
+from backend import groups
+
+
+def test_group_addresses_are_stable_and_organization_local():
+    """
+    Test that a name always maps to the same 239.192/16 address and that
+    invalid names are rejected.
+    """
+    address = groups.group_address("ops team")
+
+    assert address == groups.group_address("ops team")
+    assert ipaddress.ip_address(address) in ipaddress.ip_network("239.192.0.0/16")
+    assert address != groups.group_address("dev team")
+    with pytest.raises(ValueError):
+        groups.group_address("bad\nname")
+    with pytest.raises(ValueError):
+        groups.group_address("")
+
+
+def test_route_uses_one_multicast_plus_unicast_fallback():
+    """
+    Test that members on the group port share one multicast datagram while
+    members on other ports, or without working multicast, get unicast.
+    """
+    directory = groups.GroupDirectory(port=8888)
+    directory.update_peer("10.0.0.1:8888", "10.0.0.1", 8888, ["ops"])
+    directory.update_peer("10.0.0.2:8888", "10.0.0.2", 8888, ["ops"])
+    directory.update_peer("10.0.0.3:40000", "10.0.0.3", 40000, ["ops"])
+    directory.update_peer("10.0.0.4:8888", "10.0.0.4", 8888, ["ops"], multicast=0)
+    directory.update_peer("10.0.0.5:8888", "10.0.0.5", 8888, ["dev"])
+
+    assert directory.route("ops") == (True, [("10.0.0.3", 40000), ("10.0.0.4", 8888)])
+    assert directory.route("dev") == (True, [])
+    assert directory.route("empty") == (False, [])
+
+
+def test_membership_follows_latest_advertisement_and_peer_removal():
+    """
+    Test that a peer's groups are replaced by each advertisement, cleared
+    when it advertises none, and dropped when the peer is forgotten.
+    """
+    directory = groups.GroupDirectory()
+    directory.update_peer("10.0.0.1:8888", "10.0.0.1", 8888, ["ops", "dev"])
+    directory.update_peer("10.0.0.1:8888", "10.0.0.1", 8888, ["dev", "bad\nname"])
+    assert [(g["name"], g["members"]) for g in directory.describe()] == [("dev", ["10.0.0.1:8888"])]
+
+    directory.update_peer("10.0.0.1:8888", "10.0.0.1", 8888, None)
+    assert directory.describe() == []
+
+    directory.update_peer("10.0.0.2:8888", "10.0.0.2", 8888, ["ops"])
+    directory.forget_peer("10.0.0.2:8888")
+    assert directory.route("ops") == (False, [])
+
+
+def test_local_membership_and_multicast_health():
+    """
+    Test that local joins are listed and that one failed multicast join
+    marks us as needing unicast copies.
+    """
+    directory = groups.GroupDirectory()
+    directory.add_local("ops")
+    assert directory.multicast_ok is True
+
+    directory.add_local("dev", multicast_ok=False)
+    assert directory.local_names() == ["dev", "ops"]
+    assert directory.multicast_ok is False
+    assert directory.remove_local("dev") is True
+    assert directory.remove_local("dev") is False
+    assert directory.multicast_ok is True
+    assert directory.describe()[0]["joined"] is True
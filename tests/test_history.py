@@ -0,0 +1,84 @@
+"""
+Unit tests for the persistent message history.
+
+Each test opens a MessageStore on a database in pytest's tmp_path.
+"""
+import asyncio
+
+from backend import history
+from tests.support import run
+
+
+def test_pages_walk_backwards_through_a_conversation():
+    """
+    Test that pages come back oldest-first, that following ``next`` visits
+    every message exactly once even with equal timestamps, and that other
+    conversations are not mixed in.
+    """
+    async def scenario(path):
+        store = history.MessageStore()
+        await store.open(path)
+        for i in range(7):
+            store.append("10.0.0.1:8888", "in", f"m{i}", ts=1000 + i // 2)
+        store.append("10.0.0.2:8888", "in", "elsewhere", ts=1001)
+
+        pages, cursor = [], {}
+        while cursor is not None:
+            messages, cursor = await store.page("10.0.0.1:8888", limit=3, **cursor)
+            pages.append([m["content"] for m in messages])
+        store.close()
+        return pages
+
+    pages = run(scenario(":memory:"))
+
+    assert pages == [["m4", "m5", "m6"], ["m1", "m2", "m3"], ["m0"]]
+
+
+def test_history_survives_reopening(tmp_path):
+    """
+    Test that messages are on disk after close, that the database uses WAL,
+    and that ids keep increasing across sessions.
+    """
+    path = str(tmp_path / "history.db")
+
+    async def first_session():
+        store = history.MessageStore()
+        await store.open(path)
+        first = store.append("10.0.0.1:8888", "out", "hello")
+        store.close()
+        return first
+
+    async def second_session():
+        store = history.MessageStore()
+        await store.open(path)
+        second = store.append("10.0.0.1:8888", "in", "hi back", nickname="alice")
+        messages, cursor = await store.page("10.0.0.1:8888")
+        mode = await asyncio.get_running_loop().run_in_executor(
+            store._executor, lambda: store._db.execute("PRAGMA journal_mode").fetchone()[0]
+        )
+        store.close()
+        return second, messages, cursor, mode
+
+    first = run(first_session())
+    second, messages, cursor, mode = run(second_session())
+
+    assert second["id"] > first["id"]
+    assert [(m["direction"], m["content"], m["nickname"]) for m in messages] == [
+        ("out", "hello", None),
+        ("in", "hi back", "alice"),
+    ]
+    assert cursor is None
+    assert mode == "wal"
+
+
+def test_unopened_store_records_nothing():
+    """
+    Test that a store that was never opened ignores appends and returns
+    empty pages instead of touching the disk.
+    """
+    async def scenario():
+        store = history.MessageStore()
+        record = store.append("10.0.0.1:8888", "in", "lost")
+        return record, await store.page("10.0.0.1:8888")
+
+    assert run(scenario()) == (None, ([], None))
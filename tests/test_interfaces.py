@@ -0,0 +1,61 @@
+"""
+Unit tests for the interface table: directed broadcasts and own-address
+tracking. Scans are injected; no real interfaces are read.
+"""
+from backend import interfaces
+
+
+def test_directed_broadcast_follows_the_prefix():
+    """
+    Test that the broadcast address comes from the interface's prefix and
+    that point-to-point, host and loopback addresses have none.
+    """
+    assert interfaces.directed_broadcast("192.168.1.20", 24) == "192.168.1.255"
+    assert interfaces.directed_broadcast("10.0.0.5", 25) == "10.0.0.127"
+    assert interfaces.directed_broadcast("172.16.3.9", 20) == "172.16.15.255"
+    assert interfaces.directed_broadcast("10.9.9.1", 31) is None
+    assert interfaces.directed_broadcast("10.9.9.1", 32) is None
+    assert interfaces.directed_broadcast("127.0.0.1", 8) is None
+
+
+def test_refresh_tracks_own_addresses_and_reports_changes():
+    """
+    Test that refresh collects every interface address plus the routed
+    primary, always counts loopback as our own and reports a change only
+    when the addresses or broadcast targets differ.
+    """
+    found = [("lo", "127.0.0.1", 8), ("eth0", "192.168.1.20", 24), ("wlan0", "10.0.0.5", 25)]
+    table = interfaces.InterfaceTable(scan=lambda: list(found), probe=lambda: "192.168.1.20")
+
+    assert table.is_own("127.0.0.1")
+    assert table.refresh() is True
+    assert table.own_ips == {"127.0.0.1", "192.168.1.20", "10.0.0.5"}
+    assert table.broadcasts == ("10.0.0.127", "192.168.1.255")
+    assert not table.is_own("192.168.1.21")
+
+    assert table.refresh() is False
+
+    # Leaving the Wi-Fi network drops its address and its broadcast target
+    found.pop()
+    assert table.refresh() is True
+    assert not table.is_own("10.0.0.5")
+    assert table.broadcasts == ("192.168.1.255",)
+
+
+def test_failed_scan_keeps_the_previous_table():
+    """
+    Test that a scan error leaves the known interfaces in place instead
+    of emptying the table.
+    """
+    results = [[("eth0", "192.168.1.20", 24)]]
+
+    def scan():
+        if not results:
+            raise OSError("adapter enumeration failed")
+        return results.pop()
+
+    table = interfaces.InterfaceTable(scan=scan)
+    table.refresh()
+    assert table.refresh() is False
+    assert table.is_own("192.168.1.20")
+    assert table.broadcasts == ("192.168.1.255",)
@@ -0,0 +1,44 @@
+"""
+Unit tests for backend logging: rate limiting and content redaction.
+"""
+import logging
+
+from backend import log
+
+
+def _record(msg, level=logging.INFO):
+    return logging.LogRecord("whispernet.test", level, __file__, 1, msg, (), None)
+
+
+def test_rate_limit_suppresses_bursts_and_reports_the_count():
+    """
+    Test that a message template beyond its burst is suppressed until
+    tokens refill, and the next record through carries the number
+    suppressed.
+    """
+    now = [0.0]
+    limiter = log.RateLimitFilter(burst=2, per_second=1, clock=lambda: now[0])
+
+    passed = [limiter.filter(_record("peer %s")) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+
+    now[0] = 1.0
+    record = _record("peer %s")
+    assert limiter.filter(record)
+    assert record.suppressed == 3
+
+    # Other templates and warnings have their own budget
+    assert limiter.filter(_record("other %s"))
+    assert limiter.filter(_record("peer %s", logging.WARNING))
+
+
+def test_content_is_redacted_unless_disabled(monkeypatch):
+    """
+    Test that message bodies are replaced by their length by default
+    and shown verbatim when redaction is turned off.
+    """
+    monkeypatch.setattr(log, "LOG_REDACT_CONTENT", True)
+    assert log.content("secret plans") == "<12 chars>"
+
+    monkeypatch.setattr(log, "LOG_REDACT_CONTENT", False)
+    assert log.content("secret plans") == "secret plans"
@@ -0,0 +1,73 @@
+"""
+Unit tests for the metrics registry and its text exposition output.
+"""
+from backend import metrics
+from backend.peers import PeerRegistry
+
+
+def test_counter_renders_one_sample_per_label_set():
+    """
+    Test that a labelled counter renders HELP/TYPE headers and one
+    sample per label combination, with label values escaped.
+    """
+    registry = metrics.Registry()
+    counter = registry.counter("frames_total", "Frames by type", ("type",))
+    counter.inc("MESSAGE")
+    counter.inc("MESSAGE")
+    counter.inc('odd"type')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP frames_total Frames by type", "# TYPE frames_total counter"]
+    assert 'frames_total{type="MESSAGE"} 2' in lines
+    assert 'frames_total{type="odd\\"type"} 1' in lines
+    assert counter.value("MESSAGE") == 2
+
+
+def test_histogram_buckets_are_cumulative():
+    """
+    Test that histogram buckets count observations at or below each
+    bound, end with +Inf, and report sum and count.
+    """
+    registry = metrics.Registry()
+    histogram = registry.histogram("batch_size", "Batch sizes", (1, 4, 16))
+    for value in (1, 3, 4, 20):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert 'batch_size_bucket{le="1"} 1' in lines
+    assert 'batch_size_bucket{le="4"} 3' in lines
+    assert 'batch_size_bucket{le="16"} 3' in lines
+    assert 'batch_size_bucket{le="+Inf"} 4' in lines
+    assert "batch_size_sum 28" in lines
+    assert "batch_size_count 4" in lines
+
+
+def test_callbacks_are_read_at_render_time_and_skip_non_numbers():
+    """
+    Test that collected gauges read their source on every render and
+    leave out samples that are not numbers.
+    """
+    registry = metrics.Registry()
+    table = {"unicast": 3, "broadcast": object()}
+    registry.gauge_callback("sent", "Sent by socket", lambda: dict(table), ("socket",))
+
+    assert 'sent{socket="unicast"} 3' in registry.render()
+    table["unicast"] = 5
+    rendered = registry.render()
+    assert 'sent{socket="unicast"} 5' in rendered
+    assert "broadcast" not in rendered
+
+
+def test_peer_registry_reports_lock_hold_times():
+    """
+    Test that a PeerRegistry given on_lock_held reports one duration
+    per critical section.
+    """
+    held = []
+    registry = PeerRegistry(timeout=15, on_lock_held=held.append)
+    registry.observe("192.0.2.1", 8888, "alice", 2, now=0)
+    registry.snapshot()
+    registry.expire(now=1)
+
+    assert len(held) == 3
+    assert all(seconds >= 0 for seconds in held)
@@ -0,0 +1,120 @@
+"""
+Unit tests for the peer registry and its delta feed.
+
+These exercise backend/peers.py directly with explicit timestamps; no
+sockets are involved.
+"""
+import asyncio
+
+from backend import peers
+
+
+def test_new_peers_and_nickname_changes_are_reported():
+    """
+    Test that observe() distinguishes new/renamed peers from plain refreshes.
+    """
+    registry = peers.PeerRegistry(timeout=15)
+
+    assert registry.observe("192.168.1.10", 8888, "alice", 2, now=0) is True
+    assert registry.observe("192.168.1.10", 8888, "alice", 2, now=5) is False
+    assert registry.observe("192.168.1.10", 8888, "alicia", 2, now=6) is True
+
+    peer = registry.get("192.168.1.10:8888")
+    assert (peer.nickname, peer.version, peer.last_seen) == ("alicia", 2, 6)
+    assert len(registry) == 1
+
+
+def test_loopback_entries_yield_to_lan_addresses():
+    """
+    Test that a LAN sighting replaces a loopback entry on the same port and
+    that later loopback sightings of that port are suppressed.
+    """
+    registry = peers.PeerRegistry(timeout=15)
+
+    assert registry.observe("127.0.0.1", 9000, "bob", 2, now=0) is True
+    assert registry.observe("192.168.1.20", 9000, "bob", 2, now=1) is True
+    assert "127.0.0.1:9000" not in registry
+    assert registry.observe("127.0.0.1", 9000, "bob", 2, now=2) is None
+    assert [p.key for p in registry.snapshot()] == ["192.168.1.20:9000"]
+
+    # Once the LAN entry is gone, loopback is accepted again
+    registry.remove("192.168.1.20:9000")
+    assert registry.observe("127.0.0.1", 9000, "bob", 2, now=3) is True
+
+
+def test_only_peers_past_their_deadline_expire():
+    """
+    Test that refreshed peers survive their original deadline while silent
+    ones are removed exactly once.
+    """
+    registry = peers.PeerRegistry(timeout=10)
+    registry.observe("10.0.0.1", 8888, "quiet", 2, now=0)
+    registry.observe("10.0.0.2", 8888, "chatty", 2, now=0)
+    registry.observe("10.0.0.2", 8888, "chatty", 2, now=8)
+
+    assert registry.expire(now=5) == []
+    assert registry.expire(now=10) == ["10.0.0.1:8888"]
+    assert registry.expire(now=17) == []
+    assert registry.expire(now=18) == ["10.0.0.2:8888"]
+    assert len(registry) == 0
+    assert registry._expiry == []
+
+
+def test_heap_holds_one_entry_per_peer():
+    """
+    Test that repeated refreshes do not grow the expiry heap, and that a peer
+    removed and re-added is not expired by its old entry.
+    """
+    registry = peers.PeerRegistry(timeout=10)
+    for second in range(100):
+        registry.observe("10.0.0.3", 8888, "busy", 2, now=second)
+    assert len(registry._expiry) == 1
+
+    registry.remove("10.0.0.3:8888")
+    registry.observe("10.0.0.3", 8888, "busy", 2, now=200)
+    assert registry.expire(now=205) == []
+    assert "10.0.0.3:8888" in registry
+
+
+def test_feed_coalesces_changes_into_versioned_deltas():
+    """
+    Test that changes within one window become a single PEER_DELTA frame,
+    that transient peers are dropped, and that versions chain via ``since``.
+    """
+    frames = []
+
+    async def scenario():
+        feed = peers.PeerFeed(frames.append, window=0.01)
+        registry = peers.PeerRegistry(timeout=10, on_change=feed.record)
+
+        registry.observe("10.0.0.1", 8888, "alice", 2, now=0)
+        registry.observe("10.0.0.2", 8888, "bob", 2, now=0)
+        registry.observe("10.0.0.1", 8888, "alicia", 2, now=1)
+        registry.observe("10.0.0.3", 8888, "ghost", 2, now=1)
+        registry.remove("10.0.0.3:8888")
+        await asyncio.sleep(0.05)
+
+        registry.observe("10.0.0.2", 8888, "robert", 2, now=2)
+        registry.expire(now=11)
+        await asyncio.sleep(0.05)
+        return feed.snapshot(registry)
+
+    snapshot = asyncio.run(scenario())
+
+    assert len(frames) == 2
+    first, second = frames
+    assert (first["since"], first["version"]) == (0, 1)
+    assert first["events"] == [
+        {"type": "PEER_ADDED", "payload": {"ip": "10.0.0.1:8888", "nickname": "alicia"}},
+        {"type": "PEER_ADDED", "payload": {"ip": "10.0.0.2:8888", "nickname": "bob"}},
+    ]
+    assert (second["since"], second["version"]) == (1, 2)
+    assert second["events"] == [
+        {"type": "PEER_UPDATED", "payload": {"ip": "10.0.0.2:8888", "nickname": "robert"}},
+        {"type": "PEER_REMOVED", "payload": {"ip": "10.0.0.1:8888"}},
+    ]
+    assert snapshot == {
+        "type": "PEER_SNAPSHOT",
+        "version": 2,
+        "payload": [{"ip": "10.0.0.2:8888", "nickname": "robert"}],
+    }
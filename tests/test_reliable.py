@@ -0,0 +1,180 @@
+"""
+Unit tests for the reliable delivery channel, run over a lossy in-memory link.
+"""
+import asyncio
+import json
+
+from backend import reliable
+from tests.support import LossyLink, run
+
+
+class _Link(LossyLink):
+    """Alice sends to Bob; Bob's ACKs come back over the same link."""
+
+    def __init__(self, drop=lambda frame: False):
+        super().__init__(drop)
+        self.frames = self.sent
+        self.delivered = []
+        self.alice = reliable.ReliableChannel(lambda p, ip, port: self.send(json.loads(p), self._at_bob), lambda: 1000)
+        self.bob = reliable.ReliableChannel(
+            lambda p, ip, port: self.send(json.loads(p), self.alice.on_ack, "bob"), lambda: 2000
+        )
+
+    def _at_bob(self, frame):
+        if self.bob.on_message("alice", "127.0.0.1", 1000, frame["sid"], frame["seq"], frame.get("base")):
+            self.delivered.append(frame["content"])
+
+
+def test_reliable_send_is_delivered_and_measures_rtt():
+    """
+    Test that a frame on a clean link is acknowledged with an RTT sample.
+    """
+    async def scenario():
+        link = _Link()
+        result = await link.alice.send("bob", "127.0.0.1", 2000, {"type": "MESSAGE", "content": "hi"})
+        return link, result
+
+    link, result = run(scenario())
+
+    assert result["delivered"] is True
+    assert result["attempts"] == 1
+    assert result["rtt_ms"] is not None
+    assert link.delivered == ["hi"]
+    stats = link.alice.stats()["bob"]
+    assert stats["delivered"] == 1
+    assert stats["srtt_ms"] is not None
+    assert stats["in_flight"] == 0
+
+
+def test_lost_frames_are_retransmitted_once_delivered(monkeypatch):
+    """
+    Test that a dropped frame is retransmitted after the RTO and delivered
+    exactly once even if its ACK is lost as well.
+    """
+    monkeypatch.setattr(reliable, "INITIAL_RTO", 0.02)
+    dropped = {"message": 0, "ack": 0}
+
+    def drop(frame):
+        kind = "ack" if frame["type"] == "ACK" else "message"
+        if dropped[kind] == 0:
+            dropped[kind] += 1
+            return True
+        return False
+
+    async def scenario():
+        link = _Link(drop)
+        result = await link.alice.send("bob", "127.0.0.1", 2000, {"type": "MESSAGE", "content": "again"})
+        return link, result
+
+    link, result = run(scenario())
+
+    assert result["delivered"] is True
+    assert result["attempts"] == 3
+    assert link.delivered == ["again"]
+    assert link.alice.stats()["bob"]["retransmits"] == 2
+
+
+def test_unreachable_peer_fails_after_max_attempts(monkeypatch):
+    """
+    Test that sends give up after MAX_ATTEMPTS and report failure.
+    """
+    monkeypatch.setattr(reliable, "INITIAL_RTO", 0.01)
+    monkeypatch.setattr(reliable, "MAX_ATTEMPTS", 3)
+
+    async def scenario():
+        link = _Link(drop=lambda frame: True)
+        return await link.alice.send("bob", "127.0.0.1", 2000, {"type": "MESSAGE", "content": "void"})
+
+    result = run(scenario())
+
+    assert result["delivered"] is False
+    assert result["attempts"] == 3
+
+
+def test_window_limits_frames_in_flight(monkeypatch):
+    """
+    Test that no more than WINDOW_SIZE frames are outstanding and that
+    queued frames drain as ACKs arrive, in order.
+    """
+    monkeypatch.setattr(reliable, "WINDOW_SIZE", 4)
+
+    async def scenario():
+        link = _Link()
+        futures = [
+            link.alice.send("bob", "127.0.0.1", 2000, {"type": "MESSAGE", "content": str(i)})
+            for i in range(10)
+        ]
+        in_flight = link.alice.stats()["bob"]["in_flight"]
+        results = await asyncio.gather(*futures)
+        return link, in_flight, results
+
+    link, in_flight, results = run(scenario())
+
+    assert in_flight == 4
+    assert all(r["delivered"] for r in results)
+    assert link.delivered == [str(i) for i in range(10)]
+
+
+def test_out_of_order_frames_are_selectively_acknowledged():
+    """
+    Test that the receiver tracks gaps and reports them through SACK.
+    """
+    async def scenario():
+        acks = []
+        bob = reliable.ReliableChannel(lambda p, ip, port: acks.append(json.loads(p)), lambda: 2000)
+        for seq in (1, 3, 4, 3):
+            bob.on_message("alice", "127.0.0.1", 1000, 7, seq)
+        await asyncio.sleep(0)
+        return bob, acks
+
+    bob, acks = run(scenario())
+
+    assert len(acks) == 1  # one coalesced ACK per loop iteration
+    assert acks[0]["cum"] == 1
+    assert acks[0]["sack"] == [3, 4]
+
+
+def test_abandoned_frame_does_not_block_later_acknowledgements(monkeypatch):
+    """
+    Test that once the sender gives up on a frame, the ``base`` carried by
+    later frames moves the receiver past the hole so they are acknowledged.
+    """
+    monkeypatch.setattr(reliable, "INITIAL_RTO", 0.01)
+    monkeypatch.setattr(reliable, "MAX_ATTEMPTS", 2)
+
+    async def scenario():
+        link = _Link(drop=lambda frame: frame.get("content") == "lost")
+        lost = await link.alice.send("bob", "127.0.0.1", 2000, {"type": "MESSAGE", "content": "lost"})
+        later = await asyncio.gather(*(
+            link.alice.send("bob", "127.0.0.1", 2000, {"type": "MESSAGE", "content": str(i)})
+            for i in range(100)
+        ))
+        return link, lost, later
+
+    link, lost, later = run(scenario())
+
+    assert lost["delivered"] is False
+    assert all(r["delivered"] for r in later)
+    assert link.delivered == [str(i) for i in range(100)]
+    acks = [frame for frame in link.frames if frame["type"] == "ACK"]
+    assert acks[-1]["cum"] == 101
+    assert acks[-1]["sack"] == []
+
+
+def test_sack_reports_the_newest_out_of_order_frames():
+    """
+    Test that with more gaps than fit in one ACK, the newest sequences are
+    the ones selectively acknowledged.
+    """
+    async def scenario():
+        acks = []
+        bob = reliable.ReliableChannel(lambda p, ip, port: acks.append(json.loads(p)), lambda: 2000)
+        for seq in range(2, reliable.MAX_SACK + 12):
+            bob.on_message("alice", "127.0.0.1", 1000, 7, seq)
+        await asyncio.sleep(0)
+        return acks
+
+    acks = run(scenario())
+
+    assert acks[0]["cum"] == 0
+    assert acks[0]["sack"] == list(range(12, reliable.MAX_SACK + 12))
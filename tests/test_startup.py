@@ -0,0 +1,68 @@
+"""
+Unit tests for the import-time profiler behind PROFILE_IMPORTS.
+"""
+import builtins
+import sys
+
+from backend import startup
+
+
+def test_import_profiler_splits_self_and_cumulative_time(tmp_path, monkeypatch):
+    """
+    Test that a module's own work counts as its self time, that its
+    imports only add to its cumulative time and that uninstalling
+    restores the original import hook.
+    """
+    (tmp_path / "wn_profile_outer.py").write_text("import wn_profile_inner\n")
+    (tmp_path / "wn_profile_inner.py").write_text("import time\ntime.sleep(0.05)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    original = builtins.__import__
+
+    profiler = startup.ImportProfiler()
+    profiler.install()
+    try:
+        import wn_profile_outer  # noqa: F401
+        import wn_profile_outer  # noqa: F401,F811  already loaded: not counted twice
+    finally:
+        profiler.uninstall()
+        sys.modules.pop("wn_profile_outer", None)
+        sys.modules.pop("wn_profile_inner", None)
+
+    assert builtins.__import__ is original
+    slowest = {module: (self_ms, total_ms) for module, self_ms, total_ms in profiler.slowest(10)}
+    inner_self, inner_total = slowest["wn_profile_inner"]
+    outer_self, outer_total = slowest["wn_profile_outer"]
+    assert inner_self >= 45
+    assert outer_total >= inner_total
+    assert outer_self < 45
+    assert profiler.slowest(1)[0][0] == "wn_profile_inner"
+
+
+def test_import_report_is_one_record_regardless_of_length(monkeypatch):
+    """
+    Test that the report lists every requested module in a single log
+    record, so the per-template rate limiter cannot truncate it.
+    """
+    import logging
+
+    profiler = startup.ImportProfiler()
+    for i in range(50):
+        profiler.self_times[f"mod{i}"] = profiler.total_times[f"mod{i}"] = 0.001 * i
+    monkeypatch.setattr(startup, "_profiler", profiler)
+    monkeypatch.setattr(startup, "PROFILE_IMPORTS", 50)
+
+    records = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    logger = logging.getLogger("wn_test_startup")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(Collect())
+    startup.report_imports(logger)
+
+    assert len(records) == 1
+    message = records[0].getMessage()
+    assert all(f"mod{i}\n" in message + "\n" for i in range(50))
@@ -0,0 +1,359 @@
+"""
+Unit tests for the file transfer engine, run against real files over a
+lossy in-memory link.
+"""
+import asyncio
+import json
+import os
+
+from backend import transfer
+from tests.support import LossyLink, run
+
+ALICE = "127.0.0.1:1000"
+BOB = "127.0.0.1:2000"
+
+
+class _Link(LossyLink):
+    """Alice sends files to Bob; control frames flow both ways."""
+
+    def __init__(self, drop=lambda datagram: False):
+        super().__init__(drop)
+        self.events = []
+        self.chunks_sent = 0
+        self.alice = transfer.TransferManager(
+            lambda frame, ip, port: self.send(json.loads(json.dumps(frame)), self.bob.on_control, ALICE, "127.0.0.1", 0),
+            self._chunks,
+            self.events.append,
+            lambda: 1000,
+        )
+        self.bob = transfer.TransferManager(
+            lambda frame, ip, port: self.send(json.loads(json.dumps(frame)), self.alice.on_control, BOB, "127.0.0.1", 0),
+            lambda datagrams: None,
+            self.events.append,
+            lambda: 2000,
+        )
+
+    def _chunks(self, datagrams):
+        for datagram, ip, port in datagrams:
+            self.chunks_sent += 1
+            self.send(datagram, self.bob.on_chunk, "127.0.0.1")
+
+
+async def _wait_for(predicate, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def _make_file(tmp_path, size):
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(size))
+    return source
+
+
+def _incoming_id(link):
+    return next(e["payload"]["id"] for e in link.events if e["type"] == "FILE_OFFER")
+
+
+def test_bitmap_reports_missing_ranges():
+    """
+    Test that the received-chunk bitmap reports gaps as [begin, end) runs.
+    """
+    bitmap = transfer._Bitmap(40)
+    for i in list(range(0, 10)) + [12, 13] + list(range(20, 40)):
+        bitmap.set(i)
+
+    assert bitmap.count == 32
+    assert bitmap.first_missing(0) == 10
+    assert bitmap.missing_ranges(0, 40) == [[10, 12], [14, 20]]
+    assert bitmap.missing_ranges(0, 40, limit=1) == [[10, 12]]
+    assert not bitmap.set(12)
+
+
+def test_file_is_transferred_intact(tmp_path):
+    """
+    Test that an offered and accepted file arrives byte for byte, with
+    progress events and a completed state on both sides.
+    """
+    source = _make_file(tmp_path, 100 * transfer.CHUNK_SIZE + 123)
+    downloads = tmp_path / "downloads"
+
+    async def scenario():
+        link = _Link()
+        sent = link.alice.offer(BOB, "127.0.0.1", 2000, str(source))
+        await _wait_for(lambda: any(e["type"] == "FILE_OFFER" for e in link.events))
+        link.bob.accept(_incoming_id(link), str(downloads))
+        await _wait_for(lambda: link.alice.outgoing[sent["id"]].state == "done")
+        return link, sent
+
+    link, sent = run(scenario())
+
+    received = downloads / "source.bin"
+    assert received.read_bytes() == source.read_bytes()
+    assert not list(downloads.glob("*" + transfer.PARTIAL_SUFFIX))
+    assert link.chunks_sent == 101
+    done = [e["payload"] for e in link.events if e["type"] == "FILE_DONE"]
+    assert {d["direction"] for d in done} == {"incoming", "outgoing"}
+    assert all(d["transferred"] == d["size"] for d in done)
+
+
+def test_lost_chunks_are_retransmitted(tmp_path):
+    """
+    Test that chunks dropped on the wire are reported missing and resent.
+    """
+    source = _make_file(tmp_path, 300 * transfer.CHUNK_SIZE)
+    downloads = tmp_path / "downloads"
+    seen = set()
+
+    def drop(datagram):
+        if not isinstance(datagram, bytes):
+            return False
+        index = transfer.CHUNK_HEADER.unpack_from(datagram)[3]
+        first_time = index not in seen
+        seen.add(index)
+        return first_time and index % 7 == 3
+
+    async def scenario():
+        link = _Link(drop)
+        sent = link.alice.offer(BOB, "127.0.0.1", 2000, str(source))
+        await _wait_for(lambda: any(e["type"] == "FILE_OFFER" for e in link.events))
+        link.bob.accept(_incoming_id(link), str(downloads))
+        await _wait_for(lambda: link.alice.outgoing[sent["id"]].state == "done")
+        return link
+
+    link = run(scenario())
+
+    assert (downloads / "source.bin").read_bytes() == source.read_bytes()
+    assert link.chunks_sent > 300
+
+
+def test_transfer_resumes_after_peer_returns(tmp_path, monkeypatch):
+    """
+    Test that a transfer cut off mid-way stalls with its bitmap persisted,
+    and completes without resending received chunks once the peer is seen
+    again.
+    """
+    monkeypatch.setattr(transfer, "STALL_TIMEOUT", 0.3)
+    monkeypatch.setattr(transfer, "CONTROL_RETRY", 0.05)
+    source = _make_file(tmp_path, 200 * transfer.CHUNK_SIZE)
+    downloads = tmp_path / "downloads"
+    partition = {"down": False, "delivered": 0}
+
+    def drop(datagram):
+        if partition["down"]:
+            return True
+        if isinstance(datagram, bytes):
+            partition["delivered"] += 1
+            if partition["delivered"] == 80:
+                partition["down"] = True
+        return False
+
+    async def scenario():
+        link = _Link(drop)
+        sent = link.alice.offer(BOB, "127.0.0.1", 2000, str(source))
+        await _wait_for(lambda: any(e["type"] == "FILE_OFFER" for e in link.events))
+        incoming_id = _incoming_id(link)
+        link.bob.accept(incoming_id, str(downloads))
+
+        await _wait_for(lambda: link.alice.outgoing[sent["id"]].state == "stalled"
+                        and link.bob.incoming[incoming_id].state == "stalled")
+        received_before = link.bob.incoming[incoming_id].bitmap.count
+        sidecar_saved = os.path.exists(link.bob.incoming[incoming_id].sidecar_path)
+
+        partition["down"] = False
+        chunks_before = link.chunks_sent
+        link.alice.on_peer_seen(BOB)
+        await _wait_for(lambda: link.alice.outgoing[sent["id"]].state == "done")
+        return received_before, sidecar_saved, link.chunks_sent - chunks_before
+
+    received_before, sidecar_saved, resent = run(scenario())
+
+    assert received_before == 80
+    assert sidecar_saved
+    assert resent == 200 - 80
+    assert (downloads / "source.bin").read_bytes() == source.read_bytes()
+
+
+def test_chunks_from_other_hosts_are_ignored(tmp_path):
+    """
+    Test that a chunk for a known transfer but from the wrong address is dropped.
+    """
+    async def scenario():
+        bob = transfer.TransferManager(lambda *a: None, lambda d: None, lambda e: None, lambda: 2000)
+        bob.on_control(ALICE, "127.0.0.1", 1000, {
+            "type": "FILE_OFFER", "id": 7, "name": "../../x.bin", "size": 10, "chunk_size": transfer.CHUNK_SIZE,
+        })
+        bob.accept(7, str(tmp_path))
+        chunk = transfer.CHUNK_HEADER.pack(transfer.MAGIC, transfer.VERSION, 7, 0, 0) + b"0123456789"
+        bob.on_chunk("10.0.0.9", chunk)
+        return bob.incoming[7]
+
+    t = run(scenario())
+
+    assert t.bitmap.count == 0
+    assert t.path == os.path.join(str(tmp_path), "x.bin")
+    t.close()
+
+
+def test_partial_with_another_hash_is_not_resumed(tmp_path, monkeypatch):
+    """
+    Test that a leftover .wnpart for the same offer id but a different
+    content hash is ignored rather than spliced into the new file.
+    """
+    import base64
+
+    monkeypatch.setattr(transfer.random, "getrandbits", lambda bits: 0x1234)
+    source = _make_file(tmp_path, 20 * transfer.CHUNK_SIZE)
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    partial = "source.bin.00001234"
+    (downloads / (partial + transfer.PARTIAL_SUFFIX)).write_bytes(os.urandom(20 * transfer.CHUNK_SIZE))
+    (downloads / (partial + transfer.SIDECAR_SUFFIX)).write_text(json.dumps({
+        "id": 0x1234, "sha256": "0" * 64, "size": 20 * transfer.CHUNK_SIZE, "chunk_size": transfer.CHUNK_SIZE,
+        "bitmap": base64.b64encode(b"\xff\xff\x0f").decode("ascii"),
+    }))
+
+    async def scenario():
+        link = _Link()
+        sent = link.alice.offer(BOB, "127.0.0.1", 2000, str(source))
+        await _wait_for(lambda: any(e["type"] == "FILE_OFFER" for e in link.events))
+        link.bob.accept(_incoming_id(link), str(downloads))
+        await _wait_for(lambda: link.alice.outgoing[sent["id"]].state == "done")
+        return link
+
+    link = run(scenario())
+
+    assert link.chunks_sent == 20
+    assert (downloads / "source.bin").read_bytes() == source.read_bytes()
+
+
+def test_checksum_mismatch_fails_the_transfer(tmp_path):
+    """
+    Test that a completed file whose SHA-256 differs from the offer is
+    discarded and the transfer reported as failed.
+    """
+    async def scenario():
+        sent = []
+        bob = transfer.TransferManager(lambda frame, ip, port: sent.append(frame), lambda d: None,
+                                       lambda e: None, lambda: 2000)
+        bob.on_control(ALICE, "127.0.0.1", 1000, {
+            "type": "FILE_OFFER", "id": 9, "name": "x.bin", "size": 10, "chunk_size": transfer.CHUNK_SIZE, "sha256": "0" * 64,
+        })
+        bob.accept(9, str(tmp_path))
+        bob.on_chunk("127.0.0.1", transfer.CHUNK_HEADER.pack(transfer.MAGIC, transfer.VERSION, 9, 0, 0) + b"0123456789")
+        await _wait_for(lambda: bob.incoming[9].state != "verifying")
+        return bob.incoming[9], sent
+
+    t, sent = run(scenario())
+
+    assert t.state == "failed"
+    assert t.error == "checksum mismatch"
+    assert sent[-1]["type"] == "FILE_CANCEL"
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_existing_download_is_not_overwritten(tmp_path):
+    """
+    Test that a completed file whose name is taken gets a numbered name.
+    """
+    source = _make_file(tmp_path, 3 * transfer.CHUNK_SIZE)
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    (downloads / "source.bin").write_bytes(b"keep me")
+
+    async def scenario():
+        link = _Link()
+        sent = link.alice.offer(BOB, "127.0.0.1", 2000, str(source))
+        await _wait_for(lambda: any(e["type"] == "FILE_OFFER" for e in link.events))
+        link.bob.accept(_incoming_id(link), str(downloads))
+        await _wait_for(lambda: link.alice.outgoing[sent["id"]].state == "done")
+        return link.bob.incoming[_incoming_id(link)]
+
+    t = run(scenario())
+
+    assert (downloads / "source.bin").read_bytes() == b"keep me"
+    assert t.path == str(downloads / "source (1).bin")
+    assert (downloads / "source (1).bin").read_bytes() == source.read_bytes()
+
+
+def test_peer_missing_ranges_are_clamped_to_the_file(tmp_path):
+    """
+    Test that FILE_STATE ranges outside [0, count) or malformed are cut
+    down or dropped instead of reaching the chunk slicer.
+    """
+    source = _make_file(tmp_path, 10 * transfer.CHUNK_SIZE)
+
+    async def scenario():
+        batches = []
+        alice = transfer.TransferManager(lambda *a: None, batches.append, lambda e: None, lambda: 1000)
+        sent = alice.offer(BOB, "127.0.0.1", 2000, str(source))
+        alice.on_control(BOB, "127.0.0.1", 2000, {
+            "type": "FILE_STATE", "id": sent["id"], "received": 0, "cum": 0,
+            "missing": [[-5, 2], [8, 1 << 40], [3, "x"], "bad", [6, 4]],
+        })
+        alice.cancel(sent["id"])
+        return batches
+
+    batches = run(scenario())
+
+    indexes = [transfer.CHUNK_HEADER.unpack_from(d)[3] for batch in batches for d, _, _ in batch]
+    assert indexes == [0, 1, 8, 9]
+
+
+def test_offers_beyond_the_limits_are_ignored(monkeypatch):
+    """
+    Test that offers with an unusable chunk size, an oversized file or too
+    many chunks are dropped, that pending offers are capped per peer and in
+    total, and that nothing is allocated for an offer until it is accepted.
+    """
+    monkeypatch.setattr(transfer, "MAX_OFFERS_PER_PEER", 2)
+    monkeypatch.setattr(transfer, "MAX_PENDING_OFFERS", 3)
+
+    def offer(bob, peer, transfer_id, size=1000, chunk_size=transfer.CHUNK_SIZE):
+        bob.on_control(peer, "127.0.0.1", 1000, {
+            "type": "FILE_OFFER", "id": transfer_id, "name": "x.bin", "size": size, "chunk_size": chunk_size,
+        })
+
+    async def scenario():
+        bob = transfer.TransferManager(lambda *a: None, lambda d: None, lambda e: None, lambda: 2000)
+        offer(bob, ALICE, 1, size=10 ** 12, chunk_size=transfer.MIN_CHUNK_SIZE)
+        offer(bob, ALICE, 2, chunk_size=1)
+        offer(bob, ALICE, 3, chunk_size=transfer.MAX_CHUNK_SIZE + 1)
+        offer(bob, ALICE, 4, size=transfer.MAX_FILE_SIZE + 1)
+        offer(bob, ALICE, 5, size=-1)
+        offer(bob, ALICE, 6, size=transfer.MAX_CHUNKS * transfer.MIN_CHUNK_SIZE + 1, chunk_size=transfer.MIN_CHUNK_SIZE)
+        for transfer_id in (10, 11, 12):
+            offer(bob, ALICE, transfer_id)
+        for transfer_id in (20, 21):
+            offer(bob, "127.0.0.1:3000", transfer_id)
+        return bob
+
+    bob = run(scenario())
+
+    assert sorted(bob.incoming) == [10, 11, 20]
+    assert all(t.bitmap is None for t in bob.incoming.values())
+    assert bob.list()[0]["transferred"] == 0
+
+
+def test_same_name_transfers_use_separate_partials(tmp_path):
+    """
+    Test that two accepted transfers of the same name write to different
+    partial files.
+    """
+    async def scenario():
+        bob = transfer.TransferManager(lambda *a: None, lambda d: None, lambda e: None, lambda: 2000)
+        for peer, transfer_id in ((ALICE, 1), ("127.0.0.1:3000", 2)):
+            bob.on_control(peer, "127.0.0.1", 1000, {
+                "type": "FILE_OFFER", "id": transfer_id, "name": "x.bin", "size": 5000, "chunk_size": transfer.CHUNK_SIZE,
+            })
+            bob.accept(transfer_id, str(tmp_path))
+        return bob
+
+    bob = run(scenario())
+
+    first, second = bob.incoming[1], bob.incoming[2]
+    assert first.part_path != second.part_path
+    assert os.path.exists(first.part_path) and os.path.exists(second.part_path)
+    first.close()
+    second.close()
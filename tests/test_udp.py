@@ -1,14 +1,15 @@
 import unittest
 import time
 import ctypes
-from backend.bindings import core_lib, ON_MESSAGE_RECEIVED_FUNC
+import socket
+from backend.bindings import core_lib, ON_MESSAGE_RECEIVED_FUNC, ON_INGRESS_READY_FUNC, IngressBatch, WnDatagram, send_batch, read_send_stats
 
 received_data = None
 
-def mock_callback(message, sender_ip, sender_port):
+def mock_callback(message, length, sender_ip, sender_port):
     global received_data
     received_data = {
-        "message": message.decode('utf-8'),
+        "message": message[:length].decode('utf-8'),
         "sender_ip": sender_ip.decode('utf-8'),
         "sender_port": sender_port
     }
@@ -34,5 +35,141 @@ class TestUdpCore(unittest.TestCase):
         finally:
             core_lib.stop_udp_listener()
 
+    def test_queued_listener_drains_in_batches(self):
+        notifications = []
+        c_ready = ON_INGRESS_READY_FUNC(lambda: notifications.append(time.monotonic()))
+
+        test_port = 9998
+        core_lib.start_udp_listener_queued(test_port, c_ready)
+        time.sleep(0.1)
+        try:
+            for i in range(5):
+                core_lib.send_udp_message(f"batched_{i}".encode('utf-8'), b'127.0.0.1', test_port)
+            time.sleep(0.2)
+
+            batch = IngressBatch(16)
+            datagrams = batch.poll()
+
+            self.assertEqual([bytes(payload) for payload, _, _ in datagrams],
+                             [f"batched_{i}".encode('utf-8') for i in range(5)])
+            self.assertEqual(datagrams[0][1], b'127.0.0.1')
+            self.assertGreaterEqual(len(notifications), 1)
+            self.assertEqual(batch.poll(), [])
+        finally:
+            core_lib.stop_udp_listener()
+
+    def test_send_batch_delivers_every_datagram(self):
+        c_ready = ON_INGRESS_READY_FUNC(lambda: None)
+
+        test_port = 9997
+        core_lib.start_udp_listener_queued(test_port, c_ready)
+        time.sleep(0.1)
+        try:
+            datagrams = [(f"fanout_{i}".encode('utf-8'), b'127.0.0.1', test_port) for i in range(100)]
+            self.assertEqual(send_batch(datagrams), 100)
+            time.sleep(0.2)
+
+            received = [bytes(payload) for payload, _, _ in IngressBatch(128).poll()]
+            self.assertEqual(sorted(received), sorted(d[0] for d in datagrams))
+        finally:
+            core_lib.stop_udp_listener()
+
+    def test_send_stats_count_per_socket(self):
+        before = read_send_stats()
+        core_lib.send_udp_message(b"stats_probe", b'127.0.0.1', 9996)
+        after = read_send_stats()
+
+        self.assertEqual(set(after), {"unicast", "broadcast", "multicast"})
+        self.assertEqual(after["unicast"]["sent"], before["unicast"]["sent"] + 1)
+        self.assertEqual(after["broadcast"], before["broadcast"])
+
+    def test_large_binary_payload_round_trip(self):
+        c_ready = ON_INGRESS_READY_FUNC(lambda: None)
+
+        test_port = 9995
+        core_lib.start_udp_listener_queued(test_port, c_ready)
+        time.sleep(0.1)
+        try:
+            payload = bytes(range(256)) * 200  # 51200 bytes with embedded NULs
+            self.assertEqual(core_lib.send_udp_datagram(payload, len(payload), b'127.0.0.1', test_port), 1)
+            time.sleep(0.2)
+
+            datagrams = IngressBatch(4).poll()
+            self.assertEqual(len(datagrams), 1)
+            self.assertEqual(bytes(datagrams[0][0]), payload)
+        finally:
+            core_lib.stop_udp_listener()
+
+def poll_listener(listener, max_count=256):
+    records = (WnDatagram * max_count)()
+    arena = ctypes.create_string_buffer(1 << 20)
+    count = core_lib.wn_listener_poll(listener, records, max_count, arena, len(arena))
+    return [arena.raw[r.offset:r.offset + r.length] for r in records[:count]]
+
+@unittest.skipUnless(hasattr(core_lib, "wn_listener_open"), "needs the native core")
+class TestListenerHandles(unittest.TestCase):
+    def open_listener(self, port, shards):
+        bound_port = ctypes.c_int()
+        listener = core_lib.wn_listener_open(port, shards, ON_MESSAGE_RECEIVED_FUNC(), self.c_ready, ctypes.byref(bound_port))
+        self.assertTrue(listener)
+        self.addCleanup(core_lib.wn_listener_close, listener)
+        return listener, bound_port.value
+
+    def setUp(self):
+        self.c_ready = ON_INGRESS_READY_FUNC(lambda: None)
+
+    def test_listeners_in_one_process_are_independent(self):
+        first, first_port = self.open_listener(0, 1)
+        second, second_port = self.open_listener(0, 1)
+        self.assertNotEqual(first_port, second_port)
+
+        core_lib.send_udp_message(b"to_first", b'127.0.0.1', first_port)
+        core_lib.send_udp_message(b"to_second", b'127.0.0.1', second_port)
+        time.sleep(0.2)
+
+        self.assertEqual(poll_listener(first), [b"to_first"])
+        self.assertEqual(poll_listener(second), [b"to_second"])
+
+    def test_close_does_not_wait_for_a_poll_timeout(self):
+        bound_port = ctypes.c_int()
+        listener = core_lib.wn_listener_open(0, 2, ON_MESSAGE_RECEIVED_FUNC(), self.c_ready, ctypes.byref(bound_port))
+        time.sleep(0.05)  # let the reactors block in their waits
+
+        started = time.perf_counter()
+        core_lib.wn_listener_close(listener)
+        self.assertLess(time.perf_counter() - started, 0.05)
+
+    def test_sharded_listener_keeps_its_port_to_itself(self):
+        listener, port = self.open_listener(0, 2)
+        # A second group on a taken port would split the traffic; it moves instead
+        _, other_port = self.open_listener(port, 2)
+        self.assertNotEqual(other_port, port)
+
+    def test_sharded_listener_receives_every_flow_once(self):
+        listener, port = self.open_listener(0, 4)
+        if core_lib.wn_listener_shards(listener) < 4:
+            self.skipTest("SO_REUSEPORT sharding is Linux-only")
+        self.assertEqual(core_lib.wn_listener_join_multicast(listener, b"239.192.7.8"), 1)
+
+        # Distinct source ports hash onto different shards
+        senders = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(32)]
+        try:
+            for i, sender in enumerate(senders):
+                sender.sendto(f"flow_{i}".encode('utf-8'), ('127.0.0.1', port))
+            try:
+                senders[0].setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+                senders[0].sendto(b"group", ('239.192.7.8', port))
+                multicast_sent = True
+            except OSError:
+                multicast_sent = False  # no multicast route in this environment
+            time.sleep(0.2)
+        finally:
+            for sender in senders:
+                sender.close()
+
+        received = poll_listener(listener)
+        expected = [f"flow_{i}".encode('utf-8') for i in range(32)] + ([b"group"] if multicast_sent else [])
+        self.assertEqual(sorted(received), sorted(expected))
+
 if __name__ == '__main__':
     print("Run this after building the C++ core library.")
@@ -0,0 +1,103 @@
+"""
+Unit tests for the binary wire format.
+
+These exercise backend/wire.py directly; no sockets are involved.
+"""
+import json
+
+from backend import config
+from backend import wire
+
+
+def test_discovery_frame_round_trips_and_is_smaller_than_json():
+    """
+    Test that a discovery request decodes to the same dict shape as its JSON
+    form while taking far fewer bytes.
+    """
+    frame = {"type": "DISCOVERY_REQUEST", "nickname": "alice", "port": 8888}
+    encoded = wire.encode(frame)
+
+    assert wire.is_binary(encoded)
+    assert len(encoded) < len(json.dumps(dict(frame, version=1)).encode("utf-8")) / 3
+    assert wire.decode(encoded) == dict(frame, version=wire.BINARY_VERSION)
+
+
+def test_public_key_travels_as_raw_bytes():
+    """
+    Test that the session public key advertised in discovery frames is
+    carried as 32 raw bytes and decodes back to the same hex string.
+    """
+    key = bytes(range(32)).hex()
+    frame = {"type": "DISCOVERY_REPLY", "nickname": "alice", "port": 8888, "pub": key}
+    encoded = wire.encode(frame)
+
+    assert len(encoded) == len(wire.encode(dict(frame, pub=""))) + 32
+    assert wire.decode(encoded)["pub"] == key
+    assert wire.encode(dict(frame, pub="not hex")) is None
+
+
+def test_reliable_message_and_ack_round_trip():
+    """
+    Test that sequence numbers, session ids and SACK lists survive encoding.
+    """
+    message = {"type": "MESSAGE", "content": "héllo", "port": 9000, "seq": 7, "sid": 0xDEADBEEF}
+    ack = {"type": "ACK", "port": 9001, "sid": 0xDEADBEEF, "cum": 6, "sack": [8, 9, 12]}
+
+    encoded = wire.encode(message)
+    assert encoded[5] & wire.FLAG_RELIABLE
+    assert wire.decode(encoded) == dict(message, version=wire.BINARY_VERSION)
+    assert wire.decode(wire.encode(ack)) == dict(ack, version=wire.BINARY_VERSION)
+
+
+def test_group_frames_and_memberships_round_trip():
+    """
+    Test that group messages and the group list carried by discovery frames
+    survive encoding, including an empty list.
+    """
+    message = {"type": "GROUP_MESSAGE", "group": "ops team", "content": "hi", "port": 8888}
+    heartbeat = {"type": "HEARTBEAT", "nickname": "bob", "port": 8888, "groups": ["a", "b.c"], "mcast": 1}
+
+    assert wire.decode(wire.encode(message)) == dict(message, version=wire.BINARY_VERSION)
+    assert wire.decode(wire.encode(heartbeat)) == dict(heartbeat, version=wire.BINARY_VERSION)
+    assert wire.decode(wire.encode(dict(heartbeat, groups=[])))["groups"] == []
+
+
+def test_frames_without_a_binary_form_stay_json():
+    """
+    Test that unknown frame types, unknown keys and oversized fields fall
+    back to JSON, and that JSON-only peers always get JSON.
+    """
+    assert wire.encode({"type": "FILE_OFFER", "id": 1}) is None
+    assert wire.encode({"type": "MESSAGE", "content": "x", "extra": 1}) is None
+    assert wire.encode({"type": "MESSAGE", "content": "x" * 70000}) is None
+
+    frame = {"type": "MESSAGE", "content": "hi", "port": 8888}
+    assert json.loads(wire.encode_for(wire.JSON_VERSION, frame)) == frame
+    assert wire.is_binary(wire.encode_for(wire.BINARY_VERSION, frame))
+
+
+def test_version_negotiation():
+    """
+    Test that the negotiated version never exceeds ours and defaults to JSON.
+    """
+    assert wire.negotiate(1) == wire.JSON_VERSION
+    assert wire.negotiate(config.PROTOCOL_VERSION + 5) == config.PROTOCOL_VERSION
+    assert wire.negotiate(None) == wire.JSON_VERSION
+
+
+def test_malformed_frames_are_rejected():
+    """
+    Test that truncated frames and unsupported versions decode to None,
+    while unknown field tags are skipped.
+    """
+    encoded = wire.encode({"type": "MESSAGE", "content": "truncate me", "port": 1})
+    assert wire.decode(encoded[:-3]) is None
+
+    future = bytearray(encoded)
+    future[3] = config.PROTOCOL_VERSION + 1
+    assert wire.decode(bytes(future)) is None
+
+    with_unknown_tag = encoded + bytes([200, 0, 2]) + b"??"
+    assert wire.decode(with_unknown_tag)["content"] == "truncate me"
+
+    assert not wire.is_binary(b'{"type": "MESSAGE"}')
@@ -1,108 +1,129 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { Send } from 'lucide-react';
 import Sidebar from './components/Sidebar'
+import MessageList from './components/MessageList'
 
-const MessageContent = ({ content }) => {
-  const URL_PATTERN = /\b(?:https?:\/\/|www\.)[^\s<]+\b/g;
-  const parts = [];
-  let lastIndex = 0;
-  const matches = [...content.matchAll(URL_PATTERN)];
+const RESYNCING = -1;
+const PAGE_SIZE = 50;
+// Messages kept in memory per conversation; older ones are paged back in from /api/messages
+const MESSAGE_WINDOW = 500;
+const EMPTY_CONVERSATION = { messages: [], next: null, loaded: false };
 
-  matches.forEach((match) => {
-    const url = match[0];
-    const startIndex = match.index;
+let localKeys = 0;
+const localKey = () => `local-${++localKeys}`;
 
-    if (startIndex > lastIndex) {
-      parts.push(content.slice(lastIndex, startIndex));
-    }
-
-    let href = url.startsWith('www.') ? `https://${url}` : url;
-    try {
-      const urlObj = new URL(href);
-      if (!['http:', 'https:'].includes(urlObj.protocol)) {
-        parts.push(url);
-        lastIndex = startIndex + url.length;
-        return;
-      }
-    } catch {
-      parts.push(url);
-      lastIndex = startIndex + url.length;
-      return;
-    }
-
-    parts.push(
-      <a
-        key={startIndex}
-        href={href}
-        target="_blank"
-        rel="noopener noreferrer"
-        className="text-blue-500 underline hover:text-blue-700"
-      >
-        {url}
-      </a>
-    );
-    lastIndex = startIndex + url.length;
-  });
-
-  if (lastIndex < content.length) {
-    parts.push(content.slice(lastIndex));
-  }
-  return <>{parts}</>;
-};
+const fromHistory = (m) => ({
+  key: m.id,
+  id: m.id,
+  ts: m.ts,
+  sender: m.direction === 'out' ? 'you' : m.peer,
+  content: m.content,
+  timestamp: new Date(m.ts),
+});
 
 function App() {
   const [peers, setPeers] = useState([]);
-  const [messages, setMessages] = useState([]);
+  // Conversation per IP:PORT: { messages, next (cursor for older history or null), loaded }
+  const [conversations, setConversations] = useState({});
   const [selectedPeerIp, setSelectedPeerIp] = useState(null); // Tracks by IP:PORT
   const [text, setText] = useState('');
-  const messagesEndRef = useRef(null);
+  const loadingRef = useRef(new Set()); // conversations with a history page in flight
+  // Peer list mirror keyed by IP:PORT, kept in step with the backend's PEER_DELTA version
+  const peerMapRef = useRef(new Map());
+  const peerVersionRef = useRef(null);
+
+  const currentConversation = conversations[selectedPeerIp] || EMPTY_CONVERSATION;
+  const currentMessages = currentConversation.messages;
+  const olderCursor = currentConversation.next;
 
-  const scrollToBottom = () => {
-    messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
+  const appendMessage = (peer, message) => {
+    setConversations(prev => {
+      const current = prev[peer] || EMPTY_CONVERSATION;
+      let messages = [...current.messages, message];
+      let next = current.next;
+      if (messages.length > MESSAGE_WINDOW) {
+        messages = messages.slice(-MESSAGE_WINDOW);
+        const oldest = messages.find(m => m.id != null);
+        if (oldest) next = { before: oldest.ts, before_id: oldest.id };
+      }
+      return { ...prev, [peer]: { ...current, messages, next } };
+    });
   };
 
-  useEffect(() => {
-    scrollToBottom();
-  }, [messages, selectedPeerIp]);
-
-  // Robustly fetch peers with exact IPs from the REST API
-  const fetchPeers = async () => {
-    try {
-      const res = await fetch('/api/peers');
-      const data = await res.json();
-      setPeers(data);
-      
-      // Auto-deselect if the peer dropped offline
-      setSelectedPeerIp(current => {
-        if (current && !data.find(p => p.ip === current)) return null;
-        return current;
-      });
-    } catch (e) {
-      console.error("Failed to fetch peers:", e);
+  const loadHistory = (peer, cursor) => {
+    if (loadingRef.current.has(peer)) return;
+    loadingRef.current.add(peer);
+    const params = new URLSearchParams({ peer, limit: PAGE_SIZE });
+    if (cursor) {
+      params.set('before', cursor.before);
+      params.set('before_id', cursor.before_id);
     }
+    fetch(`/api/messages?${params}`)
+      .then(res => res.json())
+      .then(({ messages, next }) => {
+        setConversations(prev => {
+          const current = prev[peer] || EMPTY_CONVERSATION;
+          const known = new Set(current.messages.map(m => m.id));
+          const older = messages.filter(m => !known.has(m.id)).map(fromHistory);
+          return { ...prev, [peer]: { ...current, messages: [...older, ...current.messages], next, loaded: true } };
+        });
+      })
+      .catch(err => console.error('Failed to load history:', err))
+      .finally(() => loadingRef.current.delete(peer));
   };
 
+  // First visit to a conversation pulls its latest page of history
   useEffect(() => {
-    fetchPeers(); // Initial load
+    if (!selectedPeerIp || conversations[selectedPeerIp]?.loaded) return;
+    setConversations(prev => ({ ...prev, [selectedPeerIp]: { ...(prev[selectedPeerIp] || EMPTY_CONVERSATION), loaded: true } }));
+    loadHistory(selectedPeerIp, null);
+  }, [selectedPeerIp]);
+
+  const publishPeers = () => {
+    const peerMap = peerMapRef.current;
+    setPeers(Array.from(peerMap.values()));
 
+    // Auto-deselect if the peer dropped offline
+    setSelectedPeerIp(current => {
+      if (current && !peerMap.has(current)) return null;
+      return current;
+    });
+  };
+
+  useEffect(() => {
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
     const ws = new WebSocket(`${wsProtocol}//${window.location.host}/api/ws`);
     
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data);
       
-      if (data.type === 'PEER_LIST_UPDATE') {
-        // Trigger a fresh fetch so we have exact IP:PORT strings for routing
-        fetchPeers(); 
+      if (data.type === 'PEER_SNAPSHOT') {
+        peerMapRef.current = new Map(data.payload.map(p => [p.ip, p]));
+        peerVersionRef.current = data.version;
+        publishPeers();
+      }
+
+      if (data.type === 'PEER_DELTA') {
+        // A gap means we missed a frame; ask for a fresh snapshot (once) instead
+        if (data.since !== peerVersionRef.current) {
+          if (peerVersionRef.current !== RESYNCING) {
+            ws.send(JSON.stringify({ type: 'PEER_RESYNC' }));
+            peerVersionRef.current = RESYNCING;
+          }
+          return;
+        }
+        const peerMap = peerMapRef.current;
+        data.events.forEach(({ type, payload }) => {
+          if (type === 'PEER_REMOVED') peerMap.delete(payload.ip);
+          else peerMap.set(payload.ip, payload);
+        });
+        peerVersionRef.current = data.version;
+        publishPeers();
       }
       
       if (data.type === 'NEW_MESSAGE') {
-        setMessages(prev => [...prev, {
-          sender: data.payload.sender, // Backend sends IP:PORT here
-          recipient: 'you',
-          content: data.payload.content,
-          timestamp: new Date()
-        }]);
+        const { sender, content, id, ts } = data.payload; // sender is IP:PORT
+        appendMessage(sender, { key: id ?? localKey(), id, ts, sender, content, timestamp: ts ? new Date(ts) : new Date() });
       }
     };
 
@@ -113,20 +134,33 @@ function App() {
     e.preventDefault();
     if (!selectedPeerIp || !text.trim()) return;
 
+    const peer = selectedPeerIp;
     const message = { 
+      key: localKey(),
       sender: 'you', 
-      recipient: selectedPeerIp, 
       content: text, 
       timestamp: new Date() 
     };
     
-    setMessages(prev => [...prev, message]);
+    appendMessage(peer, message);
     
     fetch('/api/send', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ recipient_ip: selectedPeerIp, content: text }),
-    });
+      body: JSON.stringify({ recipient_ip: peer, content: text }),
+    })
+      .then(res => res.json())
+      .then(({ id, ts }) => {
+        if (id == null) return;
+        // Give the local copy its stored id so history paging lines up with it
+        setConversations(prev => {
+          const current = prev[peer];
+          if (!current) return prev;
+          const messages = current.messages.map(m => (m === message ? { ...m, id, ts } : m));
+          return { ...prev, [peer]: { ...current, messages } };
+        });
+      })
+      .catch(err => console.error('Failed to send message:', err));
     
     setText('');
   };
@@ -138,12 +172,6 @@ function App() {
     }
   };
 
-  // Filter messages so we only see the chat history for the selected user!
-  const currentMessages = messages.filter(m => 
-    (m.sender === selectedPeerIp && m.recipient === 'you') || 
-    (m.sender === 'you' && m.recipient === selectedPeerIp)
-  );
-
   const getSelectedPeerName = () => {
     if (!selectedPeerIp) return '';
     const p = peers.find(x => x.ip === selectedPeerIp);
@@ -180,32 +208,33 @@ function App() {
           </div>
         </div>
 
-        <div className="flex-1 overflow-y-auto p-4 space-y-2">
+        {selectedPeerIp && olderCursor && (
+          <button
+            onClick={() => loadHistory(selectedPeerIp, olderCursor)}
+            className="border-b border-green-700 px-4 py-1 text-left text-xs text-green-700 hover:text-green-400"
+          >
+            $ load_older_messages
+          </button>
+        )}
+
+        <div className="flex-1 min-h-0">
           {!selectedPeerIp ? (
-            <div className="text-green-700 text-sm italic">
+            <div className="p-4 text-green-700 text-sm italic">
               <div>$ awaiting_peer_selection...</div>
               <div className="mt-4">Select a peer from the list to begin transmission.</div>
             </div>
           ) : currentMessages.length === 0 ? (
-            <div className="text-green-700 text-sm italic">
+            <div className="p-4 text-green-700 text-sm italic">
               <div>$ secure_channel_established_with: {getSelectedPeerName()}</div>
               <div className="mt-2">Waiting for messages...</div>
             </div>
           ) : (
-            currentMessages.map((m, i) => (
-              <div key={i} className="text-sm space-y-1">
-                <div className="text-green-300">
-                  [{m.timestamp.toLocaleTimeString()}] {m.sender === 'you' ? '< OUT' : '> IN'}
-                </div>
-                <div className={`pl-4 border-l-2 ${m.sender === 'you' ? 'border-green-600' : 'border-green-400'}`}>
-                  <span className="text-green-400">
-                    <MessageContent content={m.content} />
-                  </span>
-                </div>
-              </div>
-            ))
+            <MessageList
+              conversationKey={selectedPeerIp}
+              messages={currentMessages}
+              onReachTop={() => olderCursor && loadHistory(selectedPeerIp, olderCursor)}
+            />
           )}
-          <div ref={messagesEndRef} />
         </div>
 
         <div className="border-t-2 border-green-400 bg-black p-4">
@@ -0,0 +1,209 @@
+import React, { memo, useEffect, useLayoutEffect, useMemo, useRef, useState } from 'react'
+
+// Rows are mounted only inside the viewport plus this much slack above and below
+const OVERSCAN_PX = 600
+// Height assumed for rows that have not been measured yet
+const ESTIMATED_ROW_HEIGHT = 56
+// Within this distance of the bottom, new messages keep the pane pinned there
+const STICKY_BOTTOM_PX = 48
+const PARSE_CACHE_LIMIT = 2000
+const URL_PATTERN = /\b(?:https?:\/\/|www\.)[^\s<]+\b/g
+
+// Parsed content per message id, shared across mounts: [{ text }] | [{ url, href }]
+const parseCache = new Map()
+
+const parseContent = (content) => {
+  const tokens = []
+  let lastIndex = 0
+  for (const match of content.matchAll(URL_PATTERN)) {
+    const url = match[0]
+    if (match.index > lastIndex) tokens.push({ text: content.slice(lastIndex, match.index) })
+    lastIndex = match.index + url.length
+
+    const href = url.startsWith('www.') ? `https://${url}` : url
+    let safe = false
+    try {
+      safe = ['http:', 'https:'].includes(new URL(href).protocol)
+    } catch {
+      safe = false
+    }
+    tokens.push(safe ? { url, href } : { text: url })
+  }
+  if (lastIndex < content.length) tokens.push({ text: content.slice(lastIndex) })
+  return tokens
+}
+
+const parsedContent = (id, content) => {
+  if (id == null) return parseContent(content)
+  let tokens = parseCache.get(id)
+  if (!tokens) {
+    tokens = parseContent(content)
+    parseCache.set(id, tokens)
+    if (parseCache.size > PARSE_CACHE_LIMIT) parseCache.delete(parseCache.keys().next().value)
+  }
+  return tokens
+}
+
+const MessageContent = memo(({ id, content }) => {
+  const tokens = useMemo(() => parsedContent(id, content), [id, content])
+  return (
+    <>
+      {tokens.map((token, i) =>
+        token.url ? (
+          <a
+            key={i}
+            href={token.href}
+            target="_blank"
+            rel="noopener noreferrer"
+            className="text-blue-500 underline hover:text-blue-700"
+          >
+            {token.url}
+          </a>
+        ) : (
+          <React.Fragment key={i}>{token.text}</React.Fragment>
+        )
+      )}
+    </>
+  )
+})
+
+const MessageRow = memo(({ message, rowRef }) => (
+  <div ref={rowRef} data-key={message.key} className="text-sm space-y-1 pb-2">
+    <div className="text-green-300">
+      [{message.timestamp.toLocaleTimeString()}] {message.sender === 'you' ? '< OUT' : '> IN'}
+    </div>
+    <div className={`pl-4 border-l-2 ${message.sender === 'you' ? 'border-green-600' : 'border-green-400'}`}>
+      <span className="text-green-400">
+        <MessageContent id={message.id} content={message.content} />
+      </span>
+    </div>
+  </div>
+))
+
+// First index whose row ends below ``y``
+const findRow = (offsets, y) => {
+  let lo = 0
+  let hi = offsets.length - 1
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1
+    if (offsets[mid + 1] <= y) lo = mid + 1
+    else hi = mid
+  }
+  return lo
+}
+
+/**
+ * Virtualized message pane: only rows near the viewport are mounted, row
+ * heights are measured once per message and reused, and the view stays
+ * pinned to the bottom while the user is reading the newest messages.
+ */
+const MessageList = ({ conversationKey, messages, onReachTop }) => {
+  const scrollRef = useRef(null)
+  const heightsRef = useRef(new Map()) // message key -> measured height
+  const rowsRef = useRef(new Map()) // message key -> mounted element
+  const refCallbacksRef = useRef(new Map()) // message key -> stable ref callback, so rows stay memoized
+  const pinnedRef = useRef(true)
+  const firstKeyRef = useRef(null)
+  const [scrollTop, setScrollTop] = useState(0)
+  const [viewportHeight, setViewportHeight] = useState(0)
+  const [measured, setMeasured] = useState(0)
+
+  const offsets = useMemo(() => {
+    const heights = heightsRef.current
+    const result = new Array(messages.length + 1)
+    result[0] = 0
+    for (let i = 0; i < messages.length; i++) {
+      result[i + 1] = result[i] + (heights.get(messages[i].key) ?? ESTIMATED_ROW_HEIGHT)
+    }
+    return result
+  }, [messages, measured])
+
+  const total = offsets[messages.length]
+  const start = messages.length ? findRow(offsets, Math.max(0, scrollTop - OVERSCAN_PX)) : 0
+  const end = messages.length ? findRow(offsets, scrollTop + viewportHeight + OVERSCAN_PX) + 1 : 0
+
+  useEffect(() => {
+    const el = scrollRef.current
+    const observer = new ResizeObserver(() => setViewportHeight(el.clientHeight))
+    observer.observe(el)
+    return () => observer.disconnect()
+  }, [])
+
+  // Drop per-row state for messages that left the list (conversation switch,
+  // trimmed history) so it stays bounded by what is loaded
+  useEffect(() => {
+    const keys = new Set(messages.map(m => m.key))
+    for (const map of [heightsRef.current, refCallbacksRef.current, rowsRef.current]) {
+      for (const key of map.keys()) {
+        if (!keys.has(key)) map.delete(key)
+      }
+    }
+  }, [messages])
+
+  // Measure whatever is mounted; only a changed height triggers another pass
+  useLayoutEffect(() => {
+    let changed = false
+    rowsRef.current.forEach((el, key) => {
+      const height = el.offsetHeight
+      if (heightsRef.current.get(key) !== height) {
+        heightsRef.current.set(key, height)
+        changed = true
+      }
+    })
+    if (changed) setMeasured(n => n + 1)
+  })
+
+  // Keep the reader's place when older history is prepended, follow the
+  // bottom when new messages arrive while pinned there
+  useLayoutEffect(() => {
+    const el = scrollRef.current
+    const previousFirst = firstKeyRef.current
+    firstKeyRef.current = messages.length ? messages[0].key : null
+    if (previousFirst != null && messages.length && messages[0].key !== previousFirst) {
+      const index = messages.findIndex(m => m.key === previousFirst)
+      if (index > 0) {
+        el.scrollTop += offsets[index]
+        return
+      }
+    }
+    if (pinnedRef.current) el.scrollTop = el.scrollHeight
+  }, [messages, total])
+
+  useLayoutEffect(() => {
+    pinnedRef.current = true
+    firstKeyRef.current = null
+    const el = scrollRef.current
+    el.scrollTop = el.scrollHeight
+  }, [conversationKey])
+
+  const handleScroll = (e) => {
+    const el = e.currentTarget
+    pinnedRef.current = el.scrollHeight - el.scrollTop - el.clientHeight < STICKY_BOTTOM_PX
+    setScrollTop(el.scrollTop)
+    if (el.scrollTop === 0 && onReachTop) onReachTop()
+  }
+
+  const rowRef = (key) => {
+    let callback = refCallbacksRef.current.get(key)
+    if (!callback) {
+      callback = (el) => {
+        if (el) rowsRef.current.set(key, el)
+        else rowsRef.current.delete(key)
+      }
+      refCallbacksRef.current.set(key, callback)
+    }
+    return callback
+  }
+
+  return (
+    <div ref={scrollRef} onScroll={handleScroll} className="h-full overflow-y-auto p-4">
+      <div style={{ height: offsets[start] }} />
+      {messages.slice(start, end).map(m => (
+        <MessageRow key={m.key} message={m} rowRef={rowRef(m.key)} />
+      ))}
+      <div style={{ height: total - offsets[end] }} />
+    </div>
+  )
+}
+
+export default MessageList